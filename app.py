@@ -1,15 +1,18 @@
-import os, pandas as pd, datetime, time
+import os, pandas as pd, time
 import streamlit as st
-from openai import OpenAI
-from src.retrieval import AIDocumentStore, embed_query
-from src.generator import build_prompt, generate_answer
-from src.tts import toggle_speech
-from src.memory import add_to_memory, format_memory_prompt
-from src.upload_utils import extract_text_from_pdf, extract_text_from_txt, chunk_text, generate_chunk_title
-
-# Initialize history file if missing
-if not os.path.exists("data/history.csv"):
-    pd.DataFrame(columns=["timestamp", "question", "answer"]).to_csv("data/history.csv", index=False)
+from src.clients import drop_client, get_client
+from src.cache import get_embedding_cache
+from src.semantic_cache import get_semantic_cache
+from src.session_index import SessionIndex, file_hash, index_metric
+from src.tracing import metrics, start_metrics_server, write_metrics_file
+from src.rerank import get_reranker
+from src.retrieval import AIDocumentStore
+from src.retrieval_service import RemoteDocumentStore
+from src.pipeline import stream_question
+from src.tts import audio_key, get_tts_worker
+from src.history import get_history_store
+from src.memory import ConversationMemory
+from src.upload_utils import ChunkTitler, chunk_upload
 
 # Sidebar settings and API key input
 with st.sidebar:
@@ -22,6 +25,12 @@ with st.sidebar:
     cot_enabled = st.toggle("Chain-of-Thought (Internal Reasoning)",
                             value=False,
                             help="Helps the model think through the problem before answering.")
+    diversify_sources = st.toggle("Diversify sources",
+                                  value=True,
+                                  help="Reranks a wider pool of chunks so the answer draws on different papers instead of near-duplicates.")
+    reuse_answers = st.toggle("Reuse answers to similar questions",
+                              value=True,
+                              help="Answers a near-identical earlier question (same settings) instantly from cache.")
 
     st.header("Enter API Key")
 
@@ -50,12 +59,13 @@ with st.sidebar:
         # Validate by calling the embeddings endpoint
         with st.spinner("Validating API Key..."):
             try:
-                OpenAI(api_key=api_key_input).embeddings.create(
+                get_client(api_key_input).embeddings.create(
                     model="text-embedding-ada-002",
                     input="TEST"
                 )
                 validation_passed = True
             except Exception:
+                drop_client(api_key_input)
                 validation_passed = False
 
         # Store result in session state
@@ -74,25 +84,48 @@ with st.sidebar:
             time.sleep(2.5)
             status_placeholder.empty()
 
-# Load FAISS index
+    # Show how many embedding calls the on-disk cache has saved
+    cache_stats = get_embedding_cache().stats()
+    st.caption(
+        f"Embedding cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['entries']} vectors stored)"
+    )
+    answer_stats = get_semantic_cache().stats()
+    st.caption(
+        f"Answer cache: {answer_stats['hits']} hits / {answer_stats['misses']} misses "
+        f"({answer_stats['entries']} answers stored)"
+    )
+
+# Serve Prometheus metrics on METRICS_PORT if configured (once per server process)
+@st.cache_resource(show_spinner=False)
+def start_metrics_endpoint(port):
+    return start_metrics_server(port)
+
+if os.environ.get("METRICS_PORT"):
+    start_metrics_endpoint(int(os.environ["METRICS_PORT"]))
+
+# Load FAISS index, or connect to a shared retrieval service (python -m src.retrieval_service)
+# so several app processes on one host query a single memory-mapped copy
 @st.cache_resource(show_spinner=False)
 def load_ai_knower():
+    if os.environ.get("RETRIEVAL_URL"):
+        store = RemoteDocumentStore(os.environ["RETRIEVAL_URL"])
+        return store, store.load_index()
     store = AIDocumentStore("data/arxiv_dataset.csv", "data/faiss.index")
     index = store.load_index()
-    store.load_and_split()
+    store.load_chunks()
     return store, index
 
 store, index = load_ai_knower()
-documents = store.get_documents()
-metadata = store.get_metadata()
 
 # Session state setup
 st.session_state.setdefault("answer", "")
 st.session_state.setdefault("matched_docs", [])
-st.session_state.setdefault("tts_active", False)
-st.session_state.setdefault("qa_memory", [])
+st.session_state.setdefault("tts_audio", {})
+st.session_state.setdefault("conversation", ConversationMemory())
 st.session_state.setdefault("explanation", "")
 st.session_state.setdefault("prompt", "")
+st.session_state.setdefault("timings", {})
 st.session_state.setdefault("api_key_valid", False)
 st.session_state.setdefault("validation_complete", False)
 
@@ -111,24 +144,62 @@ selected_chunk = ""
 
 if uploaded_file:
     try:
-        # Extract and chunk document text
-        full_text = extract_text_from_pdf(uploaded_file) if uploaded_file.name.endswith(".pdf") else extract_text_from_txt(uploaded_file)
-        uploaded_chunks = chunk_text(full_text, chunk_size=300, overlap=20)
-
-        # Generate short titles for each chunk
-        @st.cache_data(show_spinner=False)
-        def get_chunk_titles(chunks):
-            return [generate_chunk_title(chunk) for chunk in chunks]
-
-        chunk_titles = get_chunk_titles(uploaded_chunks)
-
-        # Let user select a section to focus the query
-        selected_idx = st.selectbox(
-            "Choose a section to include with your question:",
-            range(len(chunk_titles)),
-            format_func=lambda i: f"Section {i+1}: {chunk_titles[i]}"
-        )
-        selected_chunk = uploaded_chunks[selected_idx]
+        # Extract and chunk document text, then generate short titles for each chunk in the
+        # background (once per uploaded file)
+        if st.session_state.get("upload_file_id") != uploaded_file.file_id:
+            with st.spinner("Reading document..."):
+                chunks, spans = chunk_upload(uploaded_file, chunk_size=300, overlap=20)
+            st.session_state.upload_chunks = chunks
+            st.session_state.upload_spans = spans
+            st.session_state.chunk_titler = ChunkTitler(chunks)
+            st.session_state.upload_file_id = uploaded_file.file_id
+            st.session_state.section_idx = None
+
+            # Embed every chunk into a per-session index so questions search the whole upload
+            upload_indexes = st.session_state.setdefault("upload_indexes", {})
+            upload_hash = file_hash(uploaded_file.getvalue())
+            if upload_hash not in upload_indexes:
+                try:
+                    with st.spinner("Indexing document..."):
+                        upload_indexes[upload_hash] = SessionIndex(chunks, spans, uploaded_file.name, metric=index_metric(index))
+                except Exception as e:
+                    st.warning(f"Could not index the upload for search; only the selected section will be used: {e}")
+            st.session_state.upload_index = upload_indexes.get(upload_hash)
+        uploaded_chunks = st.session_state.upload_chunks
+        chunk_spans = st.session_state.upload_spans
+        titler = st.session_state.chunk_titler
+
+        # "Section 3 (p. 4-5): Title" for PDFs, "Section 3: Title" for plain text
+        def section_label(i):
+            if i is None:
+                return "Whole document (search for relevant passages)"
+            span = chunk_spans[i]
+            if span["page_start"] is None:
+                return f"Section {i+1}: {titler.titles[i]}"
+            pages = span["page_start"] if span["page_start"] == span["page_end"] else f"{span['page_start']}-{span['page_end']}"
+            return f"Section {i+1} (p. {pages}): {titler.titles[i]}"
+
+        # Let user select a section to focus the query; the picker refreshes itself until all titles are in
+        @st.fragment(run_every=None if titler.done else 1.0)
+        def section_picker():
+            st.selectbox(
+                "Choose a section to include with your question:",
+                [None, *range(len(titler.titles))],
+                format_func=section_label,
+                key="section_idx"
+            )
+            if not titler.done:
+                st.caption(f"Generating section titles... {titler.completed()}/{len(titler.titles)}")
+            elif section_picker_polling:
+                # Rerun the whole page once so the picker stops polling
+                st.rerun()
+
+        section_picker_polling = not titler.done
+        section_picker()
+        if titler.done and titler.errors:
+            st.warning(f"{len(titler.errors)} section title(s) could not be generated: {titler.errors[0]}")
+        if st.session_state.section_idx is not None:
+            selected_chunk = uploaded_chunks[st.session_state.section_idx]
         st.success("Document loaded and chunked successfully.")
     except Exception as e:
         st.error(f"Failed to process uploaded file: {e}")
@@ -149,49 +220,83 @@ if submit and query:
     input_context = selected_chunk if selected_chunk else ""
     full_input = query if not input_context else f"{input_context}\n{query}"
 
-    with st.spinner("Thinking..."):
-        memory_context = format_memory_prompt(st.session_state.qa_memory)
-        q_emb = embed_query(full_input).reshape(1, -1)
-        _, I = index.search(q_emb, k=3)
-        matched_docs = [
-            #Truncate to 1000 characters
-            (doc[:1000], meta)
-            for doc, meta in [(documents[i], metadata[i]) for i in I[0]]
-        ]
-
-        # Construct full prompt with style, context, memory, and reasoning
-        st.session_state.prompt = build_prompt(
-            question=full_input,
-            docs_metadata=matched_docs,
-            style=prompt_style,
-            memory_block=memory_context,
-            cot=cot_enabled
-        )
-
-        # Ask the model for an answer
-        answer = generate_answer(st.session_state.prompt, temperature=temperature, max_tokens=max_tokens)
-
-        # Ask the model to explain the answer
-        explanation_prompt = (
-            "You are a helpful AI tutor. Briefly explain why the following answer is accurate, "
-            "based on the context it was built from.\n\n"
-            f"Answer:\n{answer}\n\n"
-            f"Context:\n{st.session_state.prompt}\n\n"
-            "Explain why this answer makes sense:"
-        )
-        explanation = generate_answer(explanation_prompt, temperature=0.3, max_tokens=200)
+    # Embed, search, answer and explain in one async pipeline with pooled connections
+    tokens, pending_result = stream_question(
+        full_input,
+        store,
+        index,
+        api_key=st.session_state.get("openai_api_key"),
+        style=prompt_style,
+        memory=st.session_state.conversation,
+        cot=cot_enabled,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        semantic_cache=get_semantic_cache() if reuse_answers else None,
+        reranker=get_reranker() if diversify_sources else None,
+        session_index=st.session_state.get("upload_index") if uploaded_file else None
+    )
+
+    # Render the answer as it streams in, then swap in the full view below once the explanation is ready
+    streaming_slot = st.empty()
+    with streaming_slot.container():
+        st.subheader("📚 Answer")
+        with st.spinner("Thinking..."):
+            st.write_stream(tokens)
+        with st.spinner("Explaining..."):
+            result = pending_result.result()
+    streaming_slot.empty()
+    for error in result["errors"]:
+        st.error(error)
+    answer = result["answer"]
+    explanation = result["explanation"]
+    matched_docs = result["matched_docs"]
+    st.session_state.prompt = result["prompt"]
+    st.session_state.timings = result["timings"]
+    st.session_state.trace = result["trace"]
+    if os.environ.get("METRICS_FILE"):
+        write_metrics_file(os.environ["METRICS_FILE"])
 
     # Store results in session state and history
     st.session_state.answer = answer
     st.session_state.matched_docs = matched_docs
-    st.session_state.qa_memory = add_to_memory(st.session_state.qa_memory, query, answer)
+    # Older turns are summarized in the background, off the request path
+    st.session_state.conversation.add(query, answer, vector=result["query_vector"], client=get_client())
     st.session_state.explanation = explanation
-    st.session_state.tts_active = False
 
-    # Append to local history file
-    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    df = pd.DataFrame([{"timestamp": ts, "question": query, "answer": answer}])
-    df.to_csv("data/history.csv", mode="a", header=False, index=False)
+    # Append to the local history store
+    get_history_store().append(query, answer)
+
+# Queues text-to-speech for this session; the worker renders it to a cached audio file
+def request_audio(text):
+    key = audio_key(text)
+    st.session_state.tts_audio[key] = get_tts_worker().synthesize(text)
+    st.session_state.tts_autoplay = key
+    return key
+
+# Audio player for text requested with request_audio (nothing if it wasn't requested)
+def audio_player(text):
+    key = audio_key(text)
+    future = st.session_state.tts_audio.get(key)
+    if future is None:
+        return
+    if not future.done():
+        wait_for_audio(key)
+    elif future.exception() is not None:
+        st.error(f"TTS error: {future.exception()}")
+    else:
+        # Start playing right after the click, but not on every later rerun
+        autoplay = st.session_state.get("tts_autoplay") == key
+        if autoplay:
+            del st.session_state.tts_autoplay
+        st.audio(future.result(), format="audio/wav", autoplay=autoplay)
+
+# Polls only this placeholder while audio renders, then reruns the page to show the player
+@st.fragment(run_every=1)
+def wait_for_audio(key):
+    future = st.session_state.tts_audio.get(key)
+    if future is None or future.done():
+        st.rerun()
+    st.caption("🔊 Preparing audio...")
 
 # Display answer + extra features
 if st.session_state.answer:
@@ -199,14 +304,20 @@ if st.session_state.answer:
     st.write(st.session_state.answer)
 
     if st.button("🔊 Read Aloud"):
-        st.session_state.tts_active = toggle_speech(st.session_state.answer)
+        request_audio(st.session_state.answer)
+    audio_player(st.session_state.answer)
 
     with st.expander("🔗 Sources"):
         for i, (chunk, meta) in enumerate(st.session_state.matched_docs, start=1):
-            st.markdown(f"**{i}. [{meta['title']}]({meta['url']})**")
+            if meta["url"]:
+                st.markdown(f"**{i}. [{meta['title']}]({meta['url']})**")
+            else:
+                st.markdown(f"**{i}. {meta['title']}** (your upload)")
 
     with st.expander("🧠 Previous Q&A Context"):
-        for i, (q, a) in enumerate(st.session_state.qa_memory):
+        if st.session_state.conversation.summary:
+            st.caption(f"Summary of earlier turns: {st.session_state.conversation.summary}")
+        for i, (q, a) in enumerate(st.session_state.conversation.recent()):
             st.markdown(f"**Q:** {q}  \n**A:** {a}")
 
     with st.expander("🤔 Explanation (Why This Answer?)"):
@@ -214,12 +325,39 @@ if st.session_state.answer:
 
     with st.expander("🧩 Reasoning Trace (Full Prompt)"):
         st.code(st.session_state.prompt)
+        if st.session_state.timings:
+            st.caption("Stage timings: " + ", ".join(
+                f"{stage} {seconds * 1000:.0f} ms"
+                for stage, seconds in st.session_state.timings.items() if seconds is not None
+            ))
+
+    with st.expander("⏱️ Performance Trace"):
+        request_trace = st.session_state.get("trace")
+        if request_trace:
+            st.caption(
+                f"Total {request_trace['seconds'] * 1000:.0f} ms, estimated cost ${request_trace['cost_usd']:.5f}, "
+                f"retries: {sum(request_trace['retries'].values())}"
+            )
+            st.dataframe(pd.DataFrame([
+                {"stage": s["stage"], "ms": round(s["seconds"] * 1000, 1),
+                 "prompt tokens": request_trace["tokens"].get(s["stage"], {}).get("prompt", 0),
+                 "completion tokens": request_trace["tokens"].get(s["stage"], {}).get("completion", 0)}
+                for s in request_trace["spans"]
+            ]), hide_index=True)
+            if request_trace["cache"]:
+                st.caption("Cache lookups: " + ", ".join(
+                    f"{cache} {counts['hit']} hit / {counts['miss']} miss" for cache, counts in request_trace["cache"].items()
+                ))
+        st.markdown("**All requests (this server)**")
+        st.dataframe(pd.DataFrame(metrics.summary()), hide_index=True)
+        st.download_button("Download metrics (Prometheus text)", metrics.render_prometheus(),
+                           file_name="metrics.prom", mime="text/plain")
 
     with st.expander("📜 History"):
         num_history_to_show = st.number_input("How many recent Q&As to display?", min_value=1, max_value=20, value=5, step=1)
-        if os.path.exists("data/history.csv"):
-            hist = pd.read_csv("data/history.csv")
-            hist_to_show = hist.tail(num_history_to_show).iloc[::-1]
+        recent_history = get_history_store().recent(num_history_to_show)
+        if recent_history:
+            hist_to_show = pd.DataFrame(recent_history)
 
             # Two column layout for downloads
             col1, col2 = st.columns(2)
@@ -245,7 +383,8 @@ if st.session_state.answer:
             for idx, row in hist_to_show.iterrows():
                 st.markdown(f"**{row['timestamp']}**  \n**Q:** {row['question']}  \n**A:** {row['answer']}\n")
                 if st.button(f"🔊 Read Answer {idx+1}", key=f"tts_history_{idx}"):
-                    st.session_state.tts_active = toggle_speech(row['answer'])
+                    request_audio(row['answer'])
+                audio_player(row['answer'])
 
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,116 @@
+import argparse
+import json
+import time
+import faiss
+import numpy as np
+from src.indexing import METRICS, create_index, prepare_vectors, set_search_params, train_index
+
+# Clustered synthetic vectors, closer to real embeddings than uniform noise
+def synthetic_vectors(n, dim, n_clusters=256, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype("float32")
+    labels = rng.integers(0, n_clusters, n)
+    vectors = centers[labels] + 0.3 * rng.standard_normal((n, dim)).astype("float32")
+    return np.ascontiguousarray(vectors, dtype="float32")
+
+# Fraction of the exact top-k neighbours that the approximate search also returned
+def recall_at_k(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+# Times single-query searches (the app's access pattern) and returns latencies in ms
+def query_latencies(index, queries, k):
+    latencies = []
+    results = np.empty((len(queries), k), dtype="int64")
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results[i] = ids[0]
+    return np.array(latencies), results
+
+# Serialized size is a good proxy for the resident size of a FAISS index
+def index_bytes(index):
+    return int(faiss.serialize_index(index).nbytes)
+
+# Builds one index, then measures each search setting against the exact results
+def run_index(index_type, vectors, queries, truth, k, sweep, storage="fp32", **params):
+    ids = np.arange(len(vectors), dtype="int64")
+    start = time.perf_counter()
+    index = create_index(index_type, vectors.shape[1], len(vectors), storage=storage, **params)
+    vectors = prepare_vectors(index, vectors)
+    train_index(index, vectors)
+    index.add_with_ids(vectors, ids)
+    build_seconds = time.perf_counter() - start
+    memory_mb = index_bytes(index) / 2**20
+    queries = prepare_vectors(index, queries)
+
+    results = []
+    for label, search_params in sweep:
+        set_search_params(index, **search_params)
+        latencies, found = query_latencies(index, queries, k)
+        results.append({
+            "config": f"{index_type}/{storage} {label}".strip(),
+            "recall_at_k": round(recall_at_k(found, truth), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+            "memory_mb": round(memory_mb, 2),
+            "build_s": round(build_seconds, 2)
+        })
+    return results
+
+# Default sweep: the flat baseline, quantized storage, and a few query-time settings per approximate index
+def default_sweeps():
+    exact = [("", {})]
+    nprobes = [(f"nprobe={n}", {"nprobe": n}) for n in (1, 8, 32)]
+    ef_searches = [(f"efSearch={ef}", {"ef_search": ef}) for ef in (16, 64, 128)]
+    return [
+        ("flat", "fp32", exact),
+        ("flat", "fp16", exact),
+        ("flat", "int8", exact),
+        ("ivf_flat", "fp32", nprobes),
+        ("ivf_flat", "int8", nprobes),
+        ("ivf_pq", "fp32", nprobes),
+        ("hnsw", "fp32", ef_searches),
+        ("hnsw", "fp16", ef_searches)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency/memory benchmark for FAISS index types")
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--pq-m", type=int, default=64, help="PQ sub-quantizers for ivf_pq")
+    parser.add_argument("--metric", default="l2", choices=list(METRICS),
+                        help="ip normalizes vectors and ranks by cosine similarity")
+    parser.add_argument("--from-npy", help="Benchmark real embeddings from a .npy file instead of synthetic data")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.from_npy:
+        data = np.ascontiguousarray(np.load(args.from_npy), dtype="float32")
+    else:
+        data = synthetic_vectors(args.vectors + args.queries, args.dim)
+    vectors, queries = data[:-args.queries], data[-args.queries:]
+
+    # Exact neighbours from full-precision brute force are the ground truth
+    exact = faiss.IndexFlat(vectors.shape[1], METRICS[args.metric])
+    exact.add(prepare_vectors(exact, vectors))
+    _, truth = exact.search(prepare_vectors(exact, queries), args.k)
+
+    results = []
+    for index_type, storage, sweep in default_sweeps():
+        for result in run_index(index_type, vectors, queries, truth, args.k, sweep, storage=storage,
+                                pq_m=args.pq_m, metric=args.metric):
+            results.append(result)
+            print(f"{result['config']:<30} recall@{args.k}={result['recall_at_k']:.3f}  "
+                  f"p50={result['p50_ms']:.3f}ms  p99={result['p99_ms']:.3f}ms  "
+                  f"mem={result['memory_mb']:.1f}MB  build={result['build_s']:.1f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
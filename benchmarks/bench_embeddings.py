@@ -0,0 +1,44 @@
+import argparse
+import time
+from benchmarks.fake_openai import FakeOpenAI
+from src import embeddings
+from src.embeddings import embed_texts
+
+# Builds a synthetic corpus of abstract-sized chunks
+def synthetic_chunks(n, words=150):
+    return [" ".join(f"token{(i * 31 + j) % 5000}" for j in range(words)) for i in range(n)]
+
+# Baseline: one request per chunk, strictly sequential (the old embed_documents loop)
+def run_sequential(chunks, client):
+    for chunk in chunks:
+        client.embeddings.create(input=chunk, model=embeddings.EMBEDDING_MODEL)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline embedding throughput benchmark")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake per-request latency in seconds")
+    parser.add_argument("--per-item-latency", type=float, default=0.0005)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--baseline-chunks", type=int, default=100,
+                        help="Chunks used for the sequential baseline (it is slow)")
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks)
+
+    client = FakeOpenAI(latency=args.latency, per_item_latency=args.per_item_latency)
+    baseline = chunks[:args.baseline_chunks]
+    start = time.perf_counter()
+    run_sequential(baseline, client)
+    elapsed = time.perf_counter() - start
+    print(f"sequential      : {len(baseline) / elapsed:10.1f} chunks/s ({client.embeddings.calls} requests)")
+
+    for workers in args.workers:
+        client = FakeOpenAI(latency=args.latency, per_item_latency=args.per_item_latency)
+        start = time.perf_counter()
+        embed_texts(chunks, client, max_workers=workers, max_batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"batched w={workers:<4} : {len(chunks) / elapsed:10.1f} chunks/s ({client.embeddings.calls} requests)")
+
+if __name__ == "__main__":
+    main()
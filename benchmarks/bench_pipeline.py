@@ -0,0 +1,207 @@
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pymupdf
+from benchmarks.fake_openai import FakeAsyncOpenAI, FakeOpenAI
+from src import pipeline, retrieval
+from src.context import prompt_token_budget
+from src.generator import build_prompt
+from src.retrieval import AIDocumentStore
+from src.session_index import SessionIndex, index_metric
+from src.upload_utils import chunk_upload
+
+# Stands in for the embedding cache so runs measure the API path and don't fill data/ with vectors
+class NoCache:
+    def get_many(self, model, texts):
+        return [None] * len(texts)
+
+    def get(self, model, text):
+        return None
+
+    def put_many(self, model, texts, vectors):
+        pass
+
+    def put(self, model, text, vector):
+        pass
+
+# Writes a deterministic arXiv-like CSV with n_chunks chunks of chunk_words words
+# Word frequencies follow a Zipf-like law so BM25 postings look like real text
+def synthetic_corpus(path, n_chunks, chunk_words=100, chunks_per_row=2, vocabulary=50_000, seed=0):
+    rng = np.random.default_rng(seed)
+    n_rows = max(1, n_chunks // chunks_per_row)
+    words_per_row = chunk_words * chunks_per_row
+    header = True
+    for start in range(0, n_rows, 10_000):
+        rows = min(10_000, n_rows - start)
+        terms = np.minimum(rng.zipf(1.3, (rows, words_per_row)), vocabulary)
+        pd.DataFrame({
+            "title": [f"Paper {start + i}" for i in range(rows)],
+            "url": [f"http://arxiv.org/abs/{start + i}" for i in range(rows)],
+            "abstract": [" ".join(f"term{t}" for t in row) for row in terms]
+        }).to_csv(path, mode="w" if header else "a", header=header, index=False)
+        header = False
+    return n_rows
+
+# Builds an n-page PDF of synthetic text for the upload pipeline
+def synthetic_pdf(pages, words_per_page=400, seed=0):
+    rng = np.random.default_rng(seed)
+    doc = pymupdf.open()
+    for _ in range(pages):
+        words = [f"term{t}" for t in np.minimum(rng.zipf(1.3, words_per_page), 50_000)]
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        doc.new_page().insert_textbox(pymupdf.Rect(36, 36, 576, 806), "\n".join(lines), fontsize=7)
+    return doc.tobytes()
+
+# Latency percentiles (ms) of calling fn once per query
+def latency_stats(fn, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3)
+    }
+
+# Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+# Runs every stage for one corpus size and returns its measurements
+def run_size(n_chunks, args):
+    result = {"chunks": n_chunks}
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = os.path.join(tmp, "corpus.csv")
+        index_path = os.path.join(tmp, "faiss.index")
+        synthetic_corpus(dataset, n_chunks, args.chunk_tokens)
+        client = FakeOpenAI(latency=args.embed_latency)
+        retrieval.get_client = lambda api_key=None: client
+
+        # Indexing: CSV -> chunks -> embeddings -> FAISS + chunk store + lexical index
+        store = AIDocumentStore(
+            dataset, index_path, chunk_size=args.chunk_tokens, embedding_cache=NoCache(),
+            index_type=args.index_type, storage=args.storage
+        )
+        start = time.perf_counter()
+        index = store.build_index()
+        elapsed = time.perf_counter() - start
+        result.update(build_s=round(elapsed, 2), build_chunks_per_s=round(index.ntotal / elapsed, 1),
+                      indexed=int(index.ntotal), embed_requests=client.embeddings.calls)
+
+        # Cold start: what the app does on launch
+        start = time.perf_counter()
+        store = AIDocumentStore(dataset, index_path, index_type=args.index_type)
+        index = store.load_index()
+        store.load_chunks()
+        result["load_s"] = round(time.perf_counter() - start, 3)
+
+        rng = np.random.default_rng(1)
+        positions = rng.integers(0, len(store.documents), args.queries)
+        questions = [" ".join(store.documents[int(pos)].split()[:12]) for pos in positions]
+        vectors = {q: v for q, v in zip(questions, retrieval.embed_texts(questions, FakeOpenAI(latency=0), cache=NoCache()))}
+        result["vector_search"] = latency_stats(lambda q: store.search(index, vectors[q].reshape(1, -1), 12), questions)
+        result["lexical_search"] = latency_stats(lambda q: store.lexical_search(q, 12), questions)
+        docs = store.lookup(store.search(index, vectors[questions[0]].reshape(1, -1), 3)[1][0])
+        result["build_prompt"] = latency_stats(
+            lambda q: build_prompt(q, docs, token_budget=prompt_token_budget(300)), questions
+        )
+
+        # End to end through the async pipeline with fake network latency
+        async_client = FakeAsyncOpenAI(latency=args.embed_latency, chat_latency=args.chat_latency,
+                                       token_latency=args.token_latency)
+        pipeline.get_async_client = lambda api_key=None: async_client
+        pipeline.get_embedding_cache = lambda: NoCache()
+        result["answer_question"] = latency_stats(
+            lambda q: pipeline.run(pipeline.answer_question(q, store, index, api_key="fake")),
+            questions[:args.pipeline_queries]
+        )
+
+        # Upload: page-parallel PDF extraction, chunking, embedding into a session index
+        pdf = io.BytesIO(synthetic_pdf(args.upload_pages))
+        pdf.name = "upload.pdf"
+        start = time.perf_counter()
+        chunks, spans = chunk_upload(pdf)
+        SessionIndex(chunks, spans, pdf.name, metric=index_metric(index), client=client, cache=NoCache())
+        elapsed = time.perf_counter() - start
+        result["upload"] = {"pages": args.upload_pages, "chunks": len(chunks), "seconds": round(elapsed, 3),
+                            "pages_per_s": round(args.upload_pages / elapsed, 1)}
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+# Each corpus size runs in a fresh interpreter so peak RSS is measured per size
+def run_isolated(n_chunks, argv):
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_pipeline", "--single", str(n_chunks), *argv],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+# Commit the numbers belong to, so JSON files from different commits can be compared
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Drops options (and their values) that the parent handles itself from the child's argv
+def _strip_option(argv, options):
+    kept = []
+    skip = 0
+    for arg in argv:
+        if skip:
+            skip -= 1
+            continue
+        if arg in options:
+            skip = options[arg]
+            continue
+        kept.append(arg)
+    return kept
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark: indexing, search, prompt, pipeline, upload")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000],
+                        help="Corpus sizes in chunks (1M needs ~6 GB for a flat fp32 index; try --index-type ivf_pq)")
+    parser.add_argument("--chunk-tokens", type=int, default=100,
+                        help="Chunk size in embedding tokens (each synthetic word is one token offline)")
+    parser.add_argument("--index-type", default="flat", choices=retrieval.INDEX_TYPES)
+    parser.add_argument("--storage", default="fp32", choices=list(retrieval.STORAGE_CODES))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pipeline-queries", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Fake embeddings latency in seconds")
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="Fake chat time-to-first-token in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Fake per-token streaming delay")
+    parser.add_argument("--upload-pages", type=int, default=50)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args, _ = parser.parse_known_args()
+
+    if args.single is not None:
+        print(json.dumps(run_size(args.single, args)))
+        return
+
+    passthrough = _strip_option(sys.argv[1:], {"--sizes": len(args.sizes), "--json": 1})
+    report = {"commit": git_commit(), "python": platform.python_version(), "cpus": os.cpu_count(), "results": []}
+    for n_chunks in args.sizes:
+        result = run_isolated(n_chunks, passthrough)
+        report["results"].append(result)
+        print(f"{n_chunks:>9} chunks: build {result['build_chunks_per_s']:>9.1f} chunks/s, "
+              f"search p50 {result['vector_search']['p50_ms']:.2f} ms / bm25 p50 {result['lexical_search']['p50_ms']:.2f} ms, "
+              f"pipeline p50 {result['answer_question']['p50_ms']:.1f} ms, peak RSS {result['peak_rss_mb']} MB")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+import httpx
+import numpy as np
+from openai import RateLimitError
+
+# Deterministic unit vector derived from a hash of the text
+def hash_vector(text, dim=1536):
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    return vec / np.linalg.norm(vec)
+
+# Offline stand-in for the OpenAI embeddings endpoint with configurable latency
+class FakeEmbeddings:
+    def __init__(self, dim=1536, latency=0.05, per_item_latency=0.0, rate_limit_every=0):
+        self.dim = dim
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.rate_limit_every = rate_limit_every
+        self.calls = 0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def create(self, input, model):
+        inputs = [input] if isinstance(input, str) else list(input)
+        time.sleep(self.latency + self.per_item_latency * len(inputs))
+        return self._respond(inputs, model)
+
+    def _respond(self, inputs, model):
+        with self._lock:
+            self.calls += 1
+            call_number = self.calls
+
+        # Simulate a 429 every N calls so retry paths get exercised
+        if self.rate_limit_every and call_number % self.rate_limit_every == 0:
+            request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+            raise RateLimitError("Rate limit reached (fake)", response=httpx.Response(429, request=request), body=None)
+
+        with self._lock:
+            self.items += len(inputs)
+        data = [
+            SimpleNamespace(index=i, embedding=hash_vector(text, self.dim).tolist())
+            for i, text in enumerate(inputs)
+        ]
+        n_tokens = sum(len(text.split()) for text in inputs)
+        return SimpleNamespace(
+            data=data,
+            model=model,
+            usage=SimpleNamespace(prompt_tokens=n_tokens, total_tokens=n_tokens)
+        )
+
+# Offline stand-in for chat completions: echoes a deterministic reply, optionally streamed word by word
+class FakeChatCompletions:
+    def __init__(self, latency=0.05, token_latency=0.0, fail=False):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.fail = fail
+        self.calls = 0
+
+    # Deterministic reply derived from the prompt so repeated runs are comparable
+    @staticmethod
+    def reply_for(messages, max_tokens=300):
+        prompt = messages[-1]["content"]
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).hexdigest()
+        words = ["Answer", digest] + prompt.split()[:max(0, min(max_tokens, 40) - 2)]
+        return " ".join(words)
+
+    def _prepare(self, messages, max_tokens):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("fake chat failure")
+        return self.reply_for(messages, max_tokens)
+
+    def _response(self, text, n_prompt_tokens):
+        usage = SimpleNamespace(prompt_tokens=n_prompt_tokens, completion_tokens=len(text.split()),
+                                total_tokens=n_prompt_tokens + len(text.split()))
+        message = SimpleNamespace(content=text, role="assistant")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, index=0)], usage=usage)
+
+    @staticmethod
+    def _deltas(text):
+        words = text.split(" ")
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+    @staticmethod
+    def _chunk(delta):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta), index=0)], usage=None)
+
+    # With stream_options={"include_usage": True} the real API ends the stream with a usage-only chunk
+    def _usage_chunk(self, text, messages, kwargs):
+        if not (kwargs.get("stream_options") or {}).get("include_usage"):
+            return None
+        n_prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        return SimpleNamespace(choices=[], usage=self._response(text, n_prompt_tokens).usage)
+
+    def create(self, model, messages, temperature=0.2, max_tokens=300, stream=False, **kwargs):
+        time.sleep(self.latency)
+        text = self._prepare(messages, max_tokens)
+        if not stream:
+            return self._response(text, sum(len(m["content"].split()) for m in messages))
+
+        def generate():
+            for delta in self._deltas(text):
+                time.sleep(self.token_latency)
+                yield self._chunk(delta)
+            usage_chunk = self._usage_chunk(text, messages, kwargs)
+            if usage_chunk is not None:
+                yield usage_chunk
+        return generate()
+
+# Async flavour of FakeChatCompletions, matching openai.AsyncOpenAI
+class FakeAsyncChatCompletions(FakeChatCompletions):
+    async def create(self, model, messages, temperature=0.2, max_tokens=300, stream=False, **kwargs):
+        await asyncio.sleep(self.latency)
+        text = self._prepare(messages, max_tokens)
+        if not stream:
+            return self._response(text, sum(len(m["content"].split()) for m in messages))
+
+        async def generate():
+            for delta in self._deltas(text):
+                await asyncio.sleep(self.token_latency)
+                yield self._chunk(delta)
+            usage_chunk = self._usage_chunk(text, messages, kwargs)
+            if usage_chunk is not None:
+                yield usage_chunk
+        return generate()
+
+# Async flavour of FakeEmbeddings (latency is awaited instead of slept)
+class FakeAsyncEmbeddings(FakeEmbeddings):
+    async def create(self, input, model):
+        inputs = [input] if isinstance(input, str) else list(input)
+        await asyncio.sleep(self.latency + self.per_item_latency * len(inputs))
+        return self._respond(inputs, model)
+
+# Minimal client exposing the same attribute layout as openai.OpenAI
+class FakeOpenAI:
+    def __init__(self, dim=1536, latency=0.05, per_item_latency=0.0, rate_limit_every=0,
+                 chat_latency=0.05, token_latency=0.0, chat_fail=False):
+        self.embeddings = FakeEmbeddings(dim, latency, per_item_latency, rate_limit_every)
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(chat_latency, token_latency, chat_fail))
+
+# Minimal client exposing the same attribute layout as openai.AsyncOpenAI
+class FakeAsyncOpenAI:
+    def __init__(self, dim=1536, latency=0.05, chat_latency=0.05, token_latency=0.0, chat_fail=False):
+        self.embeddings = FakeAsyncEmbeddings(dim, latency)
+        self.chat = SimpleNamespace(completions=FakeAsyncChatCompletions(chat_latency, token_latency, chat_fail))
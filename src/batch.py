@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import pandas as pd
+from src.cache import get_embedding_cache
+from src.clients import get_async_client, get_client, with_async_clients_closed
+from src.context import prompt_token_budget
+from src.embeddings import embed_texts
+from src.generator import build_explanation_prompt, build_prompt
+from src.lexical import reciprocal_rank_fusion
+from src.pipeline import CORPUS, HYBRID_DEPTH, rank_dense, stream_completion
+from src.tracing import trace
+
+# Reads (id, question) pairs from a CSV (a "question" column, optional "id") or a JSONL file
+# (objects with "question" and optional "id", or bare strings); ids default to the row number
+def read_questions(path):
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        rows = [row if isinstance(row, dict) else {"question": row} for row in rows]
+    else:
+        rows = pd.read_csv(path, dtype=str, keep_default_na=False).to_dict("records")
+    for i, row in enumerate(rows):
+        if "question" not in row:
+            raise ValueError(f"Row {i + 1} of {path} has no 'question' field")
+        question = str(row["question"]).strip()
+        if question:
+            yield str(row.get("id") or i), question
+
+# Ids already answered in an output file; records with an error are retried on the next run
+def load_checkpoint(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    _drop_partial_line(path)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if not record.get("error"):
+                done.add(record["id"])
+    return done
+
+# A run killed mid-write can leave half a record at the end; cut it off before appending
+def _drop_partial_line(path):
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+# Embeds a batch of questions in bulk, searches them with one multi-query index.search and builds prompts
+def prepare_batch(items, store, index, client, style="Default", cot=False, max_tokens=300, k=3, cache=None,
+                  reranker=None):
+    questions = [question for _, question in items]
+    vectors = embed_texts(questions, client, cache=cache if cache is not None else get_embedding_cache())
+    depth = k * HYBRID_DEPTH if reranker is None else max(k * HYBRID_DEPTH, reranker.candidates)
+    D, I = store.search(index, vectors, depth)
+    prepared = []
+    for (question_id, question), vector, scores, ids in zip(items, vectors, D, I):
+        _, lexical_ids = store.lexical_search(question, depth)
+        fused = reciprocal_rank_fusion([rank_dense(index, scores, ids, [], []), [(CORPUS, int(i)) for i in lexical_ids]])
+        if reranker is not None:
+            _, matched_docs = reranker.rerank(question, vector, fused, {CORPUS: (store, index)}, k)
+        else:
+            matched_docs = store.lookup([chunk_id for _, chunk_id in fused[:k]])
+        prompt = build_prompt(
+            question=question,
+            docs_metadata=matched_docs,
+            style=style,
+            cot=cot,
+            token_budget=prompt_token_budget(max_tokens)
+        )
+        prepared.append((question_id, question, matched_docs, prompt))
+    return prepared
+
+# Answers every question not already in output_path, appending one JSON record per question as it finishes
+# Returns a summary with counts, wall time, throughput and token usage/cost
+def run_batch(input_path, output_path, store, index, api_key=None, style="Default", cot=False, temperature=0.2,
+              max_tokens=300, k=3, batch_size=256, concurrency=8, explain=False, cache=None, reranker=None):
+    return asyncio.run(with_async_clients_closed(_run_batch(
+        input_path, output_path, store, index, api_key, style, cot, temperature, max_tokens, k,
+        batch_size, concurrency, explain, cache, reranker
+    )))
+
+async def _run_batch(input_path, output_path, store, index, api_key, style, cot, temperature, max_tokens, k,
+                     batch_size, concurrency, explain, cache, reranker):
+    done = load_checkpoint(output_path)
+    items = [(question_id, question) for question_id, question in read_questions(input_path) if question_id not in done]
+    client = get_client(api_key)
+    async_client = get_async_client(api_key)
+    limit = asyncio.Semaphore(max(1, concurrency))
+    counts = {"answered": 0, "failed": 0, "skipped": len(done)}
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, trace("batch") as active:
+        # One line per record, flushed right away, so a crash loses at most the answers in flight
+        def write(record):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+        async def answer(question_id, question, matched_docs, prompt):
+            record = {
+                "id": question_id,
+                "question": question,
+                "sources": [{"title": meta["title"], "url": meta["url"]} for _, meta in matched_docs]
+            }
+            async with limit:
+                stage = time.perf_counter()
+                try:
+                    record["answer"] = await stream_completion(async_client, prompt, temperature, max_tokens)
+                    if explain:
+                        record["explanation"] = await stream_completion(
+                            async_client, build_explanation_prompt(record["answer"], prompt), 0.3, 200,
+                            stage="explanation"
+                        )
+                    counts["answered"] += 1
+                except Exception as e:
+                    record["error"] = str(e)
+                    counts["failed"] += 1
+                record["seconds"] = round(time.perf_counter() - stage, 3)
+            write(record)
+
+        pending = set()
+        for start in range(0, len(items), batch_size):
+            prepared = await asyncio.to_thread(
+                prepare_batch, items[start:start + batch_size], store, index, client, style, cot, max_tokens, k, cache,
+                reranker
+            )
+            pending.update(asyncio.create_task(answer(*item)) for item in prepared)
+            # Embedding and search for the next batch overlap with generation, but at most
+            # one batch waits for a generation slot so memory stays bounded
+            while len(pending) > batch_size:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            await asyncio.gather(*pending)
+
+    elapsed = time.perf_counter() - started
+    usage = active.to_dict()
+    return {
+        **counts,
+        "seconds": round(elapsed, 2),
+        "questions_per_second": round((counts["answered"] + counts["failed"]) / elapsed, 2) if elapsed else 0.0,
+        "tokens": usage["tokens"],
+        "cost_usd": round(usage["cost_usd"], 4)
+    }
+
+if __name__ == "__main__":
+    from src.rerank import get_reranker
+    from src.retrieval import AIDocumentStore
+    from src.retrieval_service import RemoteDocumentStore
+
+    parser = argparse.ArgumentParser(description="Answer a CSV/JSONL question bank offline, resuming from the output file")
+    parser.add_argument("input", help="CSV with a 'question' column (optional 'id'), or JSONL")
+    parser.add_argument("output", help="JSONL file results are appended to; rerun with the same file to resume")
+    parser.add_argument("--dataset", default="data/arxiv_dataset.csv")
+    parser.add_argument("--index", default="data/faiss.index")
+    parser.add_argument("--retrieval-url", default=os.environ.get("RETRIEVAL_URL"),
+                        help="Query a running retrieval service instead of loading the index")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"), help="Defaults to OPENAI_API_KEY")
+    parser.add_argument("--style", default="Default")
+    parser.add_argument("--cot", action="store_true")
+    parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--k", type=int, default=3, help="Sources per question")
+    parser.add_argument("--batch-size", type=int, default=256, help="Questions embedded and searched together")
+    parser.add_argument("--concurrency", type=int, default=8, help="Chat completions in flight")
+    parser.add_argument("--explain", action="store_true", help="Also generate the 'why this answer' explanation")
+    parser.add_argument("--no-rerank", action="store_true", help="Take the top fused chunks as-is instead of diversifying")
+    args = parser.parse_args()
+
+    if args.retrieval_url:
+        store = RemoteDocumentStore(args.retrieval_url)
+        index = store.load_index()
+    else:
+        store = AIDocumentStore(args.dataset, args.index)
+        index = store.load_index(mmap=True)
+        store.load_chunks()
+    summary = run_batch(
+        args.input, args.output, store, index, api_key=args.api_key, style=args.style, cot=args.cot,
+        temperature=args.temperature, max_tokens=args.max_tokens, k=args.k, batch_size=args.batch_size,
+        concurrency=args.concurrency, explain=args.explain, reranker=None if args.no_rerank else get_reranker()
+    )
+    print(json.dumps(summary, indent=2))
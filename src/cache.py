@@ -0,0 +1,210 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import numpy as np
+
+DEFAULT_CACHE_PATH = "data/embedding_cache.sqlite"
+DEFAULT_TITLE_CACHE_PATH = "data/title_cache.sqlite"
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+# Normalizes text so trivially different inputs (whitespace, unicode forms) share a cache entry
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+# On-disk, content-addressed embedding cache with size-bounded LRU eviction
+class EmbeddingCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=500_000):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        # Running row count, so puts don't scan the table; re-synced whenever it says we're over budget
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    # Hash of model name plus normalized text
+    @staticmethod
+    def make_key(model, text):
+        return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    # Returns a list aligned with texts holding cached vectors or None for misses
+    def get_many(self, model, texts):
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            results = [
+                np.frombuffer(found[key], dtype="float32") if key in found else None
+                for key in keys
+            ]
+            hits = sum(vec is not None for vec in results)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return results
+
+    # Returns one cached vector or None
+    def get(self, model, text):
+        return self.get_many(model, [text])[0]
+
+    # Stores vectors for the given texts and evicts the least recently used entries if over budget
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = [
+            (self.make_key(model, text), np.asarray(vec, dtype="float32").tobytes(), now)
+            for text, vec in zip(texts, vectors)
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            added = self._conn.total_changes - before
+            if added < len(rows):
+                # Some keys were already cached: refresh their vectors and recency
+                self._conn.executemany(
+                    "UPDATE embeddings SET vector = ?, last_used = ? WHERE key = ?",
+                    [(vector, used, key) for key, vector, used in rows]
+                )
+            self._count += added
+            if self._count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    # Stores one vector
+    def put(self, model, text, vector):
+        self.put_many(model, [text], [vector])
+
+    # Counts exactly (other processes may have written too) and drops the least recently used overflow
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+        self._count = min(count, self.max_entries)
+
+    # Returns the number of cached vectors
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    # Hit/miss counters for tracking how many embedding calls were saved
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# On-disk cache of generated section titles, keyed by model plus chunk content
+class TitleCache:
+    def __init__(self, path=DEFAULT_TITLE_CACHE_PATH, max_entries=100_000):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS titles ("
+            "key TEXT PRIMARY KEY, title TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_titles_last_used ON titles(last_used)")
+        self._conn.commit()
+        # Running row count, as in EmbeddingCache
+        self._count = self._conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+
+    # Returns a list aligned with texts holding cached titles or None for misses
+    def get_many(self, model, texts):
+        keys = [EmbeddingCache.make_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, title FROM titles WHERE key IN ({placeholders})", batch
+                ).fetchall())
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE titles SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self._conn.commit()
+        return [found.get(key) for key in keys]
+
+    # Stores one title and evicts the least recently used entries if over budget
+    def put(self, model, text, title):
+        key = EmbeddingCache.make_key(model, text)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO titles (key, title, last_used) VALUES (?, ?, ?)", (key, title, now)
+            )
+            if cursor.rowcount:
+                self._count += 1
+            else:
+                self._conn.execute("UPDATE titles SET title = ?, last_used = ? WHERE key = ?", (title, now, key))
+            if self._count > self.max_entries:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM titles").fetchone()
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM titles WHERE key IN (SELECT key FROM titles ORDER BY last_used ASC LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+                self._count = min(count, self.max_entries)
+            self._conn.commit()
+
+_shared_cache = None
+_shared_title_cache = None
+_shared_lock = threading.Lock()
+
+# Returns the process-wide embedding cache used by corpus builds, queries and uploads
+def get_embedding_cache(path=None):
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache(path or os.environ.get("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH))
+        return _shared_cache
+
+# Returns the process-wide section title cache
+def get_title_cache(path=None):
+    global _shared_title_cache
+    with _shared_lock:
+        if _shared_title_cache is None:
+            _shared_title_cache = TitleCache(path or os.environ.get("TITLE_CACHE_PATH", DEFAULT_TITLE_CACHE_PATH))
+        return _shared_title_cache
@@ -0,0 +1,135 @@
+import os
+import shutil
+from array import array
+from collections.abc import Sequence
+import numpy as np
+
+# Memory-maps a byte file, tolerating empty files (which np.memmap refuses)
+def _map_bytes(path):
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype="uint8")
+    return np.memmap(path, dtype="uint8", mode="r")
+
+# Streams chunks into a columnar sidecar directory next to the FAISS index
+class ChunkStoreWriter:
+    def __init__(self, directory):
+        self.directory = directory
+        self._tmp = f"{directory}.tmp"
+        shutil.rmtree(self._tmp, ignore_errors=True)
+        os.makedirs(self._tmp)
+        self._text = open(os.path.join(self._tmp, "text.bin"), "wb")
+        self._offsets = array("q", [0])
+        self._ids = array("q")
+        self._paper_index = array("i")
+        self._titles = open(os.path.join(self._tmp, "titles.bin"), "wb")
+        self._urls = open(os.path.join(self._tmp, "urls.bin"), "wb")
+        self._title_offsets = array("q", [0])
+        self._url_offsets = array("q", [0])
+        self._last_paper = None
+
+    # Appends one chunk; titles/urls are written straight to disk, once per run of chunks from the same paper
+    # (a dataset row's chunks arrive together, so only the last paper needs remembering)
+    def add(self, chunk_id, text, title, url):
+        encoded = text.encode("utf-8")
+        self._text.write(encoded)
+        self._offsets.append(self._offsets[-1] + len(encoded))
+        self._ids.append(int(chunk_id))
+        paper = (str(title), "" if url is None or url != url else str(url))
+        if paper != self._last_paper:
+            for column, offsets, value in ((self._titles, self._title_offsets, paper[0]),
+                                           (self._urls, self._url_offsets, paper[1])):
+                encoded = value.encode("utf-8")
+                column.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+            self._last_paper = paper
+        self._paper_index.append(len(self._title_offsets) - 2)
+
+    # Writes the column files and swaps the finished directory into place
+    def close(self):
+        self._text.close()
+        self._titles.close()
+        self._urls.close()
+        ids = np.frombuffer(self._ids, dtype="int64") if len(self._ids) else np.empty(0, dtype="int64")
+        order = np.argsort(ids, kind="stable")
+        np.save(os.path.join(self._tmp, "offsets.npy"), np.frombuffer(self._offsets, dtype="int64"))
+        np.save(os.path.join(self._tmp, "ids.npy"), ids)
+        np.save(os.path.join(self._tmp, "sorted_ids.npy"), ids[order])
+        np.save(os.path.join(self._tmp, "sorted_positions.npy"), order.astype("int64"))
+        np.save(os.path.join(self._tmp, "paper_index.npy"), np.array(self._paper_index, dtype="int32"))
+        np.save(os.path.join(self._tmp, "titles_offsets.npy"), np.frombuffer(self._title_offsets, dtype="int64"))
+        np.save(os.path.join(self._tmp, "urls_offsets.npy"), np.frombuffer(self._url_offsets, dtype="int64"))
+
+        # Swap directories so readers see either the old or the new store, never a mix
+        old = f"{self.directory}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.directory):
+            os.replace(self.directory, old)
+        os.replace(self._tmp, self.directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+# Writes all chunks in one go
+def write_chunk_store(directory, chunk_ids, documents, metadata):
+    writer = ChunkStoreWriter(directory)
+    for chunk_id, text, meta in zip(chunk_ids, documents, metadata):
+        writer.add(chunk_id, text, meta["title"], meta["url"])
+    writer.close()
+
+# Read-only view over a chunk store; columns are memory-mapped and decoded on access
+class ChunkStore:
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Chunk store not found at {directory}")
+        self.directory = directory
+        load = lambda name: np.load(os.path.join(directory, name), mmap_mode="r")
+        self._text = _map_bytes(os.path.join(directory, "text.bin"))
+        self._offsets = load("offsets.npy")
+        self.ids = load("ids.npy")
+        self._sorted_ids = load("sorted_ids.npy")
+        self._sorted_positions = load("sorted_positions.npy")
+        self._paper_index = load("paper_index.npy")
+        self._titles = _map_bytes(os.path.join(directory, "titles.bin"))
+        self._title_offsets = load("titles_offsets.npy")
+        self._urls = _map_bytes(os.path.join(directory, "urls.bin"))
+        self._url_offsets = load("urls_offsets.npy")
+        self.documents = _LazyColumn(self, self.text)
+        self.metadata = _LazyColumn(self, self.get_metadata)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Decodes the text of the chunk at a position
+    def text(self, pos):
+        return bytes(self._text[self._offsets[pos]:self._offsets[pos + 1]]).decode("utf-8")
+
+    # Returns the {'title', 'url'} metadata of the chunk at a position
+    def get_metadata(self, pos):
+        paper = self._paper_index[pos]
+        return {
+            "title": bytes(self._titles[self._title_offsets[paper]:self._title_offsets[paper + 1]]).decode("utf-8"),
+            "url": bytes(self._urls[self._url_offsets[paper]:self._url_offsets[paper + 1]]).decode("utf-8")
+        }
+
+    # Finds the position of a chunk id, or None if the store doesn't hold it
+    def position(self, chunk_id):
+        i = int(np.searchsorted(self._sorted_ids, chunk_id))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == chunk_id:
+            return int(self._sorted_positions[i])
+        return None
+
+# Sequence adapter so callers can keep indexing documents/metadata like lists
+class _LazyColumn(Sequence):
+    def __init__(self, store, getter):
+        self._store = store
+        self._getter = getter
+
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self._getter(i) for i in range(*pos.indices(len(self)))]
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError(pos)
+        return self._getter(pos)
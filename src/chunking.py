@@ -0,0 +1,132 @@
+import bisect
+import re
+import numpy as np
+from src.embeddings import EMBEDDING_MODEL
+from src.tokens import token_offsets
+
+# Part of every corpus row hash, so changing how text is chunked re-embeds rows on the next update
+CHUNKER_VERSION = "tokens-v1"
+
+# A sentence boundary is only used if the chunk keeps at least this share of its token budget;
+# otherwise the cut falls back to the last word boundary
+MIN_SENTENCE_FILL = 0.5
+
+# Where a sentence or paragraph ends: right after ., ! or ? (plus closing quotes/brackets) that is
+# followed by whitespace, or just before a blank line. Cutting here keeps the whitespace with the next
+# chunk, which is where tokenizers that fold a leading space into the token put it
+_BOUNDARY = re.compile(r"""[.!?]["')\]]*(?=\s)|(?=\n[^\S\n]*\n)""")
+_WHITESPACE = re.compile(r"\s")
+
+# Yields (start, end) character offsets of chunks of at most max_tokens tokens of the embedding model
+# Cuts prefer the last sentence boundary, then the last word boundary; consecutive chunks share about
+# `overlap` tokens. The text is tokenized once and never copied, so callers slice out only what they keep.
+def chunk_spans(text, max_tokens, overlap=0, model=EMBEDDING_MODEL):
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    overlap = max(0, min(overlap, max_tokens - 1))
+    offsets = token_offsets(text, model)
+    n = len(offsets)
+    if n == 0:
+        return
+    if n <= max_tokens:
+        yield _strip(text, int(offsets[0]), len(text))
+        return
+    boundaries = [match.end() for match in _BOUNDARY.finditer(text)]
+    start = 0
+    while True:
+        start_char = int(offsets[start])
+        if n - start <= max_tokens:
+            yield _strip(text, start_char, len(text))
+            return
+        cut = _cut(text, offsets, boundaries, start, start + max_tokens, max_tokens)
+        yield _strip(text, start_char, int(offsets[cut]))
+        start = _next_start(text, offsets, start, cut, overlap)
+
+# Token index to end a chunk before: a sentence start, else a word start, else the hard token limit
+def _cut(text, offsets, boundaries, start, limit, max_tokens):
+    start_char = int(offsets[start])
+    limit_char = int(offsets[limit])
+    i = bisect.bisect_right(boundaries, limit_char) - 1
+    if i >= 0 and boundaries[i] > start_char:
+        cut = int(np.searchsorted(offsets, boundaries[i]))
+        if cut - start >= max_tokens * MIN_SENTENCE_FILL:
+            return cut
+    if _at_word_start(text, limit_char):
+        return limit
+    space = max(text.rfind(" ", start_char + 1, limit_char), text.rfind("\n", start_char + 1, limit_char))
+    if space > start_char:
+        cut = int(np.searchsorted(offsets, space))
+        if cut > start:
+            return cut
+    return limit
+
+# First token of the next chunk: `overlap` tokens back from the cut, moved forward to a word start
+def _next_start(text, offsets, start, cut, overlap):
+    if not overlap:
+        return cut
+    candidate = max(start + 1, cut - overlap)
+    char = int(offsets[candidate])
+    if not _at_word_start(text, char):
+        match = _WHITESPACE.search(text, char, int(offsets[cut]))
+        if match is None:
+            return cut
+        candidate = int(np.searchsorted(offsets, match.start()))
+    return min(candidate, cut)
+
+def _at_word_start(text, char):
+    return char == 0 or char >= len(text) or text[char].isspace() or text[char - 1].isspace()
+
+# Trims whitespace off a span without slicing the text
+def _strip(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+# The whitespace word chunker used before CHUNKER_VERSION existed; only for re-splitting legacy indexes,
+# whose vectors were embedded from exactly these chunks
+def chunk_words(text, size):
+    words = text.split()
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+# Splits text into token-bounded, sentence-aware chunks
+def chunk_text(text, max_tokens, overlap=0, model=EMBEDDING_MODEL):
+    return [text[start:end] for start, end in chunk_spans(text, max_tokens, overlap, model) if end > start]
+
+# Chunks a sequence of (page_number, text) pages as one document, yielding (chunk, {"page_start", "page_end"})
+# so chunks flow across page breaks while remembering which pages they came from. Pages are consumed
+# lazily: only the unfinished last chunk (which already includes the overlap) is carried into the next page
+def chunk_pages(pages, max_tokens, overlap=0, model=EMBEDDING_MODEL):
+    buffer = ""
+    numbers = []
+    page_starts = []
+    for number, text in pages:
+        if numbers:
+            # Page breaks count as paragraph breaks for the sentence-aware cuts
+            buffer += "\n\n"
+        numbers.append(number)
+        page_starts.append(len(buffer))
+        buffer += text
+        spans = list(chunk_spans(buffer, max_tokens, overlap, model))
+        if not spans:
+            buffer, numbers, page_starts = "", [], []
+            continue
+        # The last span runs to the end of the buffer, so the next page may still extend it
+        for start, end in spans[:-1]:
+            if end > start:
+                yield _page_chunk(buffer, start, end, numbers, page_starts)
+        tail = spans[-1][0]
+        first = bisect.bisect_right(page_starts, tail) - 1
+        buffer = buffer[tail:]
+        numbers = numbers[first:]
+        page_starts = [max(0, page_start - tail) for page_start in page_starts[first:]]
+    for start, end in chunk_spans(buffer, max_tokens, overlap, model):
+        if end > start:
+            yield _page_chunk(buffer, start, end, numbers, page_starts)
+
+def _page_chunk(buffer, start, end, numbers, page_starts):
+    return buffer[start:end], {
+        "page_start": numbers[bisect.bisect_right(page_starts, start) - 1],
+        "page_end": numbers[bisect.bisect_right(page_starts, end - 1) - 1]
+    }
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import threading
+import weakref
+import httpx
+import streamlit as st
+from openai import AsyncOpenAI, OpenAI
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Connection pool and timeout settings shared by every client (overridable via env or configure())
+_settings = {
+    "max_connections": int(os.environ.get("OPENAI_POOL_MAX_CONNECTIONS", 20)),
+    "max_keepalive_connections": int(os.environ.get("OPENAI_POOL_MAX_KEEPALIVE", 10)),
+    "keepalive_expiry": float(os.environ.get("OPENAI_POOL_KEEPALIVE_EXPIRY", 60)),
+    "timeout": float(os.environ.get("OPENAI_TIMEOUT", 60)),
+    "connect_timeout": float(os.environ.get("OPENAI_CONNECT_TIMEOUT", 10))
+}
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+# Updates pool limits/timeouts; clients created afterwards pick up the new settings
+def configure(**settings):
+    unknown = set(settings) - set(_settings)
+    if unknown:
+        raise ValueError(f"Unknown client settings: {', '.join(sorted(unknown))}")
+    with _lock:
+        _settings.update(settings)
+
+def _limits():
+    return httpx.Limits(
+        max_connections=_settings["max_connections"],
+        max_keepalive_connections=_settings["max_keepalive_connections"],
+        keepalive_expiry=_settings["keepalive_expiry"]
+    )
+
+def _timeout():
+    return httpx.Timeout(_settings["timeout"], connect=_settings["connect_timeout"])
+
+# An explicit key first; inside a Streamlit script run, the session's key; otherwise OPENAI_API_KEY
+# Batch runs, benchmarks and the retrieval service have no session, so they pass the key or use the environment
+def _resolve_key(api_key):
+    if api_key:
+        return api_key
+    if get_script_run_ctx(suppress_warning=True) is not None and st.session_state.get("openai_api_key"):
+        return st.session_state["openai_api_key"]
+    return os.environ.get("OPENAI_API_KEY")
+
+# Returns the shared OpenAI client for an API key, reusing one pooled HTTP client per key
+def get_client(api_key=None):
+    api_key = _resolve_key(api_key)
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            http_client = httpx.Client(limits=_limits(), timeout=_timeout())
+            client = OpenAI(api_key=api_key, http_client=http_client)
+            _clients[api_key] = client
+        return client
+
+# Returns the shared AsyncOpenAI client for an API key on the running event loop
+# Async connections belong to the loop that opened them, so clients are kept per loop
+def get_async_client(api_key=None):
+    api_key = _resolve_key(api_key)
+    with _lock:
+        loop_clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+        client = loop_clients.get(api_key)
+        if client is None:
+            http_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+            client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+            loop_clients[api_key] = client
+        return client
+
+# Closes the running loop's async clients and their pooled connections; call it before the loop shuts down
+# (e.g. at the end of the coroutine passed to asyncio.run), since connections can't be closed once it is gone
+async def close_async_clients():
+    with _lock:
+        loop_clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in loop_clients.values():
+        await client.close()
+
+# Awaits a coroutine, then closes the async clients it opened; wrap what you pass to asyncio.run
+async def with_async_clients_closed(coro):
+    try:
+        return await coro
+    finally:
+        await close_async_clients()
+
+# Forgets (and closes) the sync client for a key, e.g. after it failed validation
+def drop_client(api_key):
+    with _lock:
+        client = _clients.pop(api_key, None)
+    if client is not None:
+        client.close()
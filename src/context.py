@@ -0,0 +1,126 @@
+import re
+from src.tokens import count_tokens
+
+# gpt-3.5-turbo context window and the completion budget reserved by the explanation call
+CONTEXT_WINDOW = 4096
+EXPLANATION_TOKENS = 200
+
+# Room for chat formatting and the system message
+_OVERHEAD_TOKENS = 64
+
+# A partially fitting source is only trimmed in if at least this many tokens are left for it
+MIN_SOURCE_TOKENS = 40
+
+# Fraction of the budget the conversation memory may take before it is trimmed
+MEMORY_SHARE = 0.25
+
+# Shortest shared run of words treated as chunker overlap rather than coincidence
+MIN_OVERLAP_WORDS = 5
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Prompt token budget for an answer of max_tokens. The explanation call is the larger of the two:
+# it resends the prompt plus the answer and reserves its own completion, so
+# prompt + answer + explanation + overhead (system message, formatting, its instructions) must fit
+def prompt_token_budget(max_tokens, context_window=CONTEXT_WINDOW):
+    return max(0, context_window - max_tokens - EXPLANATION_TOKENS - _OVERHEAD_TOKENS)
+
+# Splits text into sentences (keeping their punctuation)
+def split_sentences(text):
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+# Returns the longest run of whole sentences that fits in the budget
+# keep="head" keeps the opening sentences, keep="tail" the closing ones; a lone sentence that is
+# too long is cut at a word boundary instead
+def trim_to_tokens(text, budget, keep="head", model="gpt-3.5-turbo"):
+    if budget <= 0:
+        return ""
+    if count_tokens(text, model) <= budget:
+        return text
+    sentences = split_sentences(text)
+    ordered = sentences if keep == "head" else sentences[::-1]
+    kept = 0
+    used = 0
+    for sentence in ordered:
+        used += count_tokens(sentence, model) + 1
+        if used > budget:
+            break
+        kept += 1
+    if kept:
+        return " ".join(sentences[:kept] if keep == "head" else sentences[len(sentences) - kept:])
+    return _trim_words(ordered[0].split(), budget, keep, model)
+
+# Binary search for the most words of one sentence that fit in the budget
+def _trim_words(words, budget, keep, model):
+    def piece(n):
+        return words[:n] if keep == "head" else words[len(words) - n:]
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(" ".join(piece(mid)), model) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(piece(low))
+
+# Drops chunks already covered by a better-ranked one and strips the words a chunk shares with an
+# adjacent chunk of the same paper (the chunkers overlap consecutive windows)
+def dedupe_chunks(docs_metadata):
+    kept = []
+    for chunk, meta in docs_metadata:
+        words = chunk.split()
+        source = (meta.get("title"), meta.get("url"))
+        for kept_words, kept_source in kept:
+            if kept_source != source or not words:
+                continue
+            if f" {' '.join(words)} " in f" {' '.join(kept_words)} ":
+                words = []
+                break
+            words = words[_overlap(kept_words, words):]
+            words = words[:len(words) - _overlap(words, kept_words)]
+        if words:
+            kept.append((words, source))
+            yield " ".join(words), meta
+
+# Length of the longest suffix of first that is also a prefix of second (0 below MIN_OVERLAP_WORDS)
+def _overlap(first, second):
+    for size in range(min(len(first), len(second)), MIN_OVERLAP_WORDS - 1, -1):
+        if first[-size:] == second[:size]:
+            return size
+    return 0
+
+# Formats one numbered source block for the prompt
+def format_source(i, chunk, meta):
+    return f"\n[Source {i}] Title: {meta['title']}\n{chunk}\nURL: {meta['url']}\n"
+
+# Fits sources into a token budget in relevance order; the last source that only partly fits is
+# trimmed at a sentence boundary, and everything after it is dropped
+def pack_sources(docs_metadata, budget, model="gpt-3.5-turbo"):
+    blocks = []
+    used = 0
+    for chunk, meta in dedupe_chunks(docs_metadata):
+        i = len(blocks) + 1
+        block = format_source(i, chunk, meta)
+        cost = count_tokens(block, model)
+        if used + cost > budget:
+            frame = count_tokens(format_source(i, "", meta), model)
+            room = budget - used - frame
+            if room >= MIN_SOURCE_TOKENS:
+                trimmed = trim_to_tokens(chunk, room, model=model)
+                if trimmed:
+                    blocks.append(format_source(i, trimmed, meta))
+            break
+        blocks.append(block)
+        used += cost
+    return "".join(blocks)
+
+# Fits question, memory and sources into a prompt budget, after the fixed instruction text
+# The question is kept whole if at all possible (a pinned upload section is trimmed from the front),
+# memory keeps its most recent part within MEMORY_SHARE, and sources get everything left
+def pack_prompt(fixed_text, question, memory_block, docs_metadata, budget, model="gpt-3.5-turbo"):
+    remaining = budget - count_tokens(fixed_text, model)
+    question = trim_to_tokens(question, remaining, keep="tail", model=model)
+    remaining -= count_tokens(question, model)
+    memory_block = trim_to_tokens(memory_block, int(remaining * MEMORY_SHARE), keep="tail", model=model)
+    remaining -= count_tokens(memory_block, model)
+    return question, memory_block, pack_sources(docs_metadata, remaining, model)
@@ -0,0 +1,88 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from src.tokens import count_tokens
+from src.tracing import record_cache, record_retry, record_usage
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIM = 1536
+
+# Errors worth retrying: rate limits and transient server/network failures
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# Groups texts into contiguous (start, end) batches bounded by a token budget and item count
+def plan_batches(texts, max_batch_tokens=100_000, max_batch_size=512, model=EMBEDDING_MODEL):
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        n_tokens = count_tokens(text, model)
+        if i > start and (batch_tokens + n_tokens > max_batch_tokens or i - start >= max_batch_size):
+            batches.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += n_tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+# Calls the embeddings endpoint, backing off exponentially (with jitter) on retryable errors
+def create_with_retry(client, inputs, model=EMBEDDING_MODEL, max_retries=5, base_delay=1.0):
+    for attempt in range(max_retries + 1):
+        try:
+            response = client.embeddings.create(input=inputs, model=model)
+            record_usage("embeddings", getattr(response, "usage", None), model)
+            return response
+        except RETRYABLE_ERRORS:
+            if attempt == max_retries:
+                raise
+            record_retry("embeddings")
+            time.sleep(base_delay * (2 ** attempt) * (1 + random.random()))
+
+# Embeds many texts with batched, concurrent requests written into one float32 matrix
+def embed_texts(texts, client, model=EMBEDDING_MODEL, dim=EMBEDDING_DIM, max_batch_tokens=100_000,
+                max_batch_size=512, max_workers=4, max_retries=5, out=None, progress=None, cache=None):
+    texts = list(texts)
+    if out is None:
+        out = np.empty((len(texts), dim), dtype="float32")
+    if not texts:
+        return out
+
+    # Serve what we can from the cache and only send the misses over the network
+    if cache is not None:
+        cached = cache.get_many(model, texts)
+        missing = [i for i, vec in enumerate(cached) if vec is None]
+        for i, vec in enumerate(cached):
+            if vec is not None:
+                out[i] = vec
+        record_cache("embeddings", True, len(texts) - len(missing))
+        record_cache("embeddings", False, len(missing))
+        if progress is not None and len(missing) < len(texts):
+            progress(len(texts) - len(missing))
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            vectors = embed_texts(
+                missing_texts, client, model=model, dim=dim, max_batch_tokens=max_batch_tokens,
+                max_batch_size=max_batch_size, max_workers=max_workers, max_retries=max_retries,
+                progress=progress
+            )
+            out[missing] = vectors
+            cache.put_many(model, missing_texts, vectors)
+        return out
+
+    def embed_batch(bounds):
+        start, end = bounds
+        response = create_with_retry(client, texts[start:end], model=model, max_retries=max_retries)
+        # The API may return items out of order, so place each one by its index
+        for item in response.data:
+            out[start + item.index] = item.embedding
+        if progress is not None:
+            progress(end - start)
+
+    batches = plan_batches(texts, max_batch_tokens, max_batch_size, model)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        # Consume the iterator so worker exceptions are raised here
+        list(pool.map(embed_batch, batches))
+    return out
@@ -1,13 +1,15 @@
 import streamlit as st
-from openai import OpenAI
+from src.clients import get_client
+from src.context import format_source, pack_prompt
+from src.tracing import record_usage, traced
 
-# Builds a complete prompt using context, memory, and style settings
-def build_prompt(question, docs_metadata, style="Default", memory_block="", cot=False):
-    # Compile the document chunks into a referenceable context block
-    context = ""
-    for i, (chunk, meta) in enumerate(docs_metadata, start=1):
-        context += f"\n[Source {i}] Title: {meta['title']}\n{chunk}\nURL: {meta['url']}\n"
+CHAT_MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are a knowledgeable AI assistant."
+ANSWER_FALLBACK = "I'm sorry, I couldn't generate an answer right now."
 
+# Builds a complete prompt using context, memory, and style settings
+# With a token_budget, sources, memory and question are packed to fit it (see src.context)
+def build_prompt(question, docs_metadata, style="Default", memory_block="", cot=False, token_budget=None):
     # Define available prompt styles the user can choose from
     instructions = {
         "Default": "Answer the question using the context provided.",
@@ -23,31 +25,67 @@ def build_prompt(question, docs_metadata, style="Default", memory_block="", cot=
     # If CoT is enabled, encourage step-by-step reasoning
     cot_instruction = "\nRespond by thinking through the answer step by step." if cot else ""
 
-    # Assemble the final prompt for the model
-    prompt = (
+    header = (
         "You are an expert AI assistant helping users understand concepts in artificial intelligence.\n\n"
         f"{style_instruction}{cot_instruction}\n"
-        f"{memory_block}\n\n"
-        f"Question: {question}\n\n"
-        f"Context:\n{context}\n\n"
+    )
+
+    # Compile the document chunks into a referenceable context block
+    if token_budget is None:
+        context = "".join(format_source(i, chunk, meta) for i, (chunk, meta) in enumerate(docs_metadata, start=1))
+    else:
+        fixed_text = header + "\n\nQuestion: \n\nContext:\n\n\nAnswer:"
+        question, memory_block, context = pack_prompt(fixed_text, question, memory_block, docs_metadata, token_budget, CHAT_MODEL)
+
+    # Assemble the final prompt for the model
+    return "".join([
+        header,
+        f"{memory_block}\n\n",
+        f"Question: {question}\n\n",
+        f"Context:\n{context}\n\n",
         "Answer:"
+    ])
+
+# Builds the follow-up prompt asking the model to justify an answer
+def build_explanation_prompt(answer, prompt):
+    return (
+        "You are a helpful AI tutor. Briefly explain why the following answer is accurate, "
+        "based on the context it was built from.\n\n"
+        f"Answer:\n{answer}\n\n"
+        f"Context:\n{prompt}\n\n"
+        "Explain why this answer makes sense:"
     )
-    return prompt
 
-# Sends the prompt to OpenAI and returns the generated answer
-def generate_answer(prompt, temperature=0.2, max_tokens=300):
-    client = OpenAI(api_key=st.session_state.get("openai_api_key"))
+# Sends the prompt to OpenAI and yields the answer as text deltas while it is generated
+# On failure, shows the error and yields the fallback message (unless part of the answer already arrived)
+@traced("answer")
+def generate_answer_stream(prompt, temperature=0.2, max_tokens=300):
+    client = get_client()
+    streamed = False
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        stream = client.chat.completions.create(
+            model=CHAT_MODEL,
             messages=[
-                {"role": "system", "content": "You are a knowledgeable AI assistant."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
         )
-        return response.choices[0].message.content.strip()
+        for chunk in stream:
+            # The final chunk carries token usage and no choices
+            record_usage("answer", getattr(chunk, "usage", None), CHAT_MODEL)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                streamed = True
+                yield delta
     except Exception as e:
         st.error(f"Answer generation failed: {e}")
-        return "I'm sorry, I couldn't generate an answer right now."
\ No newline at end of file
+        if not streamed:
+            yield ANSWER_FALLBACK
+
+# Sends the prompt to OpenAI and returns the generated answer
+def generate_answer(prompt, temperature=0.2, max_tokens=300):
+    return "".join(generate_answer_stream(prompt, temperature, max_tokens)).strip()
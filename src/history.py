@@ -0,0 +1,110 @@
+import datetime
+import os
+import sqlite3
+import threading
+import pandas as pd
+
+DEFAULT_HISTORY_PATH = "data/history.sqlite"
+LEGACY_CSV_PATH = "data/history.csv"
+
+# Question/answer history in SQLite (WAL mode, so several sessions or processes can write safely)
+# Appends are written through by default, so a crash loses nothing and other processes see them at once;
+# bulk writers can pass a larger batch_size. recent(n) reads walk the primary key backwards
+class HistoryStore:
+    def __init__(self, path=DEFAULT_HISTORY_PATH, csv_path=LEGACY_CSV_PATH, batch_size=1):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, question TEXT NOT NULL, "
+            "answer TEXT NOT NULL)"
+        )
+        # recent() walks the primary key; a timestamp index would only slow down every append
+        self._conn.execute("DROP INDEX IF EXISTS idx_history_timestamp")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS history_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        if csv_path:
+            self.migrate_csv(csv_path)
+
+    # One-time import of the old history.csv; the file is renamed afterwards so it is never read again
+    def migrate_csv(self, csv_path, chunk_rows=10_000):
+        if not os.path.exists(csv_path):
+            return 0
+        imported = 0
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock, so two processes starting together can't both import
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                done = self._conn.execute("SELECT value FROM history_meta WHERE key = 'csv_migrated'").fetchone()
+                if done is None:
+                    for rows in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+                        self._conn.executemany(
+                            "INSERT INTO history (timestamp, question, answer) VALUES (?, ?, ?)",
+                            rows[["timestamp", "question", "answer"]].itertuples(index=False, name=None)
+                        )
+                        imported += len(rows)
+                    self._conn.execute("INSERT INTO history_meta (key, value) VALUES ('csv_migrated', ?)", (csv_path,))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        if os.path.exists(csv_path):
+            os.replace(csv_path, f"{csv_path}.migrated")
+        return imported
+
+    # Queues one question/answer pair; the queue is written once it reaches batch_size (or on read)
+    def append(self, question, answer, timestamp=None):
+        timestamp = timestamp or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._pending.append((timestamp, question, answer))
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    # Writes any queued entries in one transaction
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        self._conn.executemany("INSERT INTO history (timestamp, question, answer) VALUES (?, ?, ?)", self._pending)
+        self._conn.commit()
+        self._pending = []
+
+    # Returns the n most recent entries, newest first, as {'timestamp', 'question', 'answer'} dicts
+    def recent(self, n=5):
+        with self._lock:
+            self._flush()
+            rows = self._conn.execute(
+                "SELECT timestamp, question, answer FROM history ORDER BY id DESC LIMIT ?", (int(n),)
+            ).fetchall()
+        return [{"timestamp": ts, "question": q, "answer": a} for ts, q, a in rows]
+
+    # Total number of stored entries
+    def __len__(self):
+        with self._lock:
+            self._flush()
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+# Returns the process-wide history store
+def get_history_store(path=None):
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = HistoryStore(path or os.environ.get("HISTORY_DB_PATH", DEFAULT_HISTORY_PATH))
+        return _shared_store
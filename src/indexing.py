@@ -0,0 +1,111 @@
+import math
+import faiss
+import numpy as np
+
+# Supported index layouts, from exact brute force to approximate
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# "l2" searches raw vectors by Euclidean distance; "ip" L2-normalizes them and ranks by cosine similarity
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+
+# How each vector is stored: full float32, or scalar-quantized to 2 bytes (fp16) / 1 byte (int8) per dimension
+STORAGE_CODES = {"fp32": "Flat", "fp16": "SQfp16", "int8": "SQ8"}
+
+# Rule of thumb for IVF: about 4*sqrt(n) lists, but at least 39 training points per list
+def default_nlist(n_vectors):
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+# Largest number of PQ sub-quantizers <= requested that evenly divides the dimension
+def _pq_subquantizers(dim, requested):
+    return max(m for m in range(1, min(requested, dim) + 1) if dim % m == 0)
+
+# Builds the FAISS factory string for an index type
+# IVF indexes manage ids natively; flat and HNSW are wrapped in IDMap2 so ids survive
+def index_factory_string(index_type, dim, n_vectors, nlist=None, pq_m=64, hnsw_m=32, storage="fp32"):
+    if storage not in STORAGE_CODES:
+        raise ValueError(f"Unknown storage '{storage}'. Choose one of: {', '.join(STORAGE_CODES)}")
+    code = STORAGE_CODES[storage]
+    if index_type == "flat":
+        return f"IDMap2,{code}"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m}" if storage == "fp32" else f"IDMap2,HNSW{hnsw_m}_{code}"
+    nlist = min(nlist or default_nlist(n_vectors), max(1, n_vectors))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},{code}"
+    if index_type == "ivf_pq":
+        # PQ codes are already compressed, so the storage option doesn't apply
+        # PQ wants ~39 training points per codeword, so shrink codes for small corpora
+        nbits = max(1, min(8, int(math.log2(max(2, n_vectors // 39)))))
+        return f"IVF{nlist},PQ{_pq_subquantizers(dim, pq_m)}x{nbits}"
+    raise ValueError(f"Unknown index type '{index_type}'. Choose one of: {', '.join(INDEX_TYPES)}")
+
+# Creates an empty index of the requested type
+def create_index(index_type, dim, n_vectors, nlist=None, pq_m=64, hnsw_m=32, metric="l2", storage="fp32"):
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Choose one of: {', '.join(METRICS)}")
+    index = faiss.index_factory(
+        dim,
+        index_factory_string(index_type, dim, n_vectors, nlist, pq_m, hnsw_m, storage),
+        METRICS[metric]
+    )
+
+    return enable_reconstruct(index)
+
+# Gives IVF indexes a hashtable direct map so they can reconstruct vectors by id and still remove ids
+# Indexes saved with one keep it; call this once on load for older files, never on the query path
+# (building the map mutates the index, which would race concurrent searches)
+def enable_reconstruct(index):
+    ivf = _extract_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+# Returns True if vectors can be reconstructed by id without modifying the index
+def can_reconstruct(index):
+    ivf = _extract_ivf(index)
+    return ivf is None or ivf.direct_map.type != faiss.DirectMap.NoMap
+
+# Returns float32 vectors ready for the index: L2-normalized copies for inner-product indexes
+def prepare_vectors(index, vectors):
+    vectors = np.array(vectors, dtype="float32", copy=True, ndmin=2)
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        faiss.normalize_L2(vectors)
+    return vectors
+
+# Trains the index (IVF centroids / PQ codebooks) on a random sample of the vectors
+def train_index(index, vectors, sample_size=100_000, seed=0):
+    if index.is_trained:
+        return
+    if len(vectors) > sample_size:
+        rows = np.random.default_rng(seed).choice(len(vectors), sample_size, replace=False)
+        vectors = vectors[np.sort(rows)]
+    index.train(np.ascontiguousarray(vectors, dtype="float32"))
+
+# Applies query-time knobs: nprobe for IVF indexes, efSearch for HNSW
+def set_search_params(index, nprobe=None, ef_search=None):
+    ivf = _extract_ivf(index)
+    if ivf is not None and nprobe is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    hnsw = _extract_hnsw(index)
+    if hnsw is not None and ef_search is not None:
+        hnsw.hnsw.efSearch = ef_search
+    return index
+
+# Returns True if ids can be removed in place (HNSW graphs don't support deletion)
+def supports_removal(index):
+    return _extract_hnsw(index) is None
+
+# Returns True if IO_FLAG_MMAP maps the stored vectors instead of reading them into memory
+# FAISS only maps IVF inverted lists; flat, HNSW and scalar-quantized flat indexes are loaded in full
+def supports_mmap(index):
+    return _extract_ivf(index) is not None
+
+def _extract_ivf(index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+def _extract_hnsw(index):
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return inner if hasattr(inner, "hnsw") else None
@@ -0,0 +1,136 @@
+import json
+import math
+import os
+import re
+import shutil
+from array import array
+import numpy as np
+
+# Letters/digits runs, keeping inner dots and hyphens so names like "gpt-3.5" or "t5-base" stay whole
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+# Very common words carry no ranking signal but have the longest postings lists
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in into is it its of on or that the "
+    "their there these this to use used using was we what when where which while who why will with you".split()
+)
+
+# Lowercased terms of a text, without stopwords
+def tokenize(text):
+    return [term for term in _TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+# Streams chunks into a BM25 inverted index stored as CSR postings arrays next to the FAISS index
+class LexicalIndexWriter:
+    def __init__(self, directory):
+        self.directory = directory
+        self._tmp = f"{directory}.tmp"
+        shutil.rmtree(self._tmp, ignore_errors=True)
+        os.makedirs(self._tmp)
+        self._ids = array("q")
+        self._lengths = array("I")
+        self._postings = {}
+
+    # Adds one chunk under its index id
+    def add(self, chunk_id, text):
+        position = len(self._ids)
+        self._ids.append(int(chunk_id))
+        terms = tokenize(text)
+        self._lengths.append(len(terms))
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("i"), array("H"))
+            postings[0].append(position)
+            postings[1].append(min(count, 65535))
+
+    # Writes vocabulary, postings and document lengths, then swaps the directory into place
+    def close(self):
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        np.cumsum([len(self._postings[term][0]) for term in terms], out=offsets[1:])
+        positions = np.empty(offsets[-1], dtype="int32")
+        frequencies = np.empty(offsets[-1], dtype="uint16")
+        for i, term in enumerate(terms):
+            docs, counts = self._postings[term]
+            positions[offsets[i]:offsets[i + 1]] = docs
+            frequencies[offsets[i]:offsets[i + 1]] = counts
+
+        np.save(os.path.join(self._tmp, "offsets.npy"), offsets)
+        np.save(os.path.join(self._tmp, "positions.npy"), positions)
+        np.save(os.path.join(self._tmp, "frequencies.npy"), frequencies)
+        np.save(os.path.join(self._tmp, "ids.npy"), np.array(self._ids, dtype="int64"))
+        np.save(os.path.join(self._tmp, "lengths.npy"), np.array(self._lengths, dtype="uint32"))
+        with open(os.path.join(self._tmp, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+
+        old = f"{self.directory}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.directory):
+            os.replace(self.directory, old)
+        os.replace(self._tmp, self.directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+# Writes a lexical index for all chunks in one go
+def write_lexical_index(directory, chunk_ids, documents):
+    writer = LexicalIndexWriter(directory)
+    for chunk_id, text in zip(chunk_ids, documents):
+        writer.add(chunk_id, text)
+    writer.close()
+
+# Read-only BM25 index; postings are memory-mapped and only the query terms' slices are touched
+class LexicalIndex:
+    def __init__(self, directory, k1=1.2, b=0.75):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Lexical index not found at {directory}")
+        load = lambda name: np.load(os.path.join(directory, name), mmap_mode="r")
+        self._offsets = load("offsets.npy")
+        self._positions = load("positions.npy")
+        self._frequencies = load("frequencies.npy")
+        self.ids = load("ids.npy")
+        with open(os.path.join(directory, "vocab.json"), encoding="utf-8") as f:
+            self._vocab = {term: i for i, term in enumerate(json.load(f))}
+        lengths = np.load(os.path.join(directory, "lengths.npy")).astype("float32")
+        average = float(lengths.mean()) if len(lengths) else 0.0
+        self.k1 = k1
+        # Per-document BM25 length normalization, precomputed once
+        self._norms = k1 * (1 - b + b * lengths / average) if average else np.full(len(lengths), k1, dtype="float32")
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Returns (scores, chunk_ids) of the k best BM25 matches, best first
+    def search(self, query, k=10):
+        n_docs = len(self.ids)
+        matched = []
+        contributions = []
+        for term in set(tokenize(query)):
+            row = self._vocab.get(term)
+            if row is None:
+                continue
+            start, end = self._offsets[row], self._offsets[row + 1]
+            docs = np.asarray(self._positions[start:end])
+            tf = np.asarray(self._frequencies[start:end], dtype="float32")
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            matched.append(docs)
+            contributions.append(idf * tf * (self.k1 + 1) / (tf + self._norms[docs]))
+        if not matched:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+
+        # Sum per-term contributions per document without touching documents that matched nothing
+        docs, inverse = np.unique(np.concatenate(matched), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contributions)).astype("float32")
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return scores[top], np.asarray(self.ids)[docs[top]]
+
+# Reciprocal-rank fusion: merges ranked lists of keys into one ranking, best first
+# Each list contributes 1 / (k + rank) per key; k=60 is the usual constant from the RRF paper
+def reciprocal_rank_fusion(rankings, k=60):
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda key: -scores[key])
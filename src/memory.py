@@ -1,3 +1,10 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.context import split_sentences, trim_to_tokens
+from src.generator import CHAT_MODEL
+from src.tokens import count_tokens
+
 # Add a new question and answer pair to memory and keep only the most recent entries
 def add_to_memory(memory, question, answer, max_memory=2):
     memory.append((question, answer))
@@ -10,4 +17,124 @@ def format_memory_prompt(memory):
     formatted = "\n\n".join(
         [f"Previous Q: {q}\nPrevious A: {a}" for q, a in memory]
     )
-    return f"\n\n[CONTEXT FROM PAST INTERACTIONS]\n{formatted}"
\ No newline at end of file
+    return f"\n\n[CONTEXT FROM PAST INTERACTIONS]\n{formatted}"
+
+# Token-bounded conversation memory: recent turns stay verbatim, older turns are folded into a
+# running summary on a background thread, and a relevant older turn can be recalled by similarity
+class ConversationMemory:
+    def __init__(self, token_budget=600, recent_turns=2, summary_tokens=200, recall_threshold=0.8, client=None):
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summary_tokens = summary_tokens
+        self.recall_threshold = recall_threshold
+        self.client = client
+        self.turns = []
+        self.summary = ""
+        self._summarized = 0
+        self._lock = threading.Lock()
+        self._summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+        self._pending = None
+
+    # Records a finished turn; the question vector (if any) enables recall once the turn is summarized
+    def add(self, question, answer, vector=None, client=None):
+        if client is not None:
+            self.client = client
+        with self._lock:
+            self.turns.append((question, answer, None if vector is None else np.asarray(vector, dtype="float32")))
+            due = len(self.turns) - self._summarized > self.recent_turns
+        if due:
+            self._pending = self._summarizer.submit(self._summarize)
+
+    # Recent (question, answer) pairs shown verbatim in prompts
+    def recent(self):
+        with self._lock:
+            return [(q, a) for q, a, _ in self.turns[self._summarized:]]
+
+    # Blocks until background summarization has caught up (used by tests and shutdown)
+    def wait(self, timeout=None):
+        if self._pending is not None:
+            self._pending.result(timeout)
+
+    # Folds every turn older than the recent window into the running summary
+    def _summarize(self):
+        with self._lock:
+            end = len(self.turns) - self.recent_turns
+            if end <= self._summarized:
+                return
+            old_turns = self.turns[self._summarized:end]
+            summary = self.summary
+        exchanges = "\n".join(f"Q: {q}\nA: {a}" for q, a, _ in old_turns)
+        try:
+            summary = self._request_summary(summary, exchanges)
+        except Exception:
+            # Without the API, keep an extractive summary: each question with the answer's first sentence
+            lines = [f"Q: {q} A: {(split_sentences(a) or [''])[0]}" for q, a, _ in old_turns]
+            summary = " ".join(filter(None, [summary, *lines]))
+        summary = trim_to_tokens(summary, self.summary_tokens, keep="tail")
+        with self._lock:
+            self.summary = summary
+            self._summarized = end
+
+    def _request_summary(self, summary, exchanges):
+        if self.client is None:
+            raise RuntimeError("no client for summarization")
+        response = self.client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": "You maintain a compact running summary of a study session."},
+                {"role": "user", "content": (
+                    f"Current summary:\n{summary or '(empty)'}\n\nNew exchanges:\n{exchanges}\n\n"
+                    "Rewrite the summary to include the new exchanges. Keep the topics covered and key facts; "
+                    f"stay under {int(self.summary_tokens * 0.75)} words."
+                )}
+            ],
+            temperature=0.2,
+            max_tokens=self.summary_tokens
+        )
+        return response.choices[0].message.content.strip()
+
+    # Most similar summarized turn to the query, if it clears the recall threshold
+    def _recall(self, query_vector):
+        if query_vector is None or not np.any(query_vector):
+            return None
+        query = np.asarray(query_vector, dtype="float32")
+        query = query / np.linalg.norm(query)
+        best = None
+        best_score = self.recall_threshold
+        for q, a, vector in self.turns[:self._summarized]:
+            if vector is None or not np.any(vector):
+                continue
+            score = float(vector @ query / np.linalg.norm(vector))
+            if score >= best_score:
+                best, best_score = (q, a), score
+        return best
+
+    # Builds the memory block for a prompt, never exceeding the token budget
+    # Most recent turns get priority, then the recalled turn, then the summary
+    def format(self, query_vector=None):
+        with self._lock:
+            recent = [(q, a) for q, a, _ in self.turns[self._summarized:]]
+            recalled = self._recall(query_vector)
+            summary = self.summary
+        if not (recent or summary):
+            return ""
+
+        header = "\n\n[CONTEXT FROM PAST INTERACTIONS]\n"
+        remaining = self.token_budget - count_tokens(header)
+        parts = []
+        for q, a in reversed(recent):
+            block = trim_to_tokens(f"Previous Q: {q}\nPrevious A: {a}", remaining)
+            if not block:
+                break
+            parts.append(block)
+            remaining -= count_tokens(block) + 1
+        if recalled is not None and remaining > 0:
+            block = trim_to_tokens(f"Related earlier Q: {recalled[0]}\nRelated earlier A: {recalled[1]}", remaining)
+            if block:
+                parts.append(block)
+                remaining -= count_tokens(block) + 1
+        if summary and remaining > 0:
+            block = trim_to_tokens(f"Summary of earlier conversation: {summary}", remaining, keep="tail")
+            if block:
+                parts.append(block)
+        return header + "\n\n".join(reversed(parts))
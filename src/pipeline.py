@@ -0,0 +1,293 @@
+import asyncio
+import queue
+import threading
+import time
+import numpy as np
+from src.cache import get_embedding_cache
+from src.clients import get_async_client
+from src.context import prompt_token_budget
+from src.embeddings import EMBEDDING_DIM, EMBEDDING_MODEL
+from src.generator import ANSWER_FALLBACK, CHAT_MODEL, SYSTEM_PROMPT, build_explanation_prompt, build_prompt
+from src.lexical import reciprocal_rank_fusion
+from src.semantic_cache import settings_key
+from src.session_index import similarity_scores
+from src.tracing import record_cache, record_usage, span, trace, traced
+
+# Retrieval candidates come from the corpus index or the session's upload index
+CORPUS = "corpus"
+UPLOAD = "upload"
+
+# Each retriever returns k * HYBRID_DEPTH candidates so rank fusion has enough overlap to work with
+HYBRID_DEPTH = 4
+
+# One long-lived event loop in a daemon thread, so async clients (and their pooled
+# connections) survive across Streamlit reruns instead of dying with each asyncio.run()
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="query-pipeline", daemon=True).start()
+        return _loop
+
+# Runs a coroutine on the pipeline loop and blocks until it finishes
+def run(coro, timeout=None):
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+# Embeds a query, serving repeats from the shared embedding cache
+@traced("embed")
+async def embed_query_async(client, query, cache=None):
+    cache = cache if cache is not None else get_embedding_cache()
+    cached = cache.get(EMBEDDING_MODEL, query)
+    record_cache("embeddings", cached is not None)
+    if cached is not None:
+        return cached
+    response = await client.embeddings.create(input=query, model=EMBEDDING_MODEL)
+    record_usage("embed", getattr(response, "usage", None), EMBEDDING_MODEL)
+    vector = np.array(response.data[0].embedding).astype("float32")
+    cache.put(EMBEDDING_MODEL, query, vector)
+    return vector
+
+# Streams a chat completion, passing each delta to on_token, and returns the full text
+# Token usage (sent in the stream's final chunk) is recorded under the given stage
+async def stream_completion(client, prompt, temperature, max_tokens, on_token=None, stage="answer"):
+    stream = await client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    parts = []
+    async for chunk in stream:
+        record_usage(stage, getattr(chunk, "usage", None), CHAT_MODEL)
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            if on_token is not None:
+                on_token(delta)
+    return "".join(parts).strip()
+
+# Full question-answering pipeline: embed -> (semantic cache) -> search -> prompt -> answer -> explanation
+# Returns the answer, explanation, sources, prompt, any errors, per-stage timings (seconds) and the
+# request trace (spans, token usage and cost, cache lookups, retries)
+async def answer_question(question, store, index, api_key, **kwargs):
+    with trace("question") as active:
+        result = await _answer_question(question, store, index, api_key, **kwargs)
+    result["trace"] = active.to_dict()
+    return result
+
+async def _answer_question(question, store, index, api_key, style="Default", memory_block="", cot=False,
+                          temperature=0.2, max_tokens=300, k=3, on_token=None, on_answer=None,
+                          semantic_cache=None, session_index=None, memory=None, reranker=None):
+    client = get_async_client(api_key)
+    timings = {}
+    errors = []
+    started = time.perf_counter()
+
+    stage = time.perf_counter()
+    try:
+        q_emb = await embed_query_async(client, question)
+    except Exception as e:
+        errors.append(f"Embedding failed: {e}")
+        q_emb = np.zeros(EMBEDDING_DIM, dtype="float32")
+    timings["embed"] = time.perf_counter() - stage
+
+    # A ConversationMemory builds its block per query (recalling related earlier turns)
+    if memory is not None:
+        memory_block = memory.format(q_emb)
+
+    # A near-identical earlier question with the same settings, conversation context and index skips both
+    # chat completions (not with an upload in play: cached answers only cite the corpus)
+    settings = settings_key(
+        style, temperature, cot, max_tokens, k, reranker is not None, memory_block, corpus_version(store, index)
+    )
+    if session_index is not None:
+        semantic_cache = None
+    if semantic_cache is not None:
+        stage = time.perf_counter()
+        with span("semantic_cache"):
+            cached = await asyncio.to_thread(semantic_cache.lookup, q_emb, settings)
+        record_cache("semantic", cached is not None)
+        timings["semantic_cache"] = time.perf_counter() - stage
+        if cached is not None:
+            return _cached_result(
+                question, cached, store, q_emb, style, memory_block, cot, max_tokens, timings, started, on_token,
+                on_answer, errors
+            )
+
+    # Dense and BM25 candidates are fused by rank; if embedding failed, lexical search carries on alone
+    # FAISS releases the GIL, so searching in a worker thread keeps the loop responsive
+    stage = time.perf_counter()
+    depth = k * HYBRID_DEPTH
+    # A reranker picks the final k from a wider pool
+    if reranker is not None:
+        depth = max(depth, reranker.candidates)
+    dense = []
+    if np.any(q_emb):
+        D, I = await asyncio.to_thread(store.search, index, q_emb.reshape(1, -1), depth)
+        upload_scores, upload_ids = [], []
+        if session_index is not None:
+            upload_scores, upload_ids = await asyncio.to_thread(session_index.search, q_emb, depth)
+        dense = rank_dense(index, D[0], I[0], upload_scores, upload_ids)
+    _, lexical_ids = await asyncio.to_thread(store.lexical_search, question, depth)
+    fused = reciprocal_rank_fusion([dense, [(CORPUS, int(i)) for i in lexical_ids]])
+    timings["search"] = time.perf_counter() - stage
+    if reranker is not None:
+        stage = time.perf_counter()
+        sources = {CORPUS: (store, index)}
+        if session_index is not None:
+            sources[UPLOAD] = (session_index, session_index.index)
+        with span("rerank"):
+            ranked, matched_docs = await asyncio.to_thread(reranker.rerank, question, q_emb, fused, sources, k)
+        timings["rerank"] = time.perf_counter() - stage
+    else:
+        ranked = fused[:k]
+        matched_docs = [
+            doc for source, chunk_id in ranked for doc in (store if source == CORPUS else session_index).lookup([chunk_id])
+        ]
+    source_ids = [chunk_id for source, chunk_id in ranked if source == CORPUS]
+
+    prompt = build_prompt(
+        question=question,
+        docs_metadata=matched_docs,
+        style=style,
+        memory_block=memory_block,
+        cot=cot,
+        token_budget=prompt_token_budget(max_tokens)
+    )
+
+    stage = time.perf_counter()
+    first_token = []
+
+    def record_token(delta):
+        if not first_token:
+            first_token.append(time.perf_counter() - stage)
+        if on_token is not None:
+            on_token(delta)
+
+    try:
+        with span("answer"):
+            answer = await stream_completion(client, prompt, temperature, max_tokens, record_token)
+    except Exception as e:
+        errors.append(f"Answer generation failed: {e}")
+        answer = ANSWER_FALLBACK
+    timings["answer_first_token"] = first_token[0] if first_token else None
+    timings["answer"] = time.perf_counter() - stage
+    if on_answer is not None:
+        on_answer(answer)
+
+    # The explanation only needs the finished answer, so it starts the moment streaming ends
+    stage = time.perf_counter()
+    try:
+        with span("explanation"):
+            explanation = await stream_completion(
+                client, build_explanation_prompt(answer, prompt), 0.3, 200, stage="explanation"
+            )
+    except Exception as e:
+        errors.append(f"Answer generation failed: {e}")
+        explanation = ANSWER_FALLBACK
+    timings["explanation"] = time.perf_counter() - stage
+
+    # Only clean answers are worth reusing; fallbacks would be served again and again
+    # The prompt isn't stored: a hit rebuilds it from the question and source ids
+    if semantic_cache is not None and not errors:
+        payload = {"answer": answer, "explanation": explanation, "source_ids": source_ids}
+        await asyncio.to_thread(semantic_cache.add, q_emb, settings, payload)
+    timings["total"] = time.perf_counter() - started
+
+    return {
+        "answer": answer,
+        "explanation": explanation,
+        "matched_docs": matched_docs,
+        "source_ids": source_ids,
+        "prompt": prompt,
+        "errors": errors,
+        "timings": timings,
+        "query_vector": q_emb,
+        "cached": False
+    }
+
+# Identifies the corpus index that source ids refer to: the store's saved/loaded index version, or
+# the vector count for stores that never touched disk
+def corpus_version(store, index):
+    version = store.index_version() if hasattr(store, "index_version") else None
+    return version or f"ntotal-{index.ntotal}"
+
+# Merges corpus and upload vector hits into one ranking of (source, id) keys, best similarity first
+def rank_dense(index, scores, ids, upload_scores, upload_ids):
+    candidates = [
+        (score, CORPUS, int(chunk_id)) for score, chunk_id in zip(similarity_scores(index, scores), ids) if chunk_id >= 0
+    ] + [(score, UPLOAD, int(chunk_id)) for score, chunk_id in zip(upload_scores, upload_ids) if chunk_id >= 0]
+    candidates.sort(key=lambda candidate: -candidate[0])
+    return [(source, chunk_id) for _, source, chunk_id in candidates]
+
+# Builds a pipeline result from a semantic cache hit, with the prompt rebuilt for this question
+def _cached_result(question, cached, store, q_emb, style, memory_block, cot, max_tokens, timings, started, on_token,
+                   on_answer, errors):
+    if on_token is not None:
+        on_token(cached["answer"])
+    if on_answer is not None:
+        on_answer(cached["answer"])
+    matched_docs = store.lookup(cached["source_ids"])
+    prompt = build_prompt(
+        question=question,
+        docs_metadata=matched_docs,
+        style=style,
+        memory_block=memory_block,
+        cot=cot,
+        token_budget=prompt_token_budget(max_tokens)
+    )
+    timings["total"] = time.perf_counter() - started
+    return {
+        "answer": cached["answer"],
+        "explanation": cached["explanation"],
+        "matched_docs": matched_docs,
+        "source_ids": cached["source_ids"],
+        "prompt": prompt,
+        "errors": errors,
+        "timings": timings,
+        "query_vector": q_emb,
+        "cached": True
+    }
+
+# Thread-safe iterator over answer deltas produced on the pipeline loop (usable with st.write_stream)
+class TokenStream:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._streamed = False
+
+    def put(self, delta):
+        self._streamed = True
+        self._queue.put(delta)
+
+    # Ends the stream; if nothing was streamed (e.g. a fallback answer), emit the final text once
+    def finish(self, answer=None):
+        if answer and not self._streamed:
+            self._queue.put(answer)
+        self._queue.put(None)
+
+    def __iter__(self):
+        while True:
+            delta = self._queue.get()
+            if delta is None:
+                return
+            yield delta
+
+# Starts answer_question in the background and returns (answer token stream, future of the full result)
+def stream_question(question, store, index, **kwargs):
+    tokens = TokenStream()
+    future = asyncio.run_coroutine_threadsafe(
+        answer_question(question, store, index, on_token=tokens.put, on_answer=tokens.finish, **kwargs),
+        _get_loop()
+    )
+    # Make sure readers are released even if the pipeline fails before the answer stage
+    future.add_done_callback(lambda _: tokens.finish())
+    return tokens, future
@@ -0,0 +1,145 @@
+import os
+import threading
+import numpy as np
+from src.indexing import can_reconstruct
+from src.pipeline import CORPUS
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:
+    CrossEncoder = None
+
+# How many fused candidates the reranker looks at before picking the final k
+RERANK_CANDIDATES = 50
+
+# MMR trade-off: 1.0 ranks purely by relevance, 0.0 purely by novelty
+MMR_LAMBDA = 0.7
+
+# A small CPU-friendly cross-encoder, used when sentence-transformers is installed and it is enabled
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Stored vectors for a list of ids, or None if the index can't hand them back (a remote index, or an IVF
+# index loaded without a direct map). The index is only read: it is shared by concurrent searches
+def stored_vectors(index, ids):
+    if not hasattr(index, "reconstruct_batch") or not can_reconstruct(index):
+        return None
+    return index.reconstruct_batch(np.asarray(ids, dtype="int64"))
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+# Maximal marginal relevance: repeatedly picks the candidate that is most relevant and least similar
+# to what was already picked. `groups` (optional) holds a paper key per candidate; once a group is
+# picked its other members are dropped. Returns positions into the candidate list, best first.
+def mmr(vectors, relevance, k=3, lambda_=MMR_LAMBDA, groups=None):
+    n = len(relevance)
+    if n == 0:
+        return []
+    relevance = np.asarray(relevance, dtype="float32")
+    if vectors is None:
+        similarity = np.zeros((n, n), dtype="float32")
+    else:
+        unit = _normalize(vectors)
+        similarity = unit @ unit.T
+    # Highest similarity of each candidate to anything selected so far
+    redundancy = np.zeros(n, dtype="float32")
+    available = np.ones(n, dtype=bool)
+    selected = []
+    while len(selected) < k and available.any():
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        if groups is not None and groups[best] is not None:
+            available &= np.array([group != groups[best] for group in groups])
+    return selected
+
+# Scales scores to [0, 1] so cross-encoder logits and cosine similarities mix with the MMR penalty
+def _rescale(scores):
+    scores = np.asarray(scores, dtype="float32")
+    spread = scores.max() - scores.min() if len(scores) else 0
+    return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+# Turns a wide fused candidate list into a short, diverse top-k:
+# relevance (cosine to the query, or a cross-encoder score) + MMR over the stored vectors + one chunk per paper
+class Reranker:
+    def __init__(self, candidates=RERANK_CANDIDATES, lambda_=MMR_LAMBDA, collapse_papers=True, cross_encoder=None):
+        self.candidates = candidates
+        self.lambda_ = lambda_
+        self.collapse_papers = collapse_papers
+        self.cross_encoder = cross_encoder
+
+    # keys are (source, chunk_id) pairs best-first; sources maps each source name to (store, index)
+    # Returns the chosen keys and their (chunk, metadata) docs
+    def rerank(self, question, query_vector, keys, sources, k=3):
+        keys, docs = self._lookup(list(keys)[:self.candidates], sources)
+        if not keys:
+            return [], []
+        vectors = self._vectors(keys, sources)
+        relevance = self._relevance(question, query_vector, vectors, docs)
+        groups = None
+        if self.collapse_papers:
+            # Corpus chunks of one paper collapse to the best one; upload sections all stay eligible
+            groups = [meta["url"] or meta["title"] if source == CORPUS else None for (source, _), (_, meta) in zip(keys, docs)]
+        picked = mmr(vectors, relevance, k, self.lambda_, groups)
+        return [keys[i] for i in picked], [docs[i] for i in picked]
+
+    # Resolves keys to docs with one lookup per source, dropping ids that no longer resolve
+    def _lookup(self, keys, sources):
+        resolved = {}
+        for source, (store, _) in sources.items():
+            ids = [chunk_id for key_source, chunk_id in keys if key_source == source]
+            if not ids:
+                continue
+            docs = store.lookup(ids)
+            if len(docs) != len(ids):
+                # lookup skips missing ids, so fall back to one id at a time to keep them aligned
+                docs = [found[0] if found else None for found in (store.lookup([chunk_id]) for chunk_id in ids)]
+            resolved.update(((source, chunk_id), doc) for chunk_id, doc in zip(ids, docs))
+        kept = [key for key in keys if resolved.get(key) is not None]
+        return kept, [resolved[key] for key in kept]
+
+    def _vectors(self, keys, sources):
+        vectors = np.zeros((len(keys), 0), dtype="float32")
+        for source, (_, index) in sources.items():
+            positions = [i for i, (key_source, _) in enumerate(keys) if key_source == source]
+            if not positions:
+                continue
+            found = stored_vectors(index, [keys[i][1] for i in positions])
+            if found is None:
+                return None
+            if vectors.shape[1] == 0:
+                vectors = np.zeros((len(keys), found.shape[1]), dtype="float32")
+            vectors[positions] = found
+        return vectors
+
+    # Cross-encoder scores when configured; otherwise cosine to the query averaged with the fused
+    # order (so BM25-only matches keep their weight), or just the fused order without vectors
+    def _relevance(self, question, query_vector, vectors, docs):
+        if self.cross_encoder is not None:
+            return _rescale(self.cross_encoder.predict([(question, chunk) for chunk, _ in docs]))
+        fused = 1 - np.arange(len(docs), dtype="float32") / len(docs)
+        if vectors is None or query_vector is None or not np.any(query_vector):
+            return fused
+        cosine = _normalize(vectors) @ _normalize(np.asarray(query_vector, dtype="float32").ravel())
+        return (_rescale(cosine) + fused) / 2
+
+# Loads a sentence-transformers cross-encoder on CPU, or None if the package isn't installed
+def load_cross_encoder(model_name=DEFAULT_CROSS_ENCODER):
+    if CrossEncoder is None:
+        return None
+    return CrossEncoder(model_name, device="cpu")
+
+# Process-wide reranker; set CROSS_ENCODER_MODEL to rescore candidates with a cross-encoder
+_shared_reranker = None
+_shared_lock = threading.Lock()
+
+def get_reranker():
+    global _shared_reranker
+    with _shared_lock:
+        if _shared_reranker is None:
+            model_name = os.environ.get("CROSS_ENCODER_MODEL")
+            _shared_reranker = Reranker(cross_encoder=load_cross_encoder(model_name) if model_name else None)
+        return _shared_reranker
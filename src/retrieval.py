@@ -1,69 +1,377 @@
+import hashlib
+import json
 import os
+import shutil
 import pandas as pd
 import numpy as np
 import faiss
 from tqdm import tqdm
-from openai import OpenAI
 import streamlit as st
+from src.cache import get_embedding_cache
+from src.chunking import CHUNKER_VERSION, chunk_text, chunk_words
+from src.clients import get_client
+from src.chunk_store import ChunkStore, ChunkStoreWriter, write_chunk_store
+from src.embeddings import EMBEDDING_DIM, EMBEDDING_MODEL, embed_texts
+from src.indexing import (
+    INDEX_TYPES, METRICS, STORAGE_CODES, create_index, enable_reconstruct, prepare_vectors, set_search_params,
+    supports_removal, train_index
+)
+from src.lexical import LexicalIndex, LexicalIndexWriter, write_lexical_index
+from src.tracing import record_cache, record_usage, traced
 
 # Handles document storage, chunking, embeddings, and FAISS index creation
 class AIDocumentStore:
-    def __init__(self, dataset_path, index_path, chunk_size=500):
+    def __init__(self, dataset_path, index_path, chunk_size=500, embed_workers=4, embedding_cache=None,
+                 index_type="flat", nlist=None, pq_m=64, hnsw_m=32, nprobe=16, ef_search=64,
+                 train_sample=100_000, metric="l2", storage="fp32", csv_batch_rows=5000):
         self.dataset_path = dataset_path
         self.chunk_size = chunk_size
+        self.embed_workers = embed_workers
+        self.embedding_cache = embedding_cache
+        self.index_type = index_type
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.train_sample = train_sample
+        self.metric = metric
+        self.storage = storage
+        self.csv_batch_rows = csv_batch_rows
         self.documents = []
         self.document_metadata = []
+        self.chunk_ids = []
         self.index_path = index_path
+        self.manifest_path = f"{index_path}.manifest.json" if index_path else None
+        self.chunk_store_path = f"{index_path}.chunks" if index_path else None
+        self.lexical_path = f"{index_path}.lexical" if index_path else None
+        self.chunk_store = None
+        self.lexical_index = None
+        self._row_manifest = {}
+        self._next_id = 0
+        self._rows_read = 0
+        self._positions = None
+        self._index_version = None
+        # Set for indexes built before manifests existed; see chunk_text
+        self.legacy_chunking = False
 
-    # Loads the dataset and splits abstracts into chunks
-    def load_and_split(self):
+    # Streams the dataset in fixed-size CSV batches, yielding (chunk_ids, chunks, metadata) per batch
+    # Chunks of rows already recorded in the manifest keep their index ids; others get fresh ids
+    # Each row's manifest entry is kept in memory, or written to rows_out (a text file) if given
+    def iter_chunks(self, manifest=None, rows_out=None):
         if not os.path.exists(self.dataset_path):
             raise FileNotFoundError(f"Dataset not found at {self.dataset_path}")
-        df = pd.read_csv(self.dataset_path)
-        for _, row in df.iterrows():
-            chunks = self.chunk_text(row['abstract'], self.chunk_size)
-            for chunk in chunks:
-                self.documents.append(chunk)
-                self.document_metadata.append({
-                    'title': row['title'],
-                    'url': row['url']
-                })
-
-    # Splits a block of text into word-based chunks
-    def chunk_text(self, text, size):
-        words = text.split()
-        return [' '.join(words[i:i+size]) for i in range(0, len(words), size)]
-
-    # Embeds all loaded documents using OpenAI's embedding model
-    def embed_documents(self):
-        client = OpenAI(api_key=st.session_state.get("openai_api_key"))
-        embeddings = []
-        for doc in tqdm(self.documents, desc="Embedding documents"):
-            response = client.embeddings.create(
-                input=doc,
-                model="text-embedding-ada-002"
+        if manifest is None:
+            manifest = self.load_manifest()
+        known_rows = manifest["rows"] if manifest else {}
+        next_id = manifest["next_id"] if manifest else 0
+        self._row_manifest = {}
+        self._rows_read = 0
+        seen_keys = {}
+
+        reader = pd.read_csv(
+            self.dataset_path,
+            usecols=["title", "url", "abstract"],
+            chunksize=self.csv_batch_rows
+        )
+        for df in reader:
+            abstracts = df["abstract"].fillna("").astype(str)
+            batch_ids, batch_chunks, batch_metadata = [], [], []
+            for title, url, abstract in zip(df["title"], df["url"], abstracts):
+                key = self.row_key(title, url, seen_keys)
+                row_hash = self.row_hash(title, url, abstract)
+                chunks = self.chunk_text(abstract, self.chunk_size)
+
+                known = known_rows.get(key)
+                if known and known["hash"] == row_hash and len(known["ids"]) == len(chunks):
+                    ids = known["ids"]
+                else:
+                    ids = list(range(next_id, next_id + len(chunks)))
+                    next_id += len(chunks)
+                if rows_out is not None:
+                    rows_out.write(json.dumps([key, row_hash, ids]) + "\n")
+                else:
+                    self._row_manifest[key] = {"hash": row_hash, "ids": ids}
+
+                meta = {'title': title, 'url': url}
+                batch_ids.extend(ids)
+                batch_chunks.extend(chunks)
+                batch_metadata.extend([meta] * len(chunks))
+            self._next_id = next_id
+            self._rows_read += len(df)
+            yield batch_ids, batch_chunks, batch_metadata
+        self._next_id = next_id
+
+    # Loads the dataset and splits abstracts into chunks held in memory
+    def load_and_split(self, manifest=None):
+        self.documents = []
+        self.document_metadata = []
+        self.chunk_ids = []
+        self.chunk_store = None
+        self._positions = None
+        for ids, chunks, metadata in self.iter_chunks(manifest):
+            self.chunk_ids.extend(ids)
+            self.documents.extend(chunks)
+            self.document_metadata.extend(metadata)
+
+    # Opens the chunk store persisted next to the index, or re-parses the CSV if there isn't one
+    # An index with neither a chunk store nor a manifest predates token chunking, so it is re-split
+    # with the word chunker it was embedded with (rebuild it to move to the current chunker)
+    def load_chunks(self):
+        if not self.chunk_store_path or not os.path.isdir(self.chunk_store_path):
+            self.legacy_chunking = (
+                bool(self.index_path) and os.path.exists(self.index_path) and self.load_manifest() is None
             )
-            embeddings.append(response.data[0].embedding)
-        return np.array(embeddings).astype("float32")
+            self.load_and_split()
+            return
+        self.chunk_store = ChunkStore(self.chunk_store_path)
+        self.documents = self.chunk_store.documents
+        self.document_metadata = self.chunk_store.metadata
+        self.chunk_ids = self.chunk_store.ids
+        self._positions = None
+        # Indexes built before hybrid retrieval have no lexical side; search then stays dense-only
+        if os.path.isdir(self.lexical_path):
+            self.lexical_index = LexicalIndex(self.lexical_path)
+
+    # Stable identity for a dataset row (its URL, falling back to the title)
+    @staticmethod
+    def row_key(title, url, seen_keys):
+        key = str(url) if pd.notna(url) else str(title)
+
+        # Disambiguate duplicate rows so each one keeps its own entry
+        count = seen_keys.get(key, 0)
+        seen_keys[key] = count + 1
+        return key if count == 0 else f"{key}#{count}"
+
+    # Content hash of a dataset row, including the chunker and chunk size that shaped its chunks
+    def row_hash(self, title, url, abstract):
+        content = "\x1f".join(str(value) for value in (title, url, abstract))
+        return hashlib.sha256(f"{CHUNKER_VERSION}\x1f{self.chunk_size}\x1f{content}".encode("utf-8")).hexdigest()
+
+    # Splits a block of text into sentence-aware chunks of at most size embedding tokens
+    # Legacy indexes look chunks up by position, so they keep the size-word chunks their vectors came from
+    def chunk_text(self, text, size):
+        if self.legacy_chunking:
+            return chunk_words(text, size)
+        return chunk_text(text, size)
+
+    # Embeds all loaded documents (or the given subset) in batched, concurrent requests
+    @traced("embed_documents")
+    def embed_documents(self, client=None, documents=None, progress=None):
+        client = client or get_client()
+        documents = self.documents if documents is None else documents
+        cache = self.embedding_cache if self.embedding_cache is not None else get_embedding_cache()
+        if progress is not None:
+            return embed_texts(documents, client, max_workers=self.embed_workers, progress=progress, cache=cache)
+        with tqdm(total=len(documents), desc="Embedding documents") as bar:
+            return embed_texts(documents, client, max_workers=self.embed_workers, progress=bar.update, cache=cache)
 
     # Builds and saves a FAISS index from embedded documents
-    def build_index(self):
-        self.load_and_split()
-        embeddings = self.embed_documents()
-        dim = len(embeddings[0])
-        index = faiss.IndexFlatL2(dim)
-        index.add(embeddings)
-        faiss.write_index(index, self.index_path)
+    # The dataset is streamed batch by batch (CSV rows -> chunks -> embeddings -> index / chunk store):
+    # chunk texts, paper titles and manifest rows go straight to disk, and IVF training buffers at most
+    # train_sample vectors (plus one batch). What still grows with the corpus is the index itself, the
+    # BM25 postings and a few integers per chunk. With incremental=True, only new or changed rows
+    # are embedded (see update_index)
+    def build_index(self, incremental=False):
+        if incremental:
+            return self.update_index()
+        self.legacy_chunking = False
+        client = get_client()
+        writer = ChunkStoreWriter(self.chunk_store_path)
+        lexical_writer = LexicalIndexWriter(self.lexical_path)
+        rows_path = f"{self.manifest_path}.rows.tmp"
+        rows_out = open(rows_path, "w", encoding="utf-8")
+        index = None
+        needs_training = None
+        pending = []
+
+        with rows_out, tqdm(desc="Embedding documents", unit="chunk") as bar:
+            for ids, chunks, metadata in self.iter_chunks(manifest={}, rows_out=rows_out):
+                for chunk_id, chunk, meta in zip(ids, chunks, metadata):
+                    writer.add(chunk_id, chunk, meta['title'], meta['url'])
+                    lexical_writer.add(chunk_id, chunk)
+                if not chunks:
+                    continue
+                embeddings = self.embed_documents(client, chunks, progress=bar.update)
+                ids = np.array(ids, dtype="int64")
+                if index is not None:
+                    index.add_with_ids(prepare_vectors(index, embeddings), ids)
+                    continue
+
+                # IVF/SQ8 indexes must be trained before adding, so buffer batches up to the training sample
+                pending.append((embeddings, ids))
+                if needs_training is None:
+                    needs_training = not self.create_index(embeddings.shape[1], len(embeddings)).is_trained
+                buffered = sum(len(e) for e, _ in pending)
+                if not needs_training:
+                    index = self.start_index(pending)
+                    pending = []
+                elif buffered >= self.train_sample:
+                    # The rest of the corpus hasn't been read yet, so size the index for the estimated total
+                    index = self.start_index(pending, self.estimate_chunks(buffered))
+                    pending = []
+
+        if index is None:
+            if not pending:
+                raise ValueError(f"No chunks to index in {self.dataset_path}")
+            index = self.start_index(pending)
+        self.save_index(index, writer, lexical_writer, rows_path)
+        self.load_chunks()
+        return self.configure_search(index)
+
+    # Creates, trains and fills an index from the first buffered (embeddings, ids) batches
+    # n_vectors is the corpus size the index is sized for (e.g. the IVF nlist); defaults to the batches' size
+    def start_index(self, batches, n_vectors=None):
+        embeddings = np.concatenate([e for e, _ in batches])
+        ids = np.concatenate([i for _, i in batches])
+        index = self.create_index(embeddings.shape[1], n_vectors or len(embeddings))
+        embeddings = prepare_vectors(index, embeddings)
+        train_index(index, embeddings, self.train_sample)
+        index.add_with_ids(embeddings, ids)
         return index
 
+    # Estimates how many chunks the whole dataset yields from the chunks of the rows read so far,
+    # by counting the dataset's rows (a cheap pass next to embedding them)
+    def estimate_chunks(self, chunks_read):
+        if self.nlist is not None or not self._rows_read:
+            return chunks_read
+        reader = pd.read_csv(self.dataset_path, usecols=["url"], chunksize=self.csv_batch_rows)
+        total_rows = sum(len(df) for df in reader)
+        return max(chunks_read, round(chunks_read * total_rows / self._rows_read))
+
+    # Creates an empty index of the configured type
+    def create_index(self, dim, n_vectors):
+        return create_index(
+            self.index_type, dim, n_vectors, nlist=self.nlist, pq_m=self.pq_m, hnsw_m=self.hnsw_m,
+            metric=self.metric, storage=self.storage
+        )
+
+    # Applies the configured nprobe/efSearch to an index
+    def configure_search(self, index):
+        return set_search_params(index, nprobe=self.nprobe, ef_search=self.ef_search)
+
+    # Brings an existing index in line with the dataset by diffing it against the manifest
+    def update_index(self):
+        manifest = self.load_manifest()
+        if manifest is None or not os.path.exists(self.index_path):
+            return self.build_index()
+        index = self.load_index()
+
+        # An index that drifted from its manifest (e.g. an interrupted save) can't be patched safely
+        indexed_ids = {chunk_id for row in manifest["rows"].values() for chunk_id in row["ids"]}
+        if index.ntotal != len(indexed_ids):
+            return self.build_index()
+
+        self.load_and_split(manifest=manifest)
+        current_ids = set(self.chunk_ids)
+        stale_ids = sorted(indexed_ids - current_ids)
+        new_positions = [pos for pos, chunk_id in enumerate(self.chunk_ids) if chunk_id not in indexed_ids]
+
+        if stale_ids:
+            # HNSW graphs can't drop vectors, so deletions there force a rebuild
+            if not supports_removal(index):
+                return self.build_index()
+            index.remove_ids(np.array(stale_ids, dtype="int64"))
+        if new_positions:
+            embeddings = self.embed_documents(documents=[self.documents[pos] for pos in new_positions])
+            new_ids = np.array([self.chunk_ids[pos] for pos in new_positions], dtype="int64")
+            index.add_with_ids(prepare_vectors(index, embeddings), new_ids)
+        self.save_index(index)
+        self.load_chunks()
+        return self.configure_search(index)
+
+    # Writes the index, its manifest, the chunk store and the lexical index via temp files so readers never
+    # see a partial file. A streaming build passes the writers it filled and the file its manifest rows were
+    # written to; otherwise the in-memory chunks and manifest rows are written
+    # The manifest is JSON lines: a header with the chunking settings, then one [key, hash, ids] line per row
+    def save_index(self, index, chunk_writer=None, lexical_writer=None, rows_path=None):
+        tmp_index = f"{self.index_path}.tmp"
+        faiss.write_index(index, tmp_index)
+        tmp_manifest = f"{self.manifest_path}.tmp"
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": 2, "chunk_size": self.chunk_size, "next_id": self._next_id}) + "\n")
+            if rows_path is not None:
+                with open(rows_path, encoding="utf-8") as rows:
+                    shutil.copyfileobj(rows, f)
+                os.remove(rows_path)
+            else:
+                for key, row in self._row_manifest.items():
+                    f.write(json.dumps([key, row["hash"], row["ids"]]) + "\n")
+        if chunk_writer is not None:
+            chunk_writer.close()
+        else:
+            write_chunk_store(self.chunk_store_path, self.chunk_ids, self.documents, self.document_metadata)
+        if lexical_writer is not None:
+            lexical_writer.close()
+        else:
+            write_lexical_index(self.lexical_path, self.chunk_ids, self.documents)
+        os.replace(tmp_index, self.index_path)
+        os.replace(tmp_manifest, self.manifest_path)
+        self._index_version = self._file_version()
+
+    # Reads the manifest of indexed rows, or None if the index was never built incrementally
+    def load_manifest(self):
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, encoding="utf-8") as f:
+            manifest = json.loads(f.readline())
+            # Version 1 manifests hold every row inline in one JSON object
+            if "rows" not in manifest:
+                manifest["rows"] = {key: {"hash": row_hash, "ids": ids} for key, row_hash, ids in map(json.loads, f)}
+        return manifest
+
     # Loads an existing FAISS index from disk
-    def load_index(self):
+    # With mmap=True, IVF inverted lists stay in the page cache, shared by every process that maps the file;
+    # other index types are still read fully into memory (see supports_mmap)
+    def load_index(self, mmap=False):
         if not os.path.exists(self.index_path):
             raise FileNotFoundError(
                 f"FAISS index not found at {self.index_path}. "
                 "You may need to run `build_index()` first to generate it."
             )
-        return faiss.read_index(self.index_path)
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        self._index_version = self._file_version()
+        # Indexes from before reranking have no IVF direct map; build it here, before any search runs
+        return self.configure_search(enable_reconstruct(faiss.read_index(self.index_path, flags)))
+
+    # Identifies the index this store last loaded or saved; a rebuild reassigns chunk ids, so anything
+    # keyed on ids (like cached answers) must not outlive it. None for indexes that never touched disk
+    def index_version(self):
+        return self._index_version
+
+    def _file_version(self):
+        stat = os.stat(self.index_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+    # Searches the index, normalizing query vectors first when the index ranks by cosine similarity
+    @traced("vector_search")
+    def search(self, index, query_vectors, k=3):
+        return index.search(prepare_vectors(index, query_vectors), k)
+
+    # BM25 search over the chunk texts; returns (scores, chunk_ids), empty if there is no lexical index
+    @traced("lexical_search")
+    def lexical_search(self, query, k=10):
+        if self.lexical_index is None:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+        return self.lexical_index.search(query, k)
+
+    # Maps ids returned by index.search to (chunk, metadata) pairs, skipping empty slots (-1)
+    def lookup(self, ids):
+        if self.chunk_store is not None:
+            find_position = self.chunk_store.position
+        else:
+            if self._positions is None:
+                # Legacy indexes without a manifest address chunks by position
+                chunk_ids = self.chunk_ids or range(len(self.documents))
+                self._positions = {chunk_id: pos for pos, chunk_id in enumerate(chunk_ids)}
+            find_position = self._positions.get
+        results = []
+        for chunk_id in ids:
+            pos = find_position(int(chunk_id))
+            if pos is not None:
+                results.append((self.documents[pos], self.document_metadata[pos]))
+        return results
 
     # Returns metadata for all chunks
     def get_metadata(self):
@@ -73,17 +381,52 @@ class AIDocumentStore:
     def get_documents(self):
         return self.documents
 
-# Embeds a user query into a vector using OpenAI's API
-def embed_query(query):
-    client = OpenAI(api_key=st.session_state.get("openai_api_key"))
+# Embeds a user query into a vector using OpenAI's API (served from the cache when possible)
+@traced("embed_query")
+def embed_query(query, cache=None):
+    cache = cache if cache is not None else get_embedding_cache()
+    cached = cache.get(EMBEDDING_MODEL, query)
+    record_cache("embeddings", cached is not None)
+    if cached is not None:
+        return cached
+    client = get_client()
     try:
         response = client.embeddings.create(
             input=query,
-            model="text-embedding-ada-002"
+            model=EMBEDDING_MODEL
         )
-        return np.array(response.data[0].embedding).astype("float32")
+        record_usage("embed_query", getattr(response, "usage", None), EMBEDDING_MODEL)
+        vector = np.array(response.data[0].embedding).astype("float32")
+        cache.put(EMBEDDING_MODEL, query, vector)
+        return vector
     except Exception as e:
         st.error(f"Embedding failed: {e}")
         
         # Return dummy vector if failure
-        return np.zeros(1536).astype("float32")
\ No newline at end of file
+        return np.zeros(EMBEDDING_DIM).astype("float32")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or refresh the FAISS index for the arXiv dataset")
+    parser.add_argument("--dataset", default="data/arxiv_dataset.csv")
+    parser.add_argument("--index", default="data/faiss.index")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only embed new or changed rows and drop deleted ones")
+    parser.add_argument("--index-type", default="flat", choices=INDEX_TYPES)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: ~4*sqrt(n))")
+    parser.add_argument("--pq-m", type=int, default=64, help="PQ sub-quantizers for ivf_pq")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW neighbours per node")
+    parser.add_argument("--metric", default="l2", choices=list(METRICS),
+                        help="l2 distance, or ip for cosine similarity on normalized vectors")
+    parser.add_argument("--storage", default="fp32", choices=list(STORAGE_CODES),
+                        help="Vector storage precision (fp16/int8 use FAISS scalar quantization)")
+    args = parser.parse_args()
+
+    store = AIDocumentStore(
+        args.dataset, args.index, index_type=args.index_type,
+        nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m,
+        metric=args.metric, storage=args.storage
+    )
+    built = store.build_index(incremental=args.incremental)
+    print(f"Index at {args.index} now holds {built.ntotal} chunks")
@@ -0,0 +1,265 @@
+import argparse
+import base64
+import json
+import multiprocessing
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import numpy as np
+from src.indexing import supports_mmap
+from src.retrieval import AIDocumentStore
+from src.tracing import metrics, traced
+
+# Encodes a float32 matrix for JSON transport (base64 is exact and far smaller than float lists)
+def encode_vectors(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    return {"shape": list(vectors.shape), "data": base64.b64encode(vectors.tobytes()).decode("ascii")}
+
+def decode_vectors(payload):
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype="float32").reshape(payload["shape"])
+
+# Collects queries that arrive within max_wait seconds of each other into one index search
+class MicroBatcher:
+    def __init__(self, search, max_batch=64, max_wait=0.002):
+        self._search = search
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="search-batcher", daemon=True)
+        self._thread.start()
+
+    # Queues one or more query rows and returns a Future of their (scores, ids)
+    def submit(self, vectors, k):
+        future = Future()
+        self._queue.put((np.atleast_2d(vectors), k, future))
+        return future
+
+    def search(self, vectors, k, timeout=None):
+        return self.submit(vectors, k).result(timeout)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            rows = len(job[0])
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch:
+                try:
+                    job = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if job is None:
+                    # Answer what we already collected, then stop
+                    self._queue.put(None)
+                    break
+                batch.append(job)
+                rows += len(job[0])
+            self._dispatch(batch, rows)
+
+    # Runs one search for the whole batch (at the largest k asked for) and slices out each caller's rows
+    def _dispatch(self, batch, rows):
+        k = max(job_k for _, job_k, _ in batch)
+        try:
+            scores, ids = self._search(np.concatenate([vectors for vectors, _, _ in batch]), k)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        metrics.increment("search_batches_total")
+        metrics.increment("search_queries_total", rows)
+        start = 0
+        for vectors, job_k, future in batch:
+            end = start + len(vectors)
+            future.set_result((scores[start:end, :job_k], ids[start:end, :job_k]))
+            start = end
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+# HTTP server around one store and index; concurrent /search requests share micro-batched searches
+class RetrievalServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, store, index, max_batch=64, max_wait=0.002, reuse_port=False):
+        self.store = store
+        self.index = index
+        self.reuse_port = reuse_port
+        self.batcher = MicroBatcher(lambda vectors, k: store.search(index, vectors, k), max_batch, max_wait)
+        super().__init__(address, _RetrievalHandler)
+
+    # SO_REUSEPORT lets several worker processes accept on the same port (Linux/BSD)
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.close()
+
+    def info(self, payload=None):
+        return {
+            "ntotal": int(self.index.ntotal), "d": int(self.index.d), "metric_type": int(self.index.metric_type),
+            "lexical": self.store.lexical_index is not None, "version": self.store.index_version()
+        }
+
+    def search(self, payload):
+        vectors = decode_vectors(payload["vectors"])
+        if vectors.ndim != 2 or vectors.shape[1] != self.index.d:
+            raise ValueError(f"Expected query vectors of dimension {self.index.d}, got shape {list(vectors.shape)}")
+        scores, ids = self.batcher.search(vectors, int(payload.get("k", 3)))
+        return {"scores": encode_vectors(scores), "ids": ids.tolist()}
+
+    def lexical_search(self, payload):
+        scores, ids = self.store.lexical_search(str(payload["query"]), int(payload.get("k", 10)))
+        return {"scores": np.asarray(scores).tolist(), "ids": np.asarray(ids).tolist()}
+
+    def lookup(self, payload):
+        return {"results": self.store.lookup([int(i) for i in payload["ids"]])}
+
+class _RetrievalHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients reuse pooled connections
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/info":
+            self._reply(200, self.server.info())
+        elif self.path == "/metrics":
+            self._send(200, metrics.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        routes = {"/search": self.server.search, "/lexical": self.server.lexical_search, "/lookup": self.server.lookup}
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path not in routes:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            self._reply(200, routes[self.path](json.loads(body)))
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {"error": str(e)})
+
+    def _reply(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Opens the index memory-mapped (IVF lists then share the same pages across workers) and serves until interrupted
+def serve(index_path, dataset_path, host="127.0.0.1", port=8765, max_batch=64, max_wait=0.002,
+          nprobe=16, ef_search=64, reuse_port=False):
+    store = AIDocumentStore(dataset_path, index_path, nprobe=nprobe, ef_search=ef_search)
+    index = store.load_index(mmap=True)
+    store.load_chunks()
+    server = RetrievalServer((host, port), store, index, max_batch, max_wait, reuse_port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+# Client-side stand-in for AIDocumentStore: search, lexical_search and lookup run on the service
+class RemoteDocumentStore:
+    def __init__(self, url, timeout=10.0):
+        self.url = url.rstrip("/")
+        self._client = httpx.Client(base_url=self.url, timeout=timeout)
+        self._index_version = None
+
+    def _post(self, path, payload):
+        response = self._client.post(path, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    # Returns a RemoteIndex describing the served index (for code that checks its metric or size)
+    def load_index(self):
+        response = self._client.get("/info")
+        response.raise_for_status()
+        info = response.json()
+        self._index_version = info.get("version")
+        return RemoteIndex(info["ntotal"], info["d"], info["metric_type"])
+
+    # Version of the served index as of load_index
+    def index_version(self):
+        return self._index_version
+
+    # Chunks live on the service, so there is nothing to load locally
+    def load_chunks(self):
+        pass
+
+    # The index argument is accepted for compatibility with AIDocumentStore.search and ignored
+    @traced("vector_search")
+    def search(self, index, query_vectors, k=3):
+        data = self._post("/search", {"vectors": encode_vectors(query_vectors), "k": k})
+        return decode_vectors(data["scores"]), np.array(data["ids"], dtype="int64")
+
+    @traced("lexical_search")
+    def lexical_search(self, query, k=10):
+        data = self._post("/lexical", {"query": query, "k": k})
+        return np.array(data["scores"], dtype="float32"), np.array(data["ids"], dtype="int64")
+
+    def lookup(self, ids):
+        return [(chunk, meta) for chunk, meta in self._post("/lookup", {"ids": [int(i) for i in ids]})["results"]]
+
+    def close(self):
+        self._client.close()
+
+# What the UI needs to know about a served index
+class RemoteIndex:
+    def __init__(self, ntotal, d, metric_type):
+        self.ntotal = ntotal
+        self.d = d
+        self.metric_type = metric_type
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve FAISS and BM25 retrieval over HTTP from one memory-mapped index")
+    parser.add_argument("--dataset", default="data/arxiv_dataset.csv")
+    parser.add_argument("--index", default="data/faiss.index")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes accepting on the same port via SO_REUSEPORT; they share a memory-mapped IVF index")
+    parser.add_argument("--max-batch", type=int, default=64, help="Most query rows searched in one call")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="How long a query waits for others to batch with")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    args = parser.parse_args()
+
+    options = dict(
+        index_path=args.index, dataset_path=args.dataset, host=args.host, port=args.port,
+        max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000, nprobe=args.nprobe, ef_search=args.ef_search
+    )
+    if args.workers > 1:
+        # Only IVF indexes are memory-mapped; anything else would be loaded in full by every worker
+        probe = AIDocumentStore(args.dataset, args.index).load_index(mmap=True)
+        shareable = supports_mmap(probe)
+        del probe
+        if not shareable:
+            parser.error(
+                "--workers > 1 needs an IVF index (ivf_flat or ivf_pq): FAISS only memory-maps IVF lists, so each "
+                "worker would hold its own full copy of this index. Rebuild with an IVF index type or run one worker."
+            )
+    print(f"Serving retrieval on http://{args.host}:{args.port} with {args.workers} worker(s)")
+    if args.workers == 1:
+        serve(**options)
+    else:
+        # Spawned (not forked) so each worker starts FAISS and its OpenMP pool cleanly
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=serve, kwargs={**options, "reuse_port": True}) for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from src.indexing import create_index, prepare_vectors
+
+DEFAULT_SEMANTIC_CACHE_PATH = "data/semantic_cache.sqlite"
+
+# Canonical string for everything besides the question that an answer depends on: the generation settings,
+# how many sources were picked and whether they were reranked, the conversation context (hashed, so two
+# conversations never share an answer) and the version of the index its source ids belong to
+def settings_key(style, temperature, cot, max_tokens, k=3, rerank=False, context="", index_version=None):
+    return json.dumps(
+        {
+            "style": style, "temperature": round(float(temperature), 2), "cot": bool(cot), "max_tokens": int(max_tokens),
+            "k": int(k), "rerank": bool(rerank),
+            "context": hashlib.sha256(context.encode("utf-8")).hexdigest() if context else "",
+            "index": index_version
+        },
+        sort_keys=True
+    )
+
+# Answer cache keyed on query-embedding similarity
+# Past query vectors live in a small cosine FAISS index; answers and settings persist in SQLite
+class SemanticCache:
+    def __init__(self, path=DEFAULT_SEMANTIC_CACHE_PATH, threshold=0.95, ttl_seconds=7 * 24 * 3600,
+                 max_entries=5000):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.index = None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, vector BLOB NOT NULL, settings TEXT NOT NULL, "
+            "payload TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._load()
+
+    # Rebuilds the in-memory vector index from the persisted entries
+    def _load(self):
+        with self._lock:
+            self._delete_expired(time.time())
+            rows = self._conn.execute("SELECT id, vector, settings, created, last_used FROM answers").fetchall()
+            for entry_id, vector, settings, created, last_used in rows:
+                self._add_to_index(entry_id, np.frombuffer(vector, dtype="float32"))
+                self._entries[entry_id] = {"settings": settings, "created": created, "last_used": last_used}
+            self._conn.commit()
+
+    def _add_to_index(self, entry_id, vector):
+        if self.index is None:
+            self.index = create_index("flat", len(vector), 1, metric="ip")
+        self.index.add_with_ids(prepare_vectors(self.index, vector), np.array([entry_id], dtype="int64"))
+
+    # Returns the cached payload for the most similar past query with matching settings, or None
+    def lookup(self, query_vector, settings):
+        now = time.time()
+        with self._lock:
+            if self.index is not None and self.index.ntotal and np.any(query_vector):
+                k = min(8, self.index.ntotal)
+                scores, ids = self.index.search(prepare_vectors(self.index, query_vector), k)
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id < 0 or score < self.threshold:
+                        break
+                    entry = self._entries.get(int(entry_id))
+                    if entry is None or entry["settings"] != settings or now - entry["created"] > self.ttl_seconds:
+                        continue
+                    entry["last_used"] = now
+                    (payload,) = self._conn.execute(
+                        "SELECT payload FROM answers WHERE id = ?", (int(entry_id),)
+                    ).fetchone()
+                    self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, int(entry_id)))
+                    self._conn.commit()
+                    self.hits += 1
+                    return {**json.loads(payload), "similarity": float(score)}
+            self.misses += 1
+            return None
+
+    # Stores an answer (any JSON-serializable payload) for a query vector and settings
+    def add(self, query_vector, settings, payload):
+        if not np.any(query_vector):
+            return
+        now = time.time()
+        vector = np.asarray(query_vector, dtype="float32").reshape(-1)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (vector, settings, payload, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (vector.tobytes(), settings, json.dumps(payload), now, now)
+            )
+            self._add_to_index(cursor.lastrowid, vector)
+            self._entries[cursor.lastrowid] = {"settings": settings, "created": now, "last_used": now}
+            self._delete_expired(now)
+            self._evict_overflow()
+            self._conn.commit()
+
+    def _remove(self, entry_ids):
+        if not entry_ids:
+            return
+        self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in entry_ids])
+        if self.index is not None:
+            self.index.remove_ids(np.array(entry_ids, dtype="int64"))
+        for entry_id in entry_ids:
+            self._entries.pop(entry_id, None)
+
+    def _delete_expired(self, now):
+        if self._entries:
+            self._remove([i for i, e in self._entries.items() if now - e["created"] > self.ttl_seconds])
+        else:
+            self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl_seconds,))
+
+    def _evict_overflow(self):
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            oldest = sorted(self._entries, key=lambda i: self._entries[i]["last_used"])[:overflow]
+            self._remove(oldest)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Hit/miss counters for tracking how many LLM calls were skipped
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self)
+        }
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+# Returns the process-wide semantic answer cache
+def get_semantic_cache(path=None):
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = SemanticCache(
+                path or os.environ.get("SEMANTIC_CACHE_PATH", DEFAULT_SEMANTIC_CACHE_PATH),
+                threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.95))
+            )
+        return _shared_cache
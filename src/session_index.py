@@ -0,0 +1,63 @@
+import hashlib
+import faiss
+import numpy as np
+from src.cache import get_embedding_cache
+from src.clients import get_client
+from src.embeddings import EMBEDDING_DIM, embed_texts
+from src.indexing import create_index, prepare_vectors
+from src.tracing import traced
+
+# Content hash identifying an uploaded file, so re-uploads reuse their index
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+# Metric name matching an existing index, so scores from both indexes are comparable
+def index_metric(index):
+    return "ip" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+
+# Converts raw FAISS scores to "higher is better" for merging across indexes
+def similarity_scores(index, scores):
+    return scores if index.metric_type == faiss.METRIC_INNER_PRODUCT else -scores
+
+# Small in-memory vector index over one uploaded document, kept for the user's session
+class SessionIndex:
+    def __init__(self, chunks, spans, name, metric="l2", client=None, cache=None, dim=EMBEDDING_DIM):
+        self.documents = list(chunks)
+        self.name = name
+        self.document_metadata = [
+            {"title": self.source_title(name, span), "url": "", "page_start": span["page_start"], "page_end": span["page_end"]}
+            for span in spans
+        ]
+        self.index = create_index("flat", dim, len(self.documents), metric=metric)
+        if self.documents:
+            vectors = embed_texts(
+                self.documents,
+                client if client is not None else get_client(),
+                dim=dim,
+                cache=cache if cache is not None else get_embedding_cache()
+            )
+            self.index.add_with_ids(prepare_vectors(self.index, vectors), np.arange(len(self.documents)))
+
+    # "notes.pdf, p. 3-4" (or just the file name for plain text)
+    @staticmethod
+    def source_title(name, span):
+        if span["page_start"] is None:
+            return name
+        if span["page_start"] == span["page_end"]:
+            return f"{name}, p. {span['page_start']}"
+        return f"{name}, p. {span['page_start']}-{span['page_end']}"
+
+    def __len__(self):
+        return len(self.documents)
+
+    # Returns (similarities, ids) for one query vector, best first
+    @traced("upload_search")
+    def search(self, query_vector, k=3):
+        if not self.documents:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+        scores, ids = self.index.search(prepare_vectors(self.index, query_vector), min(k, len(self.documents)))
+        return similarity_scores(self.index, scores[0]), ids[0]
+
+    # Maps ids to (chunk, metadata) pairs like AIDocumentStore.lookup
+    def lookup(self, ids):
+        return [(self.documents[i], self.document_metadata[i]) for i in ids if 0 <= i < len(self.documents)]
@@ -0,0 +1,40 @@
+import re
+import numpy as np
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Rough word/punctuation split used when no tokenizer is available
+_FALLBACK_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Encodings are loaded once per model (None means "use the fallback estimate")
+_encodings = {}
+
+# Returns the tiktoken encoding for a model, or None if it can't be loaded (e.g. offline)
+def get_encoding(model="text-embedding-ada-002"):
+    if model not in _encodings:
+        encoding = None
+        if tiktoken is not None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                encoding = None
+        _encodings[model] = encoding
+    return _encodings[model]
+
+# Counts the tokens a model would see for the given text
+def count_tokens(text, model="text-embedding-ada-002"):
+    encoding = get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_FALLBACK_TOKEN_PATTERN.findall(text))
+
+# Character offset where each token starts, in one pass over the text (fallback tokens when offline)
+def token_offsets(text, model="text-embedding-ada-002"):
+    encoding = get_encoding(model)
+    if encoding is not None:
+        _, offsets = encoding.decode_with_offsets(encoding.encode(text, disallowed_special=()))
+        return np.asarray(offsets, dtype=np.int64)
+    return np.fromiter((match.start() for match in _FALLBACK_TOKEN_PATTERN.finditer(text)), dtype=np.int64)
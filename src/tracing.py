@@ -0,0 +1,289 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets (seconds) shared by every histogram
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# USD per 1K (prompt, completion) tokens, used to turn token usage into a cost estimate
+PRICES_PER_1K = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "text-embedding-ada-002": (0.0001, 0.0)
+}
+
+# Cumulative-bucket histogram in the Prometheus style
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Estimates a quantile by interpolating inside its bucket (like histogram_quantile)
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+# In-memory metric registry: histograms and counters keyed by name plus labels
+class Metrics:
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def histogram(self, name, **labels):
+        with self._lock:
+            return self._histograms.get(self._key(name, labels))
+
+    # One row per histogram with count, mean and estimated p50/p95 (for the debug panel)
+    def summary(self):
+        with self._lock:
+            return [
+                {
+                    "metric": name, **dict(labels), "count": h.count, "mean": h.sum / h.count,
+                    "p50": h.quantile(0.5), "p95": h.quantile(0.95)
+                }
+                for (name, labels), h in sorted(self._histograms.items()) if h.count
+            ]
+
+    # Prometheus text exposition format
+    def render_prometheus(self, prefix="study_buddy_"):
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), h in sorted(self._histograms.items()):
+                full = prefix + name
+                if full not in typed:
+                    lines.append(f"# TYPE {full} histogram")
+                    typed.add(full)
+                cumulative = 0
+                for bound, count in zip((*h.buckets, "+Inf"), h.counts):
+                    cumulative += count
+                    lines.append(f"{full}_bucket{_labels(labels, le=bound)} {cumulative}")
+                lines.append(f"{full}_sum{_labels(labels)} {h.sum}")
+                lines.append(f"{full}_count{_labels(labels)} {h.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                full = prefix + name
+                if full not in typed:
+                    lines.append(f"# TYPE {full} counter")
+                    typed.add(full)
+                lines.append(f"{full}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+# Process-wide registry
+metrics = Metrics()
+
+# Everything recorded while answering one request (spans, token usage, cache lookups, retries)
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self.tokens = {}
+        self.cost = 0.0
+        self.cache = {}
+        self.retries = {}
+        self.started = time.perf_counter()
+        self.seconds = None
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, seconds):
+        with self._lock:
+            self.spans.append({"stage": stage, "seconds": seconds})
+
+    def add_tokens(self, stage, prompt_tokens, completion_tokens, cost):
+        with self._lock:
+            totals = self.tokens.setdefault(stage, {"prompt": 0, "completion": 0})
+            totals["prompt"] += prompt_tokens
+            totals["completion"] += completion_tokens
+            self.cost += cost
+
+    def add_cache(self, cache, hit, count=1):
+        with self._lock:
+            counts = self.cache.setdefault(cache, {"hit": 0, "miss": 0})
+            counts["hit" if hit else "miss"] += count
+
+    def add_retry(self, stage):
+        with self._lock:
+            self.retries[stage] = self.retries.get(stage, 0) + 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "seconds": self.seconds,
+                "spans": list(self.spans),
+                "tokens": {stage: dict(totals) for stage, totals in self.tokens.items()},
+                "cost_usd": self.cost,
+                "cache": {cache: dict(counts) for cache, counts in self.cache.items()},
+                "retries": dict(self.retries)
+            }
+
+# The trace of the request being handled; asyncio tasks and to_thread calls inherit it
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+def current_trace():
+    return _current_trace.get()
+
+# Starts a request trace for the enclosed block
+@contextmanager
+def trace(name="request"):
+    active = Trace(name)
+    token = _current_trace.set(active)
+    try:
+        yield active
+    finally:
+        _current_trace.reset(token)
+        active.seconds = time.perf_counter() - active.started
+        metrics.observe("request_seconds", active.seconds, request=name)
+        metrics.increment("requests_total", request=name)
+
+# Times the enclosed block as one stage of the current request
+@contextmanager
+def span(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
+# Records a stage duration measured by the caller (e.g. summed over the steps of a generator)
+def record_span(stage, seconds):
+    metrics.observe("stage_seconds", seconds, stage=stage)
+    active = _current_trace.get()
+    if active is not None:
+        active.add_span(stage, seconds)
+
+# Records token usage (an OpenAI `usage` object) and its estimated cost
+def record_usage(stage, usage, model):
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    prompt_price, completion_price = PRICES_PER_1K.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+    metrics.increment("tokens_total", prompt_tokens, stage=stage, kind="prompt")
+    metrics.increment("tokens_total", completion_tokens, stage=stage, kind="completion")
+    metrics.increment("cost_usd_total", cost, stage=stage)
+    active = _current_trace.get()
+    if active is not None:
+        active.add_tokens(stage, prompt_tokens, completion_tokens, cost)
+
+# Records cache lookup outcomes (count lookups with the same result at once)
+def record_cache(cache, hit, count=1):
+    if not count:
+        return
+    metrics.increment("cache_lookups_total", count, cache=cache, result="hit" if hit else "miss")
+    active = _current_trace.get()
+    if active is not None:
+        active.add_cache(cache, hit, count)
+
+# Records one retried API call
+def record_retry(stage):
+    metrics.increment("retries_total", stage=stage)
+    active = _current_trace.get()
+    if active is not None:
+        active.add_retry(stage)
+
+# Decorator timing every call of a function as a stage; generators are timed until exhausted
+def traced(stage):
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with span(stage):
+                    return (yield from func(*args, **kwargs))
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Writes the Prometheus text to a file atomically (for node-exporter style textfile collection)
+def write_metrics_file(path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(metrics.render_prometheus())
+    os.replace(tmp, path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Serves /metrics on a background thread and returns the server (port 0 picks a free port)
+def start_metrics_server(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
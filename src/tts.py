@@ -1,52 +1,103 @@
-import pyttsx3
-import streamlit as st
+import hashlib
+import os
+import queue
 import threading
+from concurrent.futures import Future
+import pyttsx3
+
+DEFAULT_AUDIO_CACHE_DIR = "data/tts_cache"
 
-# Global variables to track TTS state and thread
-_active = False
-_current_engine = None
-_current_thread = None
+# Cache key for a piece of text, so the same answer always maps to the same audio file
+def audio_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-def toggle_speech(text):
-    global _active, _current_engine, _current_thread
+# Renders text to WAV files on one background thread that owns a single reused engine
+# Files are cached by text hash and played in the browser, so no server thread waits on speech
+class TTSWorker:
+    def __init__(self, cache_dir=DEFAULT_AUDIO_CACHE_DIR, max_files=500, engine_factory=None):
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        self._engine_factory = engine_factory or (lambda: pyttsx3.init())
+        self._engine = None
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+        self._thread.start()
 
-    # If already speaking, stop the engine and clean up
-    if _active:
-        _active = False
-        if _current_engine:
+    def path_for(self, text):
+        return os.path.join(self.cache_dir, f"{audio_key(text)}.wav")
+
+    # Returns a Future resolving to the audio file path; cached and in-flight texts are not rendered again
+    def synthesize(self, text):
+        path = self.path_for(text)
+        with self._lock:
+            future = self._pending.get(path)
+            if future is not None:
+                return future
+            future = Future()
+            if os.path.exists(path):
+                # Touch the file so eviction drops the least recently played audio first
+                os.utime(path)
+                future.set_result(path)
+                return future
+            self._pending[path] = future
+        self._queue.put((text, path, future))
+        return future
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            text, path, future = job
             try:
-                _current_engine.stop()
+                self._render(text, path)
+                future.set_result(path)
             except Exception as e:
-                st.error(f"Error stopping TTS engine: {e}")
-        
-        if _current_thread and _current_thread.is_alive():
-            _current_thread.join(timeout=0.5)
-        
-        _current_engine = None
-        return False
-
-    # Otherwise, start speaking in a new thread
-    _active = True
-
-    def speak_text():
-        global _active, _current_engine
-        try:
-            # Initialize new TTS engine
-            _current_engine = pyttsx3.init()
-            
-            # Queue the text
-            _current_engine.say(text)
-            if _active:
-                # Play the speech
-                _current_engine.runAndWait()
-        except Exception as e:
-            st.error(f"TTS error: {e}")
-        finally:
-            # Reset state after speaking
-            _active = False
-            _current_engine = None
-
-    _current_thread = threading.Thread(target=speak_text, daemon=True)
-    _current_thread.start()
-
-    return True
\ No newline at end of file
+                # Start from a fresh engine next time in case this one is wedged
+                self._engine = None
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._pending.pop(path, None)
+
+    def _render(self, text, path):
+        if self._engine is None:
+            self._engine = self._engine_factory()
+        tmp = f"{path[:-len('.wav')]}.{os.getpid()}.tmp.wav"
+        self._engine.save_to_file(text, tmp)
+        self._engine.runAndWait()
+        if not os.path.exists(tmp) or os.path.getsize(tmp) == 0:
+            raise RuntimeError("TTS engine produced no audio")
+        os.replace(tmp, path)
+        self._evict()
+
+    # Keeps at most max_files rendered answers, dropping the least recently used
+    def _evict(self):
+        files = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".wav") and ".tmp." not in entry.name]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    # Stops the worker after the queued requests are rendered
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+# Process-wide worker shared by all sessions (each session keeps its own Futures)
+_shared_worker = None
+_shared_lock = threading.Lock()
+
+def get_tts_worker(cache_dir=None):
+    global _shared_worker
+    with _shared_lock:
+        if _shared_worker is None:
+            _shared_worker = TTSWorker(cache_dir or os.environ.get("TTS_CACHE_DIR", DEFAULT_AUDIO_CACHE_DIR))
+        return _shared_worker
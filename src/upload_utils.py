@@ -1,6 +1,19 @@
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
 import pymupdf
-from openai import OpenAI
 import streamlit as st
+from src import chunking
+from src.cache import get_title_cache
+from src.clients import get_client
+from src.tracing import record_cache, record_span, record_usage, traced
 
 # Extracts all text from a PDF file
 def extract_text_from_pdf(pdf_file):
@@ -11,29 +24,185 @@ def extract_text_from_pdf(pdf_file):
 def extract_text_from_txt(txt_file):
     return txt_file.read().decode("utf-8")
 
+# One process pool for every upload, started on first use so each upload doesn't pay for new interpreters
+# Spawned, not forked: the app process has other threads (the pipeline loop, TTS, title requests)
+# whose locks a forked child could inherit held and deadlock on
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_pool
+
+def _reset_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        _pdf_pool = None
+
+# Pool task: opens the PDF and extracts one page range (the pool outlives any single upload,
+# so workers don't keep documents open between tasks)
+def _extract_page_range(path, start, end):
+    with pymupdf.open(path) as doc:
+        return [doc[i].get_text() for i in range(start, end)]
+
+# Lazily yields (page_number, text) for every page of a PDF, in order
+# Large documents are split into page ranges extracted in parallel by a process pool; at most
+# two ranges per worker are in flight, so memory stays bounded however long the document is
+# The "pdf_extract" span covers only the time spent extracting (or waiting for the pool), not
+# the time the consumer spends on each page
+def iter_pdf_pages(pdf_file, max_workers=None, pages_per_task=8):
+    extracting = 0.0
+    try:
+        data = pdf_file.read() if hasattr(pdf_file, "read") else pdf_file
+        stage = time.perf_counter()
+        with pymupdf.open(stream=data, filetype="pdf") as doc:
+            page_count = doc.page_count
+            workers = min(max_workers or os.cpu_count() or 1, math.ceil(page_count / pages_per_task))
+            extracting += time.perf_counter() - stage
+            if workers <= 1:
+                for number in range(page_count):
+                    stage = time.perf_counter()
+                    text = doc[number].get_text()
+                    extracting += time.perf_counter() - stage
+                    yield number + 1, text
+                return
+
+        # Workers read the document from disk instead of receiving a pickled copy each
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "upload.pdf")
+            with open(path, "wb") as f:
+                f.write(data)
+            del data
+
+            pool = _get_pdf_pool()
+            ranges = iter([(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)])
+            pending = deque(
+                (start, pool.submit(_extract_page_range, path, start, end)) for start, end in islice(ranges, 2 * workers)
+            )
+            try:
+                while pending:
+                    start, future = pending.popleft()
+                    stage = time.perf_counter()
+                    texts = future.result()
+                    extracting += time.perf_counter() - stage
+                    for next_start, next_end in islice(ranges, 1):
+                        pending.append((next_start, pool.submit(_extract_page_range, path, next_start, next_end)))
+                    for offset, text in enumerate(texts):
+                        yield start + offset + 1, text
+            except BrokenProcessPool:
+                # A crashed worker breaks the whole pool; the next upload starts a fresh one
+                _reset_pdf_pool()
+                raise
+            finally:
+                for _, future in pending:
+                    future.cancel()
+                # Let running tasks finish before the temporary file goes away
+                wait([future for _, future in pending])
+    finally:
+        record_span("pdf_extract", extracting)
+
+# Chunks (page_number, text) pairs into overlapping windows of at most chunk_size embedding tokens
+# Windows run across page boundaries (preferring to end at a sentence or page break) and record the pages they cover
+def chunk_pages(pages, chunk_size=300, overlap=20):
+    return chunking.chunk_pages(pages, chunk_size, overlap)
+
 # Splits a long text into overlapping chunks for better AI processing
 def chunk_text(text, chunk_size=300, overlap=20):
-    words = text.split()
+    return chunking.chunk_text(text, chunk_size, overlap)
+
+# Extracts and chunks an uploaded PDF or TXT file, returning chunks and their page spans
+@traced("chunk_upload")
+def chunk_upload(uploaded_file, chunk_size=300, overlap=20):
+    if uploaded_file.name.endswith(".pdf"):
+        pages = iter_pdf_pages(uploaded_file)
+    else:
+        pages = [(None, extract_text_from_txt(uploaded_file))]
     chunks = []
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = ' '.join(words[i:i+chunk_size])
+    spans = []
+    for chunk, span in chunk_pages(pages, chunk_size, overlap):
         chunks.append(chunk)
-    return chunks
+        spans.append(span)
+    return chunks, spans
+
+TITLE_MODEL = "gpt-3.5-turbo"
+TITLE_PLACEHOLDER = "Generating title..."
+
+# Shown instead of a generated title when the request fails
+def fallback_title(text):
+    return text[:80] + "..."
+
+# Asks the chat model for a short, readable title (raises on API errors)
+@traced("chunk_title")
+def request_chunk_title(client, text):
+    response = client.chat.completions.create(
+        model=TITLE_MODEL,
+        messages=[
+            {"role": "system", "content": "Summarize this content into a short, descriptive title (5-10 words max)."},
+            {"role": "user", "content": text}
+        ],
+        temperature=0.3,
+        max_tokens=20
+    )
+    record_usage("chunk_title", getattr(response, "usage", None), TITLE_MODEL)
+    return response.choices[0].message.content.strip()
 
 # Uses OpenAI to generate a short, readable title for a given text chunk
 def generate_chunk_title(text):
-    client = OpenAI(api_key=st.session_state.get("openai_api_key"))
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Summarize this content into a short, descriptive title (5-10 words max)."},
-                {"role": "user", "content": text}
-            ],
-            temperature=0.3,
-            max_tokens=20
-        )
-        return response.choices[0].message.content.strip()
+        return request_chunk_title(get_client(), text)
     except Exception as e:
         st.error(f"Chunk title generation failed: {e}")
-        return text[:80] + "..."
\ No newline at end of file
+        return fallback_title(text)
+
+# Generates section titles concurrently in the background
+# Cached titles are available immediately; the rest replace their placeholders as requests finish
+class ChunkTitler:
+    def __init__(self, chunks, client=None, cache=None, max_workers=8):
+        self.chunks = list(chunks)
+        self.client = client if client is not None else get_client()
+        self.cache = cache if cache is not None else get_title_cache()
+        self.titles = [TITLE_PLACEHOLDER] * len(self.chunks)
+        self.errors = []
+
+        missing = []
+        for i, title in enumerate(self.cache.get_many(TITLE_MODEL, self.chunks)):
+            if title is None:
+                missing.append(i)
+            else:
+                self.titles[i] = title
+        record_cache("titles", True, len(self.chunks) - len(missing))
+        record_cache("titles", False, len(missing))
+
+        self._futures = []
+        if missing:
+            executor = ThreadPoolExecutor(max_workers=min(max_workers, len(missing)), thread_name_prefix="chunk-titles")
+            self._futures = [executor.submit(self._generate, i) for i in missing]
+            # Workers keep running after shutdown(wait=False); the Streamlit script does not block on them
+            executor.shutdown(wait=False)
+
+    # Worker threads have no Streamlit context, so failures are collected instead of shown directly
+    def _generate(self, i):
+        try:
+            title = request_chunk_title(self.client, self.chunks[i])
+        except Exception as e:
+            self.errors.append(str(e))
+            self.titles[i] = fallback_title(self.chunks[i])
+            return
+        self.titles[i] = title
+        self.cache.put(TITLE_MODEL, self.chunks[i], title)
+
+    # Number of titles that are final (cached, generated or fallen back)
+    def completed(self):
+        return len(self.chunks) - sum(not future.done() for future in self._futures)
+
+    @property
+    def done(self):
+        return all(future.done() for future in self._futures)
+
+    # Blocks until every title is in and returns them
+    def wait(self, timeout=None):
+        wait(self._futures, timeout)
+        return self.titles
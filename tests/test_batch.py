@@ -0,0 +1,59 @@
+import json
+import pandas as pd
+from benchmarks.fake_openai import FakeAsyncOpenAI, FakeOpenAI
+from src import batch, retrieval
+from src.cache import EmbeddingCache
+from src.retrieval import AIDocumentStore
+
+# Builds a small corpus index and points the batch runner at the offline fakes
+def setup_batch(tmp_path, monkeypatch):
+    client = FakeOpenAI(latency=0)
+    monkeypatch.setattr(retrieval, "get_client", lambda api_key=None: client)
+    monkeypatch.setattr(batch, "get_client", lambda api_key=None: client)
+    monkeypatch.setattr(batch, "get_async_client", lambda api_key=None: FakeAsyncOpenAI(latency=0, chat_latency=0))
+    store = AIDocumentStore(
+        str(tmp_path / "data.csv"), str(tmp_path / "faiss.index"),
+        chunk_size=5, embedding_cache=EmbeddingCache(":memory:")
+    )
+    pd.DataFrame([
+        ("Paper A", "http://a", "attention is all you need"),
+        ("Paper B", "http://b", "LoRA adapts large models cheaply"),
+    ], columns=["title", "url", "abstract"]).to_csv(store.dataset_path, index=False)
+    index = store.build_index()
+    return store, index
+
+def read_output(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+# Test that a batch searches once per batch, writes one record per question and resumes from the output
+def test_run_batch_answers_and_resumes(tmp_path, monkeypatch):
+    store, index = setup_batch(tmp_path, monkeypatch)
+    searches = []
+    search = store.search
+    monkeypatch.setattr(store, "search", lambda index, vectors, k: searches.append(len(vectors)) or search(index, vectors, k))
+    questions = tmp_path / "questions.csv"
+    output = tmp_path / "answers.jsonl"
+    pd.DataFrame({"question": [f"What is LoRA {i}?" for i in range(5)]}).to_csv(questions, index=False)
+
+    summary = batch.run_batch(str(questions), str(output), store, index, batch_size=4, concurrency=2,
+                              cache=EmbeddingCache(":memory:"))
+    assert summary["answered"] == 5 and summary["failed"] == 0 and summary["skipped"] == 0
+    assert searches == [4, 1]
+    records = read_output(output)
+    assert sorted(record["id"] for record in records) == ["0", "1", "2", "3", "4"]
+    assert all(record["answer"] and record["sources"] for record in records)
+
+    # A crash mid-write leaves a partial line; the rerun drops it and only answers what is missing
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"id": "5", "quest')
+    pd.DataFrame({"question": [f"What is LoRA {i}?" for i in range(7)]}).to_csv(questions, index=False)
+    summary = batch.run_batch(str(questions), str(output), store, index, batch_size=4, cache=EmbeddingCache(":memory:"))
+    assert summary["answered"] == 2 and summary["skipped"] == 5
+    assert sorted(record["id"] for record in read_output(output)) == [str(i) for i in range(7)]
+
+# Test that JSONL question banks accept objects with ids or bare strings
+def test_read_questions_jsonl(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    path.write_text('{"id": "q1", "question": "What is attention?"}\n"What is LoRA?"\n\n', encoding="utf-8")
+    assert list(batch.read_questions(str(path))) == [("q1", "What is attention?"), ("1", "What is LoRA?")]
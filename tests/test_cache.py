@@ -0,0 +1,69 @@
+import numpy as np
+from benchmarks.fake_openai import FakeOpenAI
+from src.cache import EmbeddingCache, TitleCache
+from src.embeddings import embed_texts
+
+# Test that stored vectors come back unchanged and counters track hits and misses
+def test_cache_round_trip_and_counters():
+    cache = EmbeddingCache(":memory:")
+    assert cache.get("model", "hello") is None
+    cache.put("model", "hello", np.array([1.0, 2.0, 3.0]))
+    assert np.allclose(cache.get("model", "hello"), [1.0, 2.0, 3.0])
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+# Test that keys ignore whitespace differences but not the model name
+def test_cache_key_normalization():
+    assert EmbeddingCache.make_key("m", "What  is\nAI? ") == EmbeddingCache.make_key("m", "What is AI?")
+    assert EmbeddingCache.make_key("m1", "text") != EmbeddingCache.make_key("m2", "text")
+
+# Test that the least recently used entries are evicted once the cache is full
+def test_cache_lru_eviction():
+    cache = EmbeddingCache(":memory:", max_entries=2)
+    cache.put("m", "a", [1.0])
+    cache.put("m", "b", [2.0])
+    cache.get("m", "a")
+    cache.put("m", "c", [3.0])
+    assert len(cache) == 2
+    assert cache.get("m", "b") is None
+    assert cache.get("m", "a") is not None
+
+# Test that re-storing a key replaces it without counting it twice, and the count survives a reopen
+def test_cache_running_count(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path, max_entries=2)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    cache.put("m", "a", [5.0])
+    assert len(cache) == 2 and cache._count == 2
+    assert np.allclose(cache.get("m", "a"), [5.0])
+    reopened = EmbeddingCache(path, max_entries=2)
+    reopened.put("m", "c", [3.0])
+    assert len(reopened) == 2 and reopened._count == 2
+    assert reopened.get("m", "b") is None
+
+# Test that the cache persists across instances on disk
+def test_cache_persists(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    EmbeddingCache(path).put("m", "text", [0.5, 0.25])
+    assert np.allclose(EmbeddingCache(path).get("m", "text"), [0.5, 0.25])
+
+# Test that embed_texts only sends cache misses to the API
+def test_embed_texts_uses_cache():
+    cache = EmbeddingCache(":memory:")
+    client = FakeOpenAI(dim=4, latency=0)
+    first = embed_texts(["a", "b", "c"], client, dim=4, cache=cache)
+    assert client.embeddings.items == 3
+
+    second = embed_texts(["c", "d", "a"], client, dim=4, cache=cache)
+    assert client.embeddings.items == 4
+    assert np.allclose(second[0], first[2])
+    assert np.allclose(second[2], first[0])
+
+# Test that section titles are cached by content and evicted least recently used first
+def test_title_cache_round_trip():
+    cache = TitleCache(":memory:", max_entries=2)
+    cache.put("m", "chunk  one", "One")
+    cache.put("m", "chunk two", "Two")
+    cache.get_many("m", ["chunk one"])
+    cache.put("m", "chunk three", "Three")
+    assert cache.get_many("m", ["chunk one", "chunk two", "chunk three"]) == ["One", None, "Three"]
@@ -0,0 +1,47 @@
+import numpy as np
+from src.chunk_store import ChunkStore, write_chunk_store
+
+# Test that chunks and their metadata survive a write/read round trip
+def test_chunk_store_round_trip(tmp_path):
+    directory = str(tmp_path / "faiss.index.chunks")
+    write_chunk_store(
+        directory,
+        [7, 3, 9],
+        ["first chunk", "second chünk", ""],
+        [
+            {"title": "Paper A", "url": "http://a"},
+            {"title": "Paper A", "url": "http://a"},
+            {"title": "Paper B", "url": float("nan")}
+        ]
+    )
+    store = ChunkStore(directory)
+    assert len(store) == 3
+    assert store.documents[1] == "second chünk"
+    assert store.documents[-1] == ""
+    assert store.metadata[0] == {"title": "Paper A", "url": "http://a"}
+    assert store.metadata[2] == {"title": "Paper B", "url": ""}
+    assert list(store.ids) == [7, 3, 9]
+
+# Test that chunk ids resolve to their positions and unknown ids resolve to None
+def test_chunk_store_position_lookup(tmp_path):
+    directory = str(tmp_path / "chunks")
+    write_chunk_store(directory, [10, 2, 5], ["a", "b", "c"], [{"title": "t", "url": "u"}] * 3)
+    store = ChunkStore(directory)
+    assert store.position(2) == 1
+    assert store.position(10) == 0
+    assert store.position(-1) is None
+    assert store.position(4) is None
+
+# Test that titles are stored once per paper, not once per chunk
+def test_chunk_store_deduplicates_papers(tmp_path):
+    directory = str(tmp_path / "chunks")
+    write_chunk_store(directory, range(4), ["a", "b", "c", "d"], [{"title": "Same", "url": "u"}] * 4)
+    assert np.load(f"{directory}/titles_offsets.npy").tolist() == [0, 4]
+
+# Test that rewriting the store replaces the previous contents
+def test_chunk_store_overwrite(tmp_path):
+    directory = str(tmp_path / "chunks")
+    write_chunk_store(directory, [1], ["old"], [{"title": "t", "url": "u"}])
+    write_chunk_store(directory, [1, 2], ["new", "newer"], [{"title": "t", "url": "u"}] * 2)
+    store = ChunkStore(directory)
+    assert store.documents[:] == ["new", "newer"]
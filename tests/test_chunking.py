@@ -1,6 +1,14 @@
-from src.upload_utils import chunk_text, extract_text_from_txt, extract_text_from_pdf
+from src.upload_utils import (
+    ChunkTitler, chunk_pages, chunk_text, extract_text_from_txt, extract_text_from_pdf, iter_pdf_pages
+)
+from benchmarks.fake_openai import FakeOpenAI
+from src.cache import TitleCache
+from src.tokens import count_tokens
 import io
+import time
 import pymupdf
+from src import upload_utils
+from src.tracing import trace
 
 # Test that long text gets chunked correctly with overlap
 def test_chunk_text_length():
@@ -41,4 +49,94 @@ def test_extract_text_from_pdf(monkeypatch):
     text = extract_text_from_pdf(fake_pdf)
 
     assert "Dummy page text." in text
-    assert text.count("Dummy page text.") == 2
\ No newline at end of file
+    assert text.count("Dummy page text.") == 2
+
+# Test that section titles are generated concurrently and reused from the cache on re-upload
+def test_chunk_titler_uses_cache():
+    chunks = [f"section {i} about topic {i}" for i in range(6)]
+    cache = TitleCache(":memory:")
+    client = FakeOpenAI(chat_latency=0.05)
+    titles = ChunkTitler(chunks, client=client, cache=cache, max_workers=6).wait(timeout=5)
+    assert all(title.startswith("Answer") for title in titles)
+    assert client.chat.completions.calls == 6
+
+    again = ChunkTitler(chunks, client=client, cache=cache)
+    assert again.done and again.titles == titles
+    assert client.chat.completions.calls == 6
+
+# Test that failed title requests fall back to the chunk text and are not cached
+def test_chunk_titler_fallback():
+    cache = TitleCache(":memory:")
+    titler = ChunkTitler(["some text"], client=FakeOpenAI(chat_latency=0, chat_fail=True), cache=cache)
+    assert titler.wait(timeout=5) == ["some text..."]
+    assert titler.errors
+    assert cache.get_many("gpt-3.5-turbo", ["some text"]) == [None]
+
+# Builds an in-memory PDF whose pages hold the given texts
+def make_pdf(page_texts):
+    doc = pymupdf.open()
+    for text in page_texts:
+        doc.new_page().insert_text((72, 72), text)
+    return doc.tobytes()
+
+# Test that pages come back in order whether extracted inline or by the process pool
+def test_iter_pdf_pages_parallel_matches_serial():
+    data = make_pdf([f"page {i} text" for i in range(1, 8)])
+    serial = list(iter_pdf_pages(data, max_workers=1))
+    parallel = list(iter_pdf_pages(io.BytesIO(data), max_workers=2, pages_per_task=2))
+    assert parallel == serial
+    assert [number for number, _ in serial] == list(range(1, 8))
+    assert "page 7 text" in serial[-1][1]
+
+# Test that uploads share one extraction pool and the pdf_extract span leaves out the consumer's time
+def test_iter_pdf_pages_reuses_pool_and_times_extraction():
+    data = make_pdf([f"page {i} text" for i in range(1, 6)])
+    list(iter_pdf_pages(data, max_workers=2, pages_per_task=2))
+    pool = upload_utils._get_pdf_pool()
+    with trace("upload") as active:
+        for _ in iter_pdf_pages(data, max_workers=2, pages_per_task=2):
+            time.sleep(0.05)
+    assert upload_utils._get_pdf_pool() is pool
+    (extract,) = [s for s in active.to_dict()["spans"] if s["stage"] == "pdf_extract"]
+    assert extract["seconds"] < 0.25
+
+# Test that chunks prefer to end at page breaks, overlap into the next page and record the pages they span
+def test_chunk_pages_spans_pages():
+    pages = [(1, "a " * 8), (2, "b " * 8), (3, "c " * 8)]
+    chunks = list(chunk_pages(pages, chunk_size=10, overlap=2))
+    assert [span for _, span in chunks] == [
+        {"page_start": 1, "page_end": 1}, {"page_start": 1, "page_end": 2}, {"page_start": 2, "page_end": 3}
+    ]
+    assert chunks[0][0].split()[-2:] == chunks[1][0].split()[:2]
+    assert [chunk for chunk, _ in chunks] == chunk_text("\n\n".join(text for _, text in pages), 10, 2)
+
+# Test that pages are read lazily: the first chunks come out before later pages are read
+def test_chunk_pages_streams_pages():
+    read = []
+    def pages():
+        for number in range(1, 201):
+            read.append(number)
+            yield number, f"Page {number} says something. " * 20
+
+    chunks = chunk_pages(pages(), chunk_size=50, overlap=5)
+    first = next(chunks)
+    assert first[1] == {"page_start": 1, "page_end": 1}
+    assert len(read) == 1
+    rest = list(chunks)
+    assert len(read) == 200
+    assert rest[-1][1]["page_end"] == 200
+
+# Test that chunks never exceed the token budget and end at sentence boundaries when one is close enough
+def test_chunk_text_respects_tokens_and_sentences():
+    text = "The cat sat. It was happy! Then it left the mat and went home to sleep. End."
+    chunks = chunk_text(text, chunk_size=8, overlap=0)
+    assert chunks == ["The cat sat. It was happy!", "Then it left the mat and went home", "to sleep. End."]
+    assert all(count_tokens(chunk) <= 8 for chunk in chunks)
+    assert " ".join(chunks) == text
+
+    long_text = " ".join(f"Sentence number {i} talks about transformers, attention and LoRA." for i in range(200))
+    chunks = chunk_text(long_text, chunk_size=50, overlap=10)
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert chunks[0] == long_text[:len(chunks[0])]
+    assert chunks[-1] == long_text[-len(chunks[-1]):]
@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from src import clients
+
+# Test that the same key returns the same pooled client and different keys get their own
+def test_get_client_reuses_clients_per_key():
+    first = clients.get_client("sk-test-a")
+    assert clients.get_client("sk-test-a") is first
+    assert clients.get_client("sk-test-b") is not first
+    clients.drop_client("sk-test-a")
+    clients.drop_client("sk-test-b")
+
+# Test that dropping a client makes the next call build a fresh one
+def test_drop_client():
+    first = clients.get_client("sk-test-drop")
+    clients.drop_client("sk-test-drop")
+    assert clients.get_client("sk-test-drop") is not first
+    clients.drop_client("sk-test-drop")
+
+# Test that scripts fall back to the OPENAI_API_KEY environment variable
+def test_get_client_uses_environment_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-env")
+    assert clients.get_client().api_key == "sk-env"
+    clients.drop_client("sk-env")
+
+# Test that async clients are shared within one event loop only
+def test_async_clients_are_per_loop():
+    async def fetch():
+        return clients.get_async_client("sk-async"), clients.get_async_client("sk-async")
+
+    first, second = asyncio.run(fetch())
+    assert first is second
+    third, _ = asyncio.run(fetch())
+    assert third is not first
+
+# Test that closing a loop's async clients closes their connections and the next call opens a new one
+def test_close_async_clients():
+    async def fetch_and_close():
+        client = clients.get_async_client("sk-close")
+        await clients.close_async_clients()
+        fresh = clients.get_async_client("sk-close")
+        await clients.close_async_clients()
+        return client, fresh
+
+    closed, fresh = asyncio.run(fetch_and_close())
+    assert closed.is_closed()
+    assert fresh is not closed
+
+# Test that without a Streamlit session only the explicit key or the environment is used
+def test_resolve_key_outside_streamlit(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-env")
+    assert clients._resolve_key("sk-explicit") == "sk-explicit"
+    assert clients._resolve_key(None) == "sk-env"
+
+# Test that configure() rejects unknown settings
+def test_configure_rejects_unknown_settings():
+    with pytest.raises(ValueError):
+        clients.configure(pool_size=5)
@@ -0,0 +1,56 @@
+from src.context import dedupe_chunks, pack_prompt, pack_sources, prompt_token_budget, trim_to_tokens
+from src.generator import build_prompt
+from src.tokens import count_tokens
+
+META = {"title": "Paper", "url": "http://p"}
+
+# Test that trimming keeps whole sentences from the requested end
+def test_trim_to_tokens_sentence_boundaries():
+    text = "First sentence here. Second sentence here. Third sentence here."
+    assert trim_to_tokens(text, 1000) == text
+    assert trim_to_tokens(text, 8) == "First sentence here."
+    assert trim_to_tokens(text, 8, keep="tail") == "Third sentence here."
+    assert trim_to_tokens(text, 0) == ""
+
+# Test that an overlong single sentence is cut at a word boundary within budget
+def test_trim_to_tokens_long_sentence():
+    text = " ".join(f"word{i}" for i in range(200))
+    trimmed = trim_to_tokens(text, 20)
+    assert trimmed.startswith("word0 word1")
+    assert count_tokens(trimmed, "gpt-3.5-turbo") <= 20
+
+# Test that repeated chunks are dropped and chunker overlap with a better-ranked neighbour is stripped
+def test_dedupe_chunks():
+    first = " ".join(f"w{i}" for i in range(20))
+    second = " ".join(f"w{i}" for i in range(14, 30))
+    docs = [(first, META), (first, META), (second, META), (second, {"title": "Other", "url": ""})]
+    deduped = list(dedupe_chunks(docs))
+    assert len(deduped) == 3
+    assert deduped[1][0] == " ".join(f"w{i}" for i in range(20, 30))
+    assert deduped[2][0] == second
+
+# Test that sources are packed in rank order and the last one is trimmed to fit
+def test_pack_sources_budget():
+    docs = [(f"Sentence {i} about topic {i}. " * 20, {"title": f"T{i}", "url": ""}) for i in range(5)]
+    packed = pack_sources(docs, 300)
+    assert count_tokens(packed, "gpt-3.5-turbo") <= 300
+    assert "[Source 1] Title: T0" in packed
+    assert "T4" not in packed
+
+# Test that a budgeted prompt stays within budget and keeps the question and recent memory
+def test_build_prompt_respects_budget():
+    docs = [("Attention weighs tokens. " * 200, META), ("Convolutions share weights. " * 200, {"title": "CNN", "url": ""})]
+    memory = "Previous Q: old question?\nPrevious A: old answer. " * 50 + "Previous Q: latest?\nPrevious A: latest answer."
+    prompt = build_prompt("What is attention?", docs, memory_block=memory, token_budget=600)
+    assert count_tokens(prompt, "gpt-3.5-turbo") <= 600
+    assert "Question: What is attention?" in prompt
+    assert "latest answer." in prompt
+    assert "[Source 1] Title: Paper" in prompt
+
+# Test that the prompt budget leaves room for the answer and the explanation call
+def test_prompt_token_budget():
+    assert prompt_token_budget(300) + 300 + 200 < 4096
+    assert prompt_token_budget(1000) > 2700
+    assert prompt_token_budget(5000) == 0
+    question, memory, context = pack_prompt("", "q?", "", [("text.", META)], 1000)
+    assert question == "q?" and "text." in context
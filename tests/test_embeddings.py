@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from benchmarks.fake_openai import FakeOpenAI, hash_vector
+from src import embeddings
+from src.embeddings import embed_texts, plan_batches
+
+# Test that batches respect the maximum item count and cover every text once
+def test_plan_batches_respects_batch_size():
+    texts = ["word"] * 10
+    batches = plan_batches(texts, max_batch_tokens=1000, max_batch_size=4)
+    assert batches == [(0, 4), (4, 8), (8, 10)]
+
+# Test that batches are split when the token budget would be exceeded
+def test_plan_batches_respects_token_budget():
+    texts = ["a b c", "d e f", "g h i"]
+    batches = plan_batches(texts, max_batch_tokens=6, max_batch_size=100)
+    assert batches == [(0, 2), (2, 3)]
+
+# Test that a single oversized text still gets its own batch
+def test_plan_batches_oversized_text():
+    batches = plan_batches(["a " * 50, "b"], max_batch_tokens=10, max_batch_size=100)
+    assert batches == [(0, 1), (1, 2)]
+
+# Test that embeddings land in the right rows of a float32 matrix
+def test_embed_texts_fills_matrix_in_order():
+    client = FakeOpenAI(dim=8, latency=0)
+    texts = [f"chunk {i}" for i in range(25)]
+    out = embed_texts(texts, client, dim=8, max_batch_size=4, max_workers=3)
+    assert out.shape == (25, 8)
+    assert out.dtype == np.float32
+    assert client.embeddings.calls == 7
+    for i, text in enumerate(texts):
+        assert np.allclose(out[i], hash_vector(text, 8))
+
+# Test that rate-limited batches are retried rather than failing the whole run
+def test_embed_texts_retries_rate_limits(monkeypatch):
+    monkeypatch.setattr(embeddings.time, "sleep", lambda seconds: None)
+    client = FakeOpenAI(dim=4, latency=0, rate_limit_every=2)
+    out = embed_texts([f"t{i}" for i in range(6)], client, dim=4, max_batch_size=2, max_workers=1)
+    assert np.allclose(out[5], hash_vector("t5", 4))
+    assert client.embeddings.items == 6
+
+# Test that retries give up after max_retries
+def test_embed_texts_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(embeddings.time, "sleep", lambda seconds: None)
+    client = FakeOpenAI(dim=4, latency=0, rate_limit_every=1)
+    with pytest.raises(embeddings.RateLimitError):
+        embed_texts(["x"], client, dim=4, max_retries=2)
+    assert client.embeddings.calls == 3
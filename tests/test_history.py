@@ -0,0 +1,49 @@
+import sqlite3
+import pandas as pd
+from src.history import HistoryStore
+
+# Test that recent() returns the newest entries first, including ones still queued
+def test_recent_newest_first():
+    store = HistoryStore(":memory:", csv_path=None, batch_size=3)
+    for i in range(5):
+        store.append(f"Q{i}", f"A{i}", timestamp=f"2024-01-01 00:00:0{i}")
+    recent = store.recent(2)
+    assert [row["question"] for row in recent] == ["Q4", "Q3"]
+    assert recent[0] == {"timestamp": "2024-01-01 00:00:04", "question": "Q4", "answer": "A4"}
+    assert len(store) == 5
+
+# Test that the legacy CSV is imported once and then moved aside
+def test_csv_migration(tmp_path):
+    csv_path = tmp_path / "history.csv"
+    pd.DataFrame([
+        {"timestamp": "2024-01-01 10:00:00", "question": "Old Q", "answer": "Old A"},
+        {"timestamp": "2024-01-02 10:00:00", "question": "Newer Q", "answer": ""}
+    ]).to_csv(csv_path, index=False)
+
+    store = HistoryStore(str(tmp_path / "history.sqlite"), csv_path=str(csv_path))
+    assert not csv_path.exists()
+    assert (tmp_path / "history.csv.migrated").exists()
+    assert [row["question"] for row in store.recent(5)] == ["Newer Q", "Old Q"]
+    assert store.recent(1)[0]["answer"] == ""
+
+    # A recreated CSV is not imported a second time
+    pd.DataFrame([{"timestamp": "t", "question": "again", "answer": "a"}]).to_csv(csv_path, index=False)
+    store.close()
+    assert len(HistoryStore(str(tmp_path / "history.sqlite"), csv_path=str(csv_path))) == 2
+
+# Test that two stores on the same file (e.g. two app processes) both see each other's writes
+def test_concurrent_writers(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    first = HistoryStore(path, csv_path=None, batch_size=1)
+    second = HistoryStore(path, csv_path=None, batch_size=1)
+    first.append("from first", "a")
+    second.append("from second", "b")
+    assert [row["question"] for row in first.recent(2)] == ["from second", "from first"]
+
+# Test that an append is on disk right away, without a flush or a clean shutdown
+def test_append_writes_through(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    writer = HistoryStore(path, csv_path=None)
+    writer.append("q", "a")
+    reader = sqlite3.connect(path)
+    assert reader.execute("SELECT question FROM history").fetchall() == [("q",)]
@@ -0,0 +1,90 @@
+import faiss
+import numpy as np
+import pytest
+from src.indexing import (
+    create_index, default_nlist, index_factory_string, prepare_vectors, set_search_params, supports_mmap,
+    supports_removal, train_index
+)
+
+# Small random corpus shared by the index tests
+def vectors(n=500, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+
+# Test that every index type finds an exact copy of a stored vector
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+def test_index_types_search_with_ids(index_type):
+    data = vectors()
+    index = create_index(index_type, 16, len(data), nlist=8, pq_m=4)
+    train_index(index, data)
+    index.add_with_ids(data, np.arange(1000, 1000 + len(data)))
+    set_search_params(index, nprobe=8, ef_search=64)
+    _, ids = index.search(data[:5], 1)
+    assert ids[:, 0].tolist() == list(range(1000, 1005))
+
+# Test that unknown index types are rejected with a helpful message
+def test_unknown_index_type():
+    with pytest.raises(ValueError) as excinfo:
+        index_factory_string("lsh", 16, 100)
+    assert "flat" in str(excinfo.value)
+
+# Test that the IVF list count is capped by the available training points
+def test_default_nlist_bounds():
+    assert default_nlist(10) == 1
+    assert default_nlist(1_000_000) == 4000
+
+# Test that search parameters are applied to IVF and HNSW indexes
+def test_set_search_params():
+    data = vectors()
+    ivf = create_index("ivf_flat", 16, len(data), nlist=8)
+    set_search_params(ivf, nprobe=4)
+    assert faiss.extract_index_ivf(ivf).nprobe == 4
+
+    hnsw = create_index("hnsw", 16, len(data))
+    set_search_params(hnsw, ef_search=99)
+    assert not supports_removal(hnsw)
+    assert supports_removal(ivf)
+
+# Test that only IVF indexes count as memory-mappable
+def test_supports_mmap():
+    assert supports_mmap(create_index("ivf_flat", 16, 500, nlist=8))
+    assert not supports_mmap(create_index("flat", 16, 500))
+    assert not supports_mmap(create_index("hnsw", 16, 500))
+    assert not supports_mmap(create_index("flat", 16, 500, storage="int8"))
+
+# Test that inner-product indexes rank by cosine similarity regardless of vector length
+def test_inner_product_uses_normalized_vectors():
+    data = vectors()
+    index = create_index("flat", 16, len(data), metric="ip")
+    index.add_with_ids(prepare_vectors(index, data), np.arange(len(data)))
+    scores, ids = index.search(prepare_vectors(index, data[3] * 10), 1)
+    assert ids[0, 0] == 3
+    assert scores[0, 0] == pytest.approx(1.0, abs=1e-4)
+
+# Test that prepare_vectors leaves L2 inputs untouched and never mutates the caller's array
+def test_prepare_vectors_copies():
+    data = vectors(n=2)
+    original = data.copy()
+    l2 = create_index("flat", 16, 2)
+    ip = create_index("flat", 16, 2, metric="ip")
+    assert np.allclose(prepare_vectors(l2, data), original)
+    assert np.allclose(np.linalg.norm(prepare_vectors(ip, data), axis=1), 1.0)
+    assert np.allclose(data, original)
+
+# Test that scalar-quantized storage shrinks the index while keeping nearest neighbours
+@pytest.mark.parametrize("storage, max_ratio", [("fp16", 0.55), ("int8", 0.3)])
+def test_scalar_quantized_storage(storage, max_ratio):
+    data = vectors(n=2000, dim=64)
+    sizes = {}
+    for kind in ("fp32", storage):
+        index = create_index("flat", 64, len(data), storage=kind)
+        train_index(index, data)
+        index.add_with_ids(data, np.arange(len(data)))
+        sizes[kind] = faiss.serialize_index(index).nbytes
+    _, ids = index.search(data[:10], 1)
+    assert ids[:, 0].tolist() == list(range(10))
+    assert sizes[storage] < max_ratio * sizes["fp32"]
+
+# Test that unknown storage options are rejected
+def test_unknown_storage():
+    with pytest.raises(ValueError):
+        index_factory_string("flat", 16, 100, storage="int4")
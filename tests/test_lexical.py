@@ -0,0 +1,39 @@
+import numpy as np
+from src.lexical import LexicalIndex, reciprocal_rank_fusion, tokenize, write_lexical_index
+
+DOCS = [
+    "BERT is a bidirectional transformer encoder.",
+    "GPT-3.5 is a decoder-only transformer language model.",
+    "Convolutional networks use shared weights.",
+    "The transformer architecture relies on attention."
+]
+
+# Builds a small index whose chunk ids differ from positions
+def small_index(tmp_path):
+    write_lexical_index(str(tmp_path / "lexical"), [10, 11, 12, 13], DOCS)
+    return LexicalIndex(str(tmp_path / "lexical"))
+
+# Test that tokens are lowercased, stopwords dropped and dotted model names kept whole
+def test_tokenize():
+    assert tokenize("What is GPT-3.5 and the T5-base model?") == ["gpt-3.5", "t5-base", "model"]
+
+# Test that exact rare terms (model names, acronyms) rank their chunk first
+def test_bm25_exact_terms(tmp_path):
+    index = small_index(tmp_path)
+    scores, ids = index.search("how does BERT work", k=2)
+    assert ids.tolist() == [10]
+    scores, ids = index.search("gpt-3.5 transformer", k=3)
+    assert ids[0] == 11
+    assert len(ids) == 3 and np.all(np.diff(scores) <= 0)
+
+# Test that queries without any indexed term return nothing
+def test_bm25_no_match(tmp_path):
+    scores, ids = small_index(tmp_path).search("what is the", k=3)
+    assert len(ids) == 0
+
+# Test that fusion rewards keys ranked well by several retrievers
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]])
+    assert fused[0] == "c"
+    assert set(fused) == {"a", "b", "c", "d"}
+    assert reciprocal_rank_fusion([["x", "y"], []]) == ["x", "y"]
@@ -1,4 +1,6 @@
-from src.memory import add_to_memory, format_memory_prompt
+from benchmarks.fake_openai import FakeOpenAI
+from src.memory import ConversationMemory, add_to_memory, format_memory_prompt
+from src.tokens import count_tokens
 
 def test_memory_trims_correctly():
     # Simulates adding more items than the memory limit allows
@@ -15,4 +17,35 @@ def test_memory_formatting():
     mem = [("What is AI?", "It is the science of making machines smart.")]
     result = format_memory_prompt(mem)
     assert "Previous Q" in result
-    assert "Previous A" in result
\ No newline at end of file
+    assert "Previous A" in result
+
+def test_conversation_memory_summarizes_old_turns():
+    # Older turns are folded into a summary by the (fake) chat model; recent ones stay verbatim
+    client = FakeOpenAI(chat_latency=0)
+    memory = ConversationMemory(recent_turns=2, client=client)
+    for i in range(4):
+        memory.add(f"Q{i}?", f"A{i}.")
+    memory.wait(timeout=5)
+    assert memory.recent() == [("Q2?", "A2."), ("Q3?", "A3.")]
+    assert memory.summary.startswith("Answer")
+    block = memory.format()
+    assert "Summary of earlier conversation" in block
+    assert block.index("Summary") < block.index("Previous Q: Q2?") < block.index("Previous Q: Q3?")
+
+def test_conversation_memory_stays_within_budget():
+    # Huge answers are trimmed so the prompt size stays constant however long the session runs
+    memory = ConversationMemory(token_budget=150, recent_turns=2)
+    for i in range(10):
+        memory.add(f"Question {i}?", "This is a long answer sentence. " * 200)
+    memory.wait(timeout=5)
+    assert count_tokens(memory.format()) <= 150
+    assert "Question 9?" in memory.format()
+
+def test_conversation_memory_recalls_related_turn():
+    # A summarized turn whose question is similar to the new query is brought back verbatim
+    memory = ConversationMemory(recent_turns=1)
+    memory.add("What is dropout?", "Dropout randomly zeroes activations.", vector=[1.0, 0.0])
+    memory.add("What is a CNN?", "A convolutional network.", vector=[0.0, 1.0])
+    memory.wait(timeout=5)
+    assert "Related earlier Q: What is dropout?" in memory.format([0.9, 0.1])
+    assert "Related earlier" not in memory.format([0.0, 1.0])
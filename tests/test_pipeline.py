@@ -0,0 +1,206 @@
+import faiss
+import numpy as np
+from benchmarks.fake_openai import FakeAsyncOpenAI, FakeOpenAI, hash_vector
+from src import pipeline
+from src.cache import EmbeddingCache
+from src.lexical import LexicalIndex, write_lexical_index
+from src.memory import ConversationMemory
+from src.rerank import Reranker
+from src.retrieval import AIDocumentStore
+from src.semantic_cache import SemanticCache
+from src.session_index import SessionIndex
+
+# Builds a tiny in-memory store/index pair whose vectors match the fake embeddings
+def tiny_store():
+    store = AIDocumentStore(dataset_path=None, index_path=None)
+    store.documents = ["Transformers use attention.", "CNNs use convolutions."]
+    store.document_metadata = [{"title": "Attention", "url": "http://a"}, {"title": "CNN", "url": "http://c"}]
+    index = faiss.IndexIDMap2(faiss.IndexFlatL2(1536))
+    index.add_with_ids(np.stack([hash_vector(doc) for doc in store.documents]), np.arange(2))
+    return store, index
+
+# Routes the pipeline to a fake client and a private cache
+def use_fake_client(monkeypatch, client):
+    monkeypatch.setattr(pipeline, "get_async_client", lambda api_key: client)
+    monkeypatch.setattr(pipeline, "get_embedding_cache", lambda: EmbeddingCache(":memory:"))
+
+# Test that the pipeline returns answer, explanation, sources and per-stage timings
+def test_answer_question_end_to_end(monkeypatch):
+    client = FakeAsyncOpenAI(latency=0, chat_latency=0)
+    use_fake_client(monkeypatch, client)
+    store, index = tiny_store()
+    tokens = []
+
+    result = pipeline.run(pipeline.answer_question(
+        "CNNs use convolutions.", store, index, api_key="sk-test", k=1, on_token=tokens.append
+    ))
+
+    assert result["matched_docs"][0][1]["title"] == "CNN"
+    assert result["answer"].startswith("Answer")
+    assert "".join(tokens).strip() == result["answer"]
+    assert result["explanation"].startswith("Answer")
+    assert "CNNs use convolutions." in result["prompt"]
+    assert result["errors"] == []
+    assert set(result["timings"]) >= {"embed", "search", "answer_first_token", "answer", "explanation", "total"}
+    assert client.chat.completions.calls == 2
+
+# Test that a failing chat endpoint falls back to the apology message and reports the error
+def test_answer_question_generation_fallback(monkeypatch):
+    use_fake_client(monkeypatch, FakeAsyncOpenAI(latency=0, chat_latency=0, chat_fail=True))
+    store, index = tiny_store()
+    result = pipeline.run(pipeline.answer_question("What is attention?", store, index, api_key="sk-test"))
+    assert result["answer"] == pipeline.ANSWER_FALLBACK
+    assert result["errors"][0].startswith("Answer generation failed")
+
+# Test that streamed answer tokens can be consumed before the explanation finishes
+def test_stream_question_yields_answer_tokens(monkeypatch):
+    use_fake_client(monkeypatch, FakeAsyncOpenAI(latency=0, chat_latency=0))
+    store, index = tiny_store()
+    tokens, future = pipeline.stream_question("What is attention?", store, index, api_key="sk-test")
+    streamed = "".join(tokens)
+    result = future.result(timeout=5)
+    assert streamed.strip() == result["answer"]
+
+# Test that the fallback answer still reaches the token stream when generation fails
+def test_stream_question_emits_fallback(monkeypatch):
+    use_fake_client(monkeypatch, FakeAsyncOpenAI(latency=0, chat_latency=0, chat_fail=True))
+    store, index = tiny_store()
+    tokens, future = pipeline.stream_question("What is attention?", store, index, api_key="sk-test")
+    assert list(tokens) == [pipeline.ANSWER_FALLBACK]
+    assert future.result(timeout=5)["errors"]
+
+# Test that repeating a question with the same settings is answered from the semantic cache
+def test_semantic_cache_skips_generation(monkeypatch):
+    client = FakeAsyncOpenAI(latency=0, chat_latency=0)
+    use_fake_client(monkeypatch, client)
+    store, index = tiny_store()
+    cache = SemanticCache(":memory:")
+
+    first = pipeline.run(pipeline.answer_question(
+        "CNNs use convolutions.", store, index, api_key="sk-test", k=1, semantic_cache=cache
+    ))
+    tokens = []
+    second = pipeline.run(pipeline.answer_question(
+        "CNNs use convolutions.", store, index, api_key="sk-test", k=1, semantic_cache=cache, on_token=tokens.append
+    ))
+
+    assert not first["cached"] and second["cached"]
+    assert second["answer"] == first["answer"]
+    assert "".join(tokens) == first["answer"]
+    assert second["matched_docs"] == first["matched_docs"]
+    assert second["prompt"] == first["prompt"]
+    assert client.chat.completions.calls == 2
+
+# Test that two conversations never share a cached follow-up, while each conversation can reuse its own
+def test_semantic_cache_keys_on_conversation_context(monkeypatch):
+    client = FakeAsyncOpenAI(latency=0, chat_latency=0)
+    use_fake_client(monkeypatch, client)
+    store, index = tiny_store()
+    cache = SemanticCache(":memory:")
+    contexts = ("Q: What is a CNN?\nA: A network.", "Q: What is attention?\nA: A mechanism.")
+
+    def ask(memory_block):
+        return pipeline.run(pipeline.answer_question(
+            "Can you explain more?", store, index, api_key="sk-test", k=1, semantic_cache=cache,
+            memory_block=memory_block
+        ))
+
+    assert [ask(context)["cached"] for context in contexts] == [False, False]
+    repeat = ask(contexts[0])
+    assert repeat["cached"]
+    assert contexts[0] in repeat["prompt"] and contexts[1] not in repeat["prompt"]
+    assert len(cache) == 2
+    assert client.chat.completions.calls == 4
+
+# Test that changing k, the reranker or the index version misses the cache
+def test_semantic_cache_keys_on_retrieval(monkeypatch):
+    use_fake_client(monkeypatch, FakeAsyncOpenAI(latency=0, chat_latency=0))
+    store, index = tiny_store()
+    cache = SemanticCache(":memory:")
+
+    def ask(**kwargs):
+        return pipeline.run(pipeline.answer_question(
+            "CNNs use convolutions.", store, index, api_key="sk-test", semantic_cache=cache, **kwargs
+        ))["cached"]
+
+    assert not ask(k=1)
+    assert ask(k=1)
+    assert not ask(k=2)
+    assert not ask(k=1, reranker=Reranker())
+    store._index_version = "rebuilt"
+    assert not ask(k=1)
+
+# Test that upload passages and corpus chunks are merged into one top-k list by score
+def test_answer_question_searches_upload(monkeypatch):
+    client = FakeAsyncOpenAI(latency=0, chat_latency=0)
+    use_fake_client(monkeypatch, client)
+    store, index = tiny_store()
+    session = SessionIndex(
+        ["My notes on attention heads.", "Unrelated appendix."],
+        [{"page_start": 2, "page_end": 2}, {"page_start": 9, "page_end": 9}],
+        "notes.pdf", client=FakeOpenAI(latency=0), cache=EmbeddingCache(":memory:")
+    )
+    result = pipeline.run(pipeline.answer_question(
+        "My notes on attention heads.", store, index, api_key="sk-test", k=2, session_index=session
+    ))
+    assert result["matched_docs"][0] == ("My notes on attention heads.", session.document_metadata[0])
+    assert len(result["matched_docs"]) == 2
+    assert "notes.pdf, p. 2" in result["prompt"]
+
+# Test that a conversation memory contributes its block to the prompt and the query vector is returned
+def test_answer_question_uses_conversation_memory(monkeypatch):
+    use_fake_client(monkeypatch, FakeAsyncOpenAI(latency=0, chat_latency=0))
+    store, index = tiny_store()
+    memory = ConversationMemory()
+    memory.add("What is a CNN?", "A convolutional network.")
+    result = pipeline.run(pipeline.answer_question("And attention?", store, index, api_key="sk-test", memory=memory))
+    assert "Previous Q: What is a CNN?" in result["prompt"]
+    assert result["query_vector"].shape == (1536,)
+
+# Test that lexical search still finds sources when the embedding call fails
+def test_lexical_fallback_when_embedding_fails(monkeypatch, tmp_path):
+    client = FakeAsyncOpenAI(latency=0, chat_latency=0)
+
+    async def broken_embeddings(input, model):
+        raise RuntimeError("embeddings down")
+    client.embeddings.create = broken_embeddings
+    use_fake_client(monkeypatch, client)
+    store, index = tiny_store()
+    write_lexical_index(str(tmp_path / "lexical"), [0, 1], store.documents)
+    store.lexical_index = LexicalIndex(str(tmp_path / "lexical"))
+
+    result = pipeline.run(pipeline.answer_question("How do CNNs use convolutions?", store, index, api_key="sk-test", k=1))
+    assert result["errors"][0].startswith("Embedding failed")
+    assert result["matched_docs"][0][1]["title"] == "CNN"
+
+# Test that the pipeline result carries a trace with stage spans and token usage
+def test_answer_question_trace(monkeypatch):
+    use_fake_client(monkeypatch, FakeAsyncOpenAI(latency=0, chat_latency=0))
+    store, index = tiny_store()
+    result = pipeline.run(pipeline.answer_question("What is attention?", store, index, api_key="sk-test"))
+    stages = [s["stage"] for s in result["trace"]["spans"]]
+    assert {"embed", "vector_search", "lexical_search", "answer", "explanation"} <= set(stages)
+    assert result["trace"]["tokens"]["answer"]["completion"] > 0
+    assert result["trace"]["cache"]["embeddings"] == {"hit": 0, "miss": 1}
+    assert result["trace"]["cost_usd"] > 0
+
+# Test that a reranker widens the candidate pool and its picks become the prompt sources
+def test_answer_question_reranks(monkeypatch):
+    client = FakeAsyncOpenAI(latency=0, chat_latency=0)
+    use_fake_client(monkeypatch, client)
+    store, index = tiny_store()
+    seen = []
+
+    class RecordingReranker(Reranker):
+        def rerank(self, question, query_vector, keys, sources, k=3):
+            seen.append(list(keys))
+            return super().rerank(question, query_vector, keys, sources, k)
+
+    result = pipeline.run(pipeline.answer_question(
+        "CNNs use convolutions.", store, index, api_key="sk-test", k=1, reranker=RecordingReranker(candidates=10)
+    ))
+
+    assert sorted(seen[0]) == [(pipeline.CORPUS, 0), (pipeline.CORPUS, 1)]
+    assert [meta["title"] for _, meta in result["matched_docs"]] == ["CNN"]
+    assert result["source_ids"] == [1]
+    assert "rerank" in [s["stage"] for s in result["trace"]["spans"]]
@@ -1,3 +1,5 @@
+from benchmarks.fake_openai import FakeOpenAI
+from src import generator
 from src.generator import build_prompt
 
 # Reusable dummy docs for prompt construction
@@ -38,4 +40,20 @@ def test_prompt_explain_step_by_step_style():
 # Test that "With Citations Only" restricts to source-backed answers
 def test_prompt_with_citations_only_style():
     prompt = build_prompt("What is gradient descent?", dummy_docs(), style="With Citations Only")
-    assert "only the information provided in the sources" in prompt.lower()
\ No newline at end of file
+    assert "only the information provided in the sources" in prompt.lower()
+
+# Test that the streaming answer yields deltas that join into the full reply
+def test_generate_answer_stream_yields_deltas(monkeypatch):
+    client = FakeOpenAI(chat_latency=0)
+    monkeypatch.setattr(generator, "get_client", lambda api_key=None: client)
+    deltas = list(generator.generate_answer_stream("What is AI?"))
+    assert len(deltas) > 1
+    assert "".join(deltas) == generator.generate_answer("What is AI?")
+
+# Test that a failed streaming call shows an error and yields the fallback message
+def test_generate_answer_stream_fallback(monkeypatch):
+    errors = []
+    monkeypatch.setattr(generator, "get_client", lambda api_key=None: FakeOpenAI(chat_latency=0, chat_fail=True))
+    monkeypatch.setattr(generator.st, "error", errors.append)
+    assert list(generator.generate_answer_stream("What is AI?")) == [generator.ANSWER_FALLBACK]
+    assert errors and "Answer generation failed" in errors[0]
@@ -0,0 +1,85 @@
+import faiss
+import numpy as np
+from benchmarks.fake_openai import hash_vector
+from src.indexing import enable_reconstruct
+from src.pipeline import CORPUS, UPLOAD
+from src.rerank import Reranker, mmr, stored_vectors
+from src.retrieval import AIDocumentStore
+
+# Builds a store whose first three chunks come from one paper, two of them near-duplicates
+def paper_store():
+    store = AIDocumentStore(dataset_path=None, index_path=None)
+    store.documents = [
+        "Transformers use attention.", "Transformers use attention!", "Transformers stack layers.", "CNNs use convolutions."
+    ]
+    store.document_metadata = [{"title": "Attention", "url": "http://a"}] * 3 + [{"title": "CNN", "url": "http://c"}]
+    base = hash_vector("transformers")
+    vectors = np.stack([base, base + 0.01 * hash_vector("dup"), base + 0.5 * hash_vector("layers"), hash_vector("cnn")])
+    index = faiss.IndexIDMap2(faiss.IndexFlatL2(1536))
+    index.add_with_ids(vectors.astype("float32"), np.arange(4))
+    return store, index, base
+
+# Test that MMR skips a near-duplicate of an already selected candidate
+def test_mmr_prefers_novel_candidates():
+    a = np.array([1.0, 0.0, 0.0])
+    vectors = np.stack([a, a + [0.0, 0.01, 0.0], [0.0, 0.0, 1.0]])
+    assert mmr(vectors, [1.0, 0.99, 0.8], k=2, lambda_=0.5) == [0, 2]
+    assert mmr(vectors, [1.0, 0.99, 0.8], k=2, lambda_=1.0) == [0, 1]
+    assert mmr(None, [0.2, 0.9, 0.5], k=2) == [1, 2]
+
+# Test that chunks of the same paper collapse to the best one while other papers fill the slots
+def test_reranker_collapses_papers():
+    store, index, query = paper_store()
+    keys = [(CORPUS, i) for i in range(4)]
+    picked, docs = Reranker().rerank("transformers", query, keys, {CORPUS: (store, index)}, k=3)
+    assert picked == [(CORPUS, 0), (CORPUS, 3)]
+    assert [meta["title"] for _, meta in docs] == ["Attention", "CNN"]
+
+    _, docs = Reranker(collapse_papers=False).rerank("transformers", query, keys, {CORPUS: (store, index)}, k=2)
+    assert [meta["title"] for _, meta in docs] == ["Attention", "Attention"]
+
+# Test that a cross-encoder's scores decide relevance and missing ids are dropped
+def test_reranker_uses_cross_encoder():
+    class LengthCrossEncoder:
+        def predict(self, pairs):
+            return [len(chunk) for _, chunk in pairs]
+
+    store, index, query = paper_store()
+    reranker = Reranker(cross_encoder=LengthCrossEncoder(), collapse_papers=False, lambda_=1.0)
+    picked, _ = reranker.rerank("q", query, [(CORPUS, 0), (CORPUS, 3), (CORPUS, 99)], {CORPUS: (store, index)}, k=3)
+    assert picked == [(CORPUS, 0), (CORPUS, 3)]
+
+# Test that upload and corpus candidates are reranked together and upload sections are never collapsed
+def test_reranker_mixes_upload_candidates():
+    store, index, query = paper_store()
+    upload = AIDocumentStore(dataset_path=None, index_path=None)
+    upload.documents = ["My notes on transformers.", "My notes on CNNs."]
+    upload.document_metadata = [{"title": "notes.pdf", "url": ""}] * 2
+    upload_index = faiss.IndexIDMap2(faiss.IndexFlatL2(1536))
+    upload_index.add_with_ids(np.stack([query, hash_vector("cnn")]), np.arange(2))
+    sources = {CORPUS: (store, index), UPLOAD: (upload, upload_index)}
+    keys = [(UPLOAD, 0), (CORPUS, 0), (UPLOAD, 1), (CORPUS, 3)]
+    picked, _ = Reranker(lambda_=1.0).rerank("transformers", query, keys, sources, k=3)
+    assert picked == [(UPLOAD, 0), (CORPUS, 0), (UPLOAD, 1)]
+
+# Test that stored vectors can be read back from an IVF index by id
+def test_stored_vectors_from_ivf():
+    vectors = np.random.default_rng(0).standard_normal((200, 8)).astype("float32")
+    index = faiss.index_factory(8, "IVF2,Flat")
+    index.train(vectors)
+    index.add_with_ids(vectors, np.arange(1000, 1200))
+    # Without a direct map the index is left alone rather than modified mid-query
+    assert stored_vectors(index, [1005]) is None
+    enable_reconstruct(index)
+    assert np.allclose(stored_vectors(index, [1005, 1100]), vectors[[5, 100]])
+
+# Test that loading an IVF index saved without a direct map builds one up front, so reranking can read vectors
+def test_load_index_enables_reconstruct(tmp_path):
+    vectors = np.random.default_rng(0).standard_normal((200, 8)).astype("float32")
+    index = faiss.index_factory(8, "IVF2,Flat")
+    index.train(vectors)
+    index.add_with_ids(vectors, np.arange(200))
+    path = str(tmp_path / "legacy.index")
+    faiss.write_index(index, path)
+    loaded = AIDocumentStore(None, path).load_index()
+    assert np.allclose(stored_vectors(loaded, [7]), vectors[[7]])
@@ -1,4 +1,12 @@
+import json
+import os
+import faiss
+import pandas as pd
 import pytest
+from benchmarks.fake_openai import FakeOpenAI, hash_vector
+from src import retrieval
+from src.cache import EmbeddingCache
+from src.indexing import default_nlist
 from src.retrieval import AIDocumentStore
 
 # Test that the constructor correctly sets initial attributes
@@ -68,4 +76,160 @@ def test_get_metadata_returns_list():
 def test_load_index_raises_error_if_not_found():
     store = AIDocumentStore("dummy.csv", "nonexistent.index")
     with pytest.raises(FileNotFoundError):
-        store.load_index()
\ No newline at end of file
+        store.load_index()
+
+# Writes a small arXiv-style CSV for index tests
+def write_dataset(path, rows):
+    pd.DataFrame(rows, columns=["title", "url", "abstract"]).to_csv(path, index=False)
+
+# Builds a store wired to an offline fake client and a private in-memory cache
+def fake_store(tmp_path, monkeypatch, client):
+    monkeypatch.setattr(retrieval, "get_client", lambda api_key=None: client)
+    return AIDocumentStore(
+        str(tmp_path / "data.csv"), str(tmp_path / "faiss.index"),
+        chunk_size=5, embedding_cache=EmbeddingCache(":memory:")
+    )
+
+# Test that an incremental update only embeds new or changed rows and drops deleted ones
+def test_incremental_update_embeds_only_changes(tmp_path, monkeypatch):
+    client = FakeOpenAI(latency=0)
+    store = fake_store(tmp_path, monkeypatch, client)
+    write_dataset(store.dataset_path, [
+        ("Paper A", "http://a", "alpha " * 7),
+        ("Paper B", "http://b", "beta " * 3),
+        ("Paper C", "http://c", "gamma " * 4),
+    ])
+    index = store.build_index()
+    assert index.ntotal == 4
+    assert client.embeddings.items == 4
+
+    write_dataset(store.dataset_path, [
+        ("Paper A", "http://a", "alpha " * 7),
+        ("Paper C", "http://c", "gamma delta " * 2),
+        ("Paper D", "http://d", "epsilon"),
+    ])
+    store = fake_store(tmp_path, monkeypatch, client)
+    index = store.build_index(incremental=True)
+    assert index.ntotal == 4
+    assert client.embeddings.items == 6
+
+    # Search results map back to the right chunks through their ids
+    _, I = index.search(hash_vector("epsilon").reshape(1, -1), k=1)
+    assert store.lookup(I[0])[0][1]["title"] == "Paper D"
+    assert os.path.exists(store.manifest_path)
+
+# Test that unchanged rows keep their chunk ids across reloads
+def test_load_and_split_reuses_manifest_ids(tmp_path, monkeypatch):
+    store = fake_store(tmp_path, monkeypatch, FakeOpenAI(latency=0))
+    write_dataset(store.dataset_path, [("Paper A", "http://a", "alpha " * 7), ("Paper B", "http://b", "beta")])
+    store.build_index()
+    ids = list(store.chunk_ids)
+
+    reloaded = AIDocumentStore(store.dataset_path, store.index_path, chunk_size=5)
+    reloaded.load_and_split()
+    assert reloaded.chunk_ids == ids
+
+# Test that the manifest is written one row per line and version 1 (single JSON object) manifests still load
+def test_manifest_rows_streamed_and_legacy_format(tmp_path, monkeypatch):
+    store = fake_store(tmp_path, monkeypatch, FakeOpenAI(latency=0))
+    write_dataset(store.dataset_path, [("Paper A", "http://a", "alpha " * 7), ("Paper B", "http://b", "beta")])
+    store.build_index()
+    with open(store.manifest_path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]["next_id"] == 3
+    assert [row[0] for row in lines[1:]] == ["http://a", "http://b"]
+    assert not os.path.exists(f"{store.manifest_path}.rows.tmp")
+
+    manifest = store.load_manifest()
+    with open(store.manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    assert store.load_manifest() == manifest
+    assert manifest["rows"]["http://b"]["ids"] == [2]
+
+# Test that lookup skips the -1 placeholders FAISS returns for missing results
+def test_lookup_skips_missing_ids():
+    store = AIDocumentStore(dataset_path=None, index_path=None)
+    store.documents = ["doc1", "doc2"]
+    store.document_metadata = [{"title": "1"}, {"title": "2"}]
+    assert store.lookup([1, -1]) == [("doc2", {"title": "2"})]
+
+# Test that startup reads chunks from the sidecar instead of the CSV
+def test_load_chunks_uses_sidecar(tmp_path, monkeypatch):
+    store = fake_store(tmp_path, monkeypatch, FakeOpenAI(latency=0))
+    write_dataset(store.dataset_path, [("Paper A", "http://a", "alpha " * 7), ("Paper B", "http://b", "beta")])
+    index = store.build_index()
+    os.remove(store.dataset_path)
+
+    reloaded = AIDocumentStore(store.dataset_path, store.index_path, chunk_size=5)
+    reloaded.load_chunks()
+    assert len(reloaded.get_documents()) == 3
+    _, I = index.search(hash_vector("beta").reshape(1, -1), k=1)
+    assert reloaded.lookup(I[0]) == [("beta", {"title": "Paper B", "url": "http://b"})]
+
+# Test that a cosine/fp16 index built by the store is searched with normalized queries
+def test_store_search_with_cosine_fp16(tmp_path, monkeypatch):
+    store = fake_store(tmp_path, monkeypatch, FakeOpenAI(latency=0))
+    store.metric = "ip"
+    store.storage = "fp16"
+    write_dataset(store.dataset_path, [("Paper A", "http://a", "alpha"), ("Paper B", "http://b", "beta")])
+    index = store.build_index()
+    scores, I = store.search(index, 3 * hash_vector("beta"), k=1)
+    assert store.lookup(I[0])[0][0] == "beta"
+    assert scores[0, 0] == pytest.approx(1.0, abs=1e-2)
+
+# Test that the dataset is streamed in fixed-size row batches
+def test_iter_chunks_streams_batches(tmp_path):
+    path = str(tmp_path / "data.csv")
+    write_dataset(path, [(f"Paper {i}", f"http://{i}", "word " * 7) for i in range(5)])
+    store = AIDocumentStore(path, None, chunk_size=5, csv_batch_rows=2)
+    batches = list(store.iter_chunks(manifest={}))
+    assert [len(chunks) for _, chunks, _ in batches] == [4, 4, 2]
+    assert batches[2][2][0] == {"title": "Paper 4", "url": "http://4"}
+    assert [chunk_id for ids, _, _ in batches for chunk_id in ids] == list(range(10))
+
+# Test that a streaming build trains an IVF index on buffered batches, then adds the rest
+def test_streaming_build_trains_then_adds(tmp_path, monkeypatch):
+    store = fake_store(tmp_path, monkeypatch, FakeOpenAI(dim=1536, latency=0))
+    store.csv_batch_rows = 2
+    store.index_type = "ivf_flat"
+    store.train_sample = 3
+    write_dataset(store.dataset_path, [(f"Paper {i}", f"http://{i}", f"topic{i} " * 3) for i in range(7)])
+    index = store.build_index()
+    assert index.ntotal == 7
+    assert len(store.get_documents()) == 7
+    _, I = store.search(index, hash_vector("topic5 topic5 topic5"), k=1)
+    assert store.lookup(I[0])[0][1]["title"] == "Paper 5"
+
+# Test that an IVF index trained on a sample is still sized for the whole corpus
+def test_streaming_build_sizes_nlist_for_corpus(tmp_path, monkeypatch):
+    store = fake_store(tmp_path, monkeypatch, FakeOpenAI(dim=1536, latency=0))
+    store.csv_batch_rows = 10
+    store.index_type = "ivf_flat"
+    store.train_sample = 20
+    write_dataset(store.dataset_path, [(f"Paper {i}", f"http://{i}", f"topic{i}") for i in range(80)])
+    index = store.build_index()
+    assert index.ntotal == 80
+    assert faiss.extract_index_ivf(index).nlist == default_nlist(80)
+
+# Test that a build persists the lexical index next to the FAISS index and search finds exact terms
+def test_build_writes_lexical_index(tmp_path, monkeypatch):
+    store = fake_store(tmp_path, monkeypatch, FakeOpenAI(latency=0))
+    write_dataset(store.dataset_path, [
+        ("Paper A", "http://a", "attention is all you need"),
+        ("Paper B", "http://b", "LoRA adapts large models cheaply"),
+    ])
+    store.build_index()
+    assert os.path.isdir(store.lexical_path)
+    _, ids = store.lexical_search("what is LoRA?", k=3)
+    assert [meta["title"] for _, meta in store.lookup(ids)] == ["Paper B"]
+
+# Test that an index built before manifests existed is re-split with the word chunker it was embedded with
+def test_legacy_index_keeps_word_chunks(tmp_path, monkeypatch):
+    write_dataset(tmp_path / "data.csv", [["Paper", "http://p", "one two three four five six seven."]])
+    faiss.write_index(faiss.IndexFlatL2(1536), str(tmp_path / "faiss.index"))
+    store = fake_store(tmp_path, monkeypatch, FakeOpenAI(latency=0))
+    store.load_chunks()
+    assert store.legacy_chunking
+    assert store.documents == ["one two three four five", "six seven."]
+    store.build_index()
+    assert not store.legacy_chunking
@@ -0,0 +1,81 @@
+import threading
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.fake_openai import FakeOpenAI, hash_vector
+from src import retrieval
+from src.cache import EmbeddingCache
+from src.retrieval import AIDocumentStore
+from src.retrieval_service import MicroBatcher, RemoteDocumentStore, RetrievalServer
+
+# Builds a small index on disk with the offline fake client
+def build_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "get_client", lambda api_key=None: FakeOpenAI(latency=0))
+    store = AIDocumentStore(
+        str(tmp_path / "data.csv"), str(tmp_path / "faiss.index"),
+        chunk_size=5, embedding_cache=EmbeddingCache(":memory:")
+    )
+    pd.DataFrame([
+        ("Paper A", "http://a", "attention is all you need"),
+        ("Paper B", "http://b", "LoRA adapts large models cheaply"),
+        ("Paper C", "http://c", "diffusion models generate images"),
+    ], columns=["title", "url", "abstract"]).to_csv(store.dataset_path, index=False)
+    store.build_index()
+    return store
+
+# Test that concurrent submissions are answered by one search call and each caller gets its own rows
+def test_micro_batcher_merges_concurrent_queries():
+    calls = []
+    release = threading.Event()
+
+    def search(vectors, k):
+        release.wait(5)
+        calls.append(len(vectors))
+        return vectors[:, :1].repeat(k, axis=1), np.tile(np.arange(k), (len(vectors), 1))
+
+    batcher = MicroBatcher(search, max_batch=8, max_wait=0.5)
+    futures = [batcher.submit(np.full((1, 4), i, dtype="float32"), k=2 + i % 2) for i in range(4)]
+    release.set()
+    results = [future.result(timeout=5) for future in futures]
+    batcher.close()
+
+    assert calls == [4]
+    for i, (scores, ids) in enumerate(results):
+        assert scores.shape == (1, 2 + i % 2)
+        assert scores[0, 0] == i
+
+# Test that the HTTP service answers like the local store when it opens the index with IO_FLAG_MMAP
+# (a flat index here, which FAISS reads into memory; only IVF indexes are actually mapped)
+def test_remote_store_matches_local(tmp_path, monkeypatch):
+    local = build_store(tmp_path, monkeypatch)
+    local_index = local.load_index()
+    local.load_chunks()
+
+    served = AIDocumentStore(local.dataset_path, local.index_path)
+    served_index = served.load_index(mmap=True)
+    served.load_chunks()
+    server = RetrievalServer(("127.0.0.1", 0), served, served_index)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    remote = RemoteDocumentStore(f"http://127.0.0.1:{server.server_address[1]}")
+    try:
+        index = remote.load_index()
+        assert (index.ntotal, index.d, index.metric_type) == (local_index.ntotal, local_index.d, local_index.metric_type)
+        assert remote.index_version() == served.index_version() is not None
+
+        query = hash_vector("diffusion models", 1536).reshape(1, -1)
+        scores, ids = remote.search(index, query, k=2)
+        local_scores, local_ids = local.search(local_index, query, k=2)
+        assert ids.tolist() == local_ids.tolist()
+        assert np.allclose(scores, local_scores)
+
+        _, lexical_ids = remote.lexical_search("what is LoRA?", k=3)
+        assert [meta["title"] for _, meta in remote.lookup(lexical_ids)] == ["Paper B"]
+        assert remote.lookup(ids[0]) == local.lookup(ids[0])
+
+        with pytest.raises(httpx.HTTPStatusError):
+            remote.search(index, np.zeros((1, 8), dtype="float32"), k=2)
+    finally:
+        remote.close()
+        server.shutdown()
+        server.server_close()
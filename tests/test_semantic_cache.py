@@ -0,0 +1,60 @@
+import numpy as np
+from src.semantic_cache import SemanticCache, settings_key
+
+SETTINGS = settings_key("Default", 0.2, False, 300)
+
+# Unit vector pointing mostly along one axis, with a small tilt towards another
+def vector(axis, tilt=0.0, dim=8):
+    vec = np.zeros(dim, dtype="float32")
+    vec[axis] = 1.0
+    vec[(axis + 1) % dim] = tilt
+    return vec
+
+# Test that a near-identical query with the same settings is served from the cache
+def test_lookup_hits_above_threshold():
+    cache = SemanticCache(":memory:", threshold=0.95)
+    cache.add(vector(0), SETTINGS, {"answer": "A", "source_ids": [1]})
+    hit = cache.lookup(vector(0, tilt=0.1), SETTINGS)
+    assert hit["answer"] == "A"
+    assert hit["similarity"] > 0.95
+    assert cache.lookup(vector(3), SETTINGS) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+# Test that answers generated with different settings are never reused
+def test_lookup_requires_matching_settings():
+    cache = SemanticCache(":memory:")
+    cache.add(vector(0), SETTINGS, {"answer": "A"})
+    assert cache.lookup(vector(0), settings_key("Concise", 0.2, False, 300)) is None
+    assert cache.lookup(vector(0), settings_key("Default", 0.2, True, 300)) is None
+
+# Test that expired entries are ignored and dropped
+def test_entries_expire():
+    cache = SemanticCache(":memory:", ttl_seconds=60)
+    cache.add(vector(0), SETTINGS, {"answer": "A"})
+    for entry in cache._entries.values():
+        entry["created"] -= 120
+    assert cache.lookup(vector(0), SETTINGS) is None
+    cache.add(vector(1), SETTINGS, {"answer": "B"})
+    assert len(cache) == 1
+
+# Test that the least recently used answers are evicted once the cache is full
+def test_lru_eviction():
+    cache = SemanticCache(":memory:", max_entries=2)
+    cache.add(vector(0), SETTINGS, {"answer": "A"})
+    cache.add(vector(2), SETTINGS, {"answer": "B"})
+    cache.lookup(vector(0), SETTINGS)
+    cache.add(vector(4), SETTINGS, {"answer": "C"})
+    assert len(cache) == 2
+    assert cache.lookup(vector(2), SETTINGS) is None
+    assert cache.lookup(vector(0), SETTINGS)["answer"] == "A"
+
+# Test that cached answers survive a restart and zero vectors (failed embeddings) are never stored
+def test_persistence_and_zero_vectors(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    cache = SemanticCache(path)
+    cache.add(vector(0), SETTINGS, {"answer": "A"})
+    cache.add(np.zeros(8, dtype="float32"), SETTINGS, {"answer": "broken"})
+    reopened = SemanticCache(path)
+    assert len(reopened) == 1
+    assert reopened.lookup(vector(0), SETTINGS)["answer"] == "A"
@@ -0,0 +1,31 @@
+import numpy as np
+from benchmarks.fake_openai import FakeOpenAI, hash_vector
+from src.cache import EmbeddingCache
+from src.session_index import SessionIndex, file_hash
+
+SPANS = [{"page_start": 1, "page_end": 1}, {"page_start": 1, "page_end": 2}, {"page_start": None, "page_end": None}]
+
+# Test that an upload is embedded once and its passages can be searched and looked up
+def test_session_index_search():
+    client = FakeOpenAI(latency=0)
+    chunks = ["gradient descent notes", "backpropagation notes", "dropout notes"]
+    session = SessionIndex(chunks, SPANS, "notes.pdf", client=client, cache=EmbeddingCache(":memory:"))
+    scores, ids = session.search(hash_vector("backpropagation notes"), k=2)
+    assert ids[0] == 1
+    assert scores[0] >= scores[1]
+    doc, meta = session.lookup(ids[:1])[0]
+    assert doc == "backpropagation notes"
+    assert meta["title"] == "notes.pdf, p. 1-2"
+    assert client.embeddings.items == 3
+
+# Test that page-less (plain text) chunks are titled by file name and hashes identify content
+def test_session_index_titles_and_hash():
+    assert SessionIndex.source_title("notes.txt", SPANS[2]) == "notes.txt"
+    assert SessionIndex.source_title("notes.pdf", SPANS[0]) == "notes.pdf, p. 1"
+    assert file_hash(b"abc") == file_hash(b"abc") != file_hash(b"abd")
+
+# Test that an empty upload searches to nothing instead of failing
+def test_empty_session_index():
+    session = SessionIndex([], [], "empty.txt", client=FakeOpenAI(latency=0), cache=EmbeddingCache(":memory:"))
+    scores, ids = session.search(np.ones(1536, dtype="float32"))
+    assert len(session) == 0 and len(ids) == 0
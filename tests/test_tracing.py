@@ -0,0 +1,74 @@
+import asyncio
+import urllib.request
+from types import SimpleNamespace
+import pytest
+from benchmarks.fake_openai import FakeOpenAI
+from src import tracing
+from src.embeddings import create_with_retry
+from src.tracing import Histogram, Metrics, record_usage, span, start_metrics_server, trace, traced
+
+# Test that quantiles are interpolated inside the right bucket
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 0.5):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == pytest.approx(0.1)
+    assert 0.1 < histogram.quantile(0.95) <= 1.0
+    assert Histogram().quantile(0.5) is None
+
+# Test that histograms and counters render in the Prometheus text format
+def test_render_prometheus():
+    registry = Metrics()
+    registry.observe("stage_seconds", 0.02, stage="embed")
+    registry.increment("tokens_total", 12, stage="answer", kind="prompt")
+    text = registry.render_prometheus()
+    assert "# TYPE study_buddy_stage_seconds histogram" in text
+    assert 'study_buddy_stage_seconds_bucket{stage="embed",le="0.025"} 1' in text
+    assert 'study_buddy_stage_seconds_bucket{stage="embed",le="+Inf"} 1' in text
+    assert 'study_buddy_tokens_total{kind="prompt",stage="answer"} 12' in text
+
+# Test that sync, generator and async functions are timed into the current trace
+def test_traced_functions_record_spans():
+    @traced("sync_stage")
+    def sync_work():
+        return 1
+
+    @traced("generator_stage")
+    def generator_work():
+        yield from range(3)
+
+    @traced("async_stage")
+    async def async_work():
+        return 2
+
+    with trace("test") as active:
+        assert sync_work() == 1
+        assert list(generator_work()) == [0, 1, 2]
+        assert asyncio.run(async_work()) == 2
+        with span("manual"):
+            record_usage("manual", SimpleNamespace(prompt_tokens=1000, completion_tokens=1000), "gpt-3.5-turbo")
+    result = active.to_dict()
+    assert [s["stage"] for s in result["spans"]] == ["sync_stage", "generator_stage", "async_stage", "manual"]
+    assert result["tokens"]["manual"] == {"prompt": 1000, "completion": 1000}
+    assert result["cost_usd"] == pytest.approx(0.002)
+    assert result["seconds"] >= 0
+
+# Test that retried embedding calls are counted in the trace
+def test_retries_are_recorded():
+    client = FakeOpenAI(latency=0, rate_limit_every=2)
+    client.embeddings.create(input="first", model="m")
+    with trace("retry") as active:
+        create_with_retry(client, ["second"], model="text-embedding-ada-002", base_delay=0)
+    assert active.retries == {"embeddings": 1}
+    assert active.tokens["embeddings"]["prompt"] == 1
+
+# Test that the metrics endpoint serves the registry
+def test_metrics_server():
+    tracing.metrics.increment("probe_total")
+    server = start_metrics_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode("utf-8")
+    finally:
+        server.shutdown()
+    assert "study_buddy_probe_total" in body
@@ -1,37 +1,52 @@
+import os
+import pytest
 from src import tts
 
-# Mock TTS engine to avoid real audio output during testing
-class DummyEngine:
-    def say(self, text):
-        pass
+# Engine stand-in that writes the text as the "audio" and counts renders
+class FileEngine:
+    def __init__(self):
+        self.renders = 0
+        self._jobs = []
+    def save_to_file(self, text, path):
+        self._jobs.append((text, path))
     def runAndWait(self):
-        pass
+        for text, path in self._jobs:
+            with open(path, "w") as f:
+                f.write(text)
+            self.renders += 1
+        self._jobs = []
     def stop(self):
         pass
 
-# Replace pyttsx3.init with the dummy version
-tts.pyttsx3.init = lambda: DummyEngine()
-
-def test_toggle_speech_starts_and_stops():
-    tts._active = False
-
-    # Should start speaking
-    state_after_start = tts.toggle_speech("Hello world.")
-    assert state_after_start is True
-
-    tts._active = False
-
-    # Should start speaking again
-    state_after_start_again = tts.toggle_speech("Hello again.")
-    assert state_after_start_again is True
-
-    tts._active = False
-
-    # Should start speaking a third time
-    state_after_stop = tts.toggle_speech("Hello stop.")
-    assert state_after_stop is True
-
-    # Should stop speaking
-    tts._active = True
-    state_after_final_stop = tts.toggle_speech("doesn't matter")
-    assert state_after_final_stop is False
\ No newline at end of file
+# Test that answers are rendered once by a reused engine and then served from the file cache
+def test_tts_worker_caches_audio_by_text(tmp_path):
+    engine = FileEngine()
+    created = []
+    worker = tts.TTSWorker(str(tmp_path), engine_factory=lambda: created.append(engine) or engine)
+
+    path = worker.synthesize("Hello world.").result(timeout=5)
+    assert path == worker.path_for("Hello world.")
+    assert open(path).read() == "Hello world."
+    assert worker.synthesize("Hello world.").result(timeout=5) == path
+    worker.synthesize("Another answer.").result(timeout=5)
+    worker.close()
+
+    assert engine.renders == 2
+    assert len(created) == 1
+
+# Test that engine failures reach the caller and the oldest files are evicted past max_files
+def test_tts_worker_errors_and_eviction(tmp_path):
+    def broken():
+        raise RuntimeError("no speech driver")
+    worker = tts.TTSWorker(str(tmp_path / "broken"), engine_factory=broken)
+    with pytest.raises(RuntimeError, match="no speech driver"):
+        worker.synthesize("Hi").result(timeout=5)
+    worker.close()
+
+    worker = tts.TTSWorker(str(tmp_path / "small"), max_files=2, engine_factory=FileEngine)
+    for text in ("one", "two", "three"):
+        worker.synthesize(text).result(timeout=5)
+    worker.close()
+    assert sorted(p.name for p in (tmp_path / "small").iterdir()) == sorted(
+        os.path.basename(worker.path_for(text)) for text in ("two", "three")
+    )